@@ -1,17 +1,83 @@
 # AiModels/face_recognition/align.py
+import os
 import numpy as np, cv2
-from mtcnn.mtcnn import MTCNN
+from AiModels.face_recognition.detectors import DETECTOR, DetectorFactory, FaceDetector
+from AiModels.model_registry import models
 
-_detector = MTCNN()
+# ── enables ─────────────────────────────────────────────────────────
+MIN_CONFIDENCE = float(os.getenv("FACE_MIN_CONFIDENCE", "0.90"))
+MIN_FACE_SIZE  = int(os.getenv("FACE_MIN_SIZE", "24"))        # px, shorter box side
+DETECT_MAX_SIDE = int(os.getenv("FACE_DETECT_MAX_SIDE", "640"))  # px, 0 detects at full resolution
 
-def align_face(raw_bytes: bytes) -> np.ndarray | None:
+# the settings above that differ from their defaults: face records found with
+# other ones are re-analysed (see FaceRecognitionService.is_current); "" by default
+DETECTION_VERSION = "+".join(part for part, default in (
+    (DETECTOR, "mtcnn"),
+    (f"side{DETECT_MAX_SIDE}", "side640"),
+    (f"conf{MIN_CONFIDENCE:g}", "conf0.9"),
+    (f"min{MIN_FACE_SIZE}", "min24"),
+) if part != default)
+
+def _load_detector() -> FaceDetector:
+    detector = DetectorFactory.get_detector()   # FACE_DETECTOR, see detectors.py
+    detector.detect_faces(np.zeros((160, 160, 3), np.uint8))   # first call builds the graphs
+    return detector
+
+models.register("face_detector", _load_detector)
+
+def _scaled(img_rgb: np.ndarray, max_side: int) -> tuple[np.ndarray, float]:
+    """The image shrunk so its longer side is at most max_side, and the factor used."""
+    side = max(img_rgb.shape[:2])
+    if not max_side or side <= max_side:
+        return img_rgb, 1.0
+    scale = max_side / side
+    size = (round(img_rgb.shape[1] * scale), round(img_rgb.shape[0] * scale))
+    return cv2.resize(img_rgb, size, interpolation=cv2.INTER_AREA), scale
+
+def detect_faces_rgb(img_rgb: np.ndarray, max_side: int = DETECT_MAX_SIDE,
+                     detector: FaceDetector | None = None) -> list[tuple[np.ndarray, list[int], float]]:
+    """
+    detect_faces on a decoded RGB image, with the detector run on a copy
+    downscaled to max_side; boxes are mapped back and crops cut at full
+    resolution.  No fallback: see detect_faces.
+    """
+    small, scale = _scaled(img_rgb, max_side)
+    height, width = img_rgb.shape[:2]
+    faces = []
+    for det in sorted((detector or models.get("face_detector")).detect_faces(small), key=lambda d: d['box'][2]*d['box'][3], reverse=True):
+        x0, y0, w, h = (v / scale for v in det['box'])
+        x, y = max(0, round(x0)), max(0, round(y0))
+        w, h = min(width, round(x0 + w)) - x, min(height, round(y0 + h)) - y
+        if det['confidence'] < MIN_CONFIDENCE or min(w, h) < MIN_FACE_SIZE:
+            continue
+        faces.append((img_rgb[y:y+h, x:x+w].astype("float32"),
+                      [int(x), int(y), int(w), int(h)], float(det['confidence'])))
+    return faces
+
+def detect_faces(raw_bytes: bytes, max_side: int = DETECT_MAX_SIDE) -> list[tuple[np.ndarray, list[int], float]]:
+    """
+    Every face above MIN_CONFIDENCE whose box is at least MIN_FACE_SIZE px,
+    largest first.  Detection runs on the image downscaled to max_side and
+    is repeated at full resolution when that finds nothing.
+    returns : [(RGB float32 crop, [x, y, w, h] box, detector confidence), ...]
+    """
     img_bgr = cv2.imdecode(np.frombuffer(raw_bytes, np.uint8), cv2.IMREAD_COLOR)
     if img_bgr is None:
-        return None
-    img_rgb = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB)
-    dets = _detector.detect_faces(img_rgb)
-    if not dets:
-        return None
-    x, y, w, h = max(dets, key=lambda d: d['box'][2]*d['box'][3])['box']
-    x, y = max(0, x), max(0, y)
-    return img_rgb[y:y+h, x:x+w].astype("float32")
+        return []
+    return detect_faces_decoded(cv2.cvtColor(img_bgr, cv2.COLOR_BGR2RGB), max_side)
+
+def detect_faces_decoded(img_rgb: np.ndarray, max_side: int = DETECT_MAX_SIDE) -> list[tuple[np.ndarray, list[int], float]]:
+    """detect_faces for an image that is already decoded (RGB uint8), e.g. by ImagePipeline."""
+    faces = detect_faces_rgb(img_rgb, max_side)
+    if not faces and max_side and max(img_rgb.shape[:2]) > max_side:
+        faces = detect_faces_rgb(img_rgb, 0)    # small faces can vanish when downscaled
+    return faces
+
+def detect_face(raw_bytes: bytes) -> tuple[np.ndarray, list[int], float] | None:
+    """Largest face in the image, or None."""
+    faces = detect_faces(raw_bytes)
+    return faces[0] if faces else None
+
+def align_face(raw_bytes: bytes) -> np.ndarray | None:
+    found = detect_face(raw_bytes)
+    return None if found is None else found[0]
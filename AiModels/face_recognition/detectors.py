@@ -0,0 +1,141 @@
+# AiModels/face_recognition/detectors.py
+"""
+Interchangeable face detectors
+------------------------------
+
+Every detector takes an RGB uint8 image and returns MTCNN-style results,
+[{"box": [x, y, w, h], "confidence": float}, ...] in that image's pixels,
+so align.py filters, maps and crops them the same way.
+
+• MTCNNDetector      → the `mtcnn` package (TensorFlow P/R/O-Net cascade)
+• OpenCVDnnDetector  → OpenCV's res10 300×300 SSD face model (cv2.dnn)
+• OnnxFaceDetector   → Ultra-Light-Fast-Generic-Face-Detector (RFB-320)
+                       through ONNX Runtime
+
+Selected with FACE_DETECTOR = mtcnn | opencv | onnx.  The OpenCV and ONNX
+model files are not shipped; see paths.py for where they are expected.
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+
+import cv2
+import numpy as np
+
+from paths import OPENCV_FACE_PROTOTXT_PATH, OPENCV_FACE_MODEL_PATH, ULTRAFACE_ONNX_PATH
+
+# ───────── configuration ─────────────────────────────────
+DETECTOR          = os.getenv("FACE_DETECTOR", "mtcnn")
+OPENCV_PROTOTXT   = os.getenv("FACE_DETECTOR_OPENCV_PROTOTXT", OPENCV_FACE_PROTOTXT_PATH)
+OPENCV_MODEL      = os.getenv("FACE_DETECTOR_OPENCV_MODEL", OPENCV_FACE_MODEL_PATH)
+ONNX_MODEL        = os.getenv("FACE_DETECTOR_ONNX_MODEL", ULTRAFACE_ONNX_PATH)
+CANDIDATE_SCORE   = 0.5      # raw detections kept before align.py's MIN_CONFIDENCE
+NMS_IOU           = 0.3
+
+
+class FaceDetector(ABC):
+    name = ""
+
+    @abstractmethod
+    def detect_faces(self, img_rgb: np.ndarray) -> list[dict]:
+        """[{"box": [x, y, w, h], "confidence": c}, ...] for an RGB uint8 image."""
+
+
+def _boxes(corners: np.ndarray, scores: np.ndarray, width: int, height: int) -> list[dict]:
+    """Normalised (x1, y1, x2, y2) corners → MTCNN-style pixel boxes."""
+    scaled = corners * np.array([width, height, width, height], dtype=np.float32)
+    return [
+        {"box": [int(x1), int(y1), int(x2 - x1), int(y2 - y1)], "confidence": float(score)}
+        for (x1, y1, x2, y2), score in zip(scaled.round(), scores)
+        if x2 > x1 and y2 > y1
+    ]
+
+
+def _nms(corners: np.ndarray, scores: np.ndarray, iou: float = NMS_IOU) -> np.ndarray:
+    """Indices kept by greedy non-maximum suppression, best first."""
+    order = np.argsort(-scores)
+    area = (corners[:, 2] - corners[:, 0]) * (corners[:, 3] - corners[:, 1])
+    keep = []
+    while len(order):
+        i, rest = order[0], order[1:]
+        keep.append(i)
+        w = np.clip(np.minimum(corners[i, 2], corners[rest, 2]) - np.maximum(corners[i, 0], corners[rest, 0]), 0, None)
+        h = np.clip(np.minimum(corners[i, 3], corners[rest, 3]) - np.maximum(corners[i, 1], corners[rest, 1]), 0, None)
+        overlap = w * h / np.maximum(area[i] + area[rest] - w * h, 1e-12)
+        order = rest[overlap <= iou]
+    return np.asarray(keep, dtype=np.int64)
+
+
+class MTCNNDetector(FaceDetector):
+    name = "mtcnn"
+
+    def __init__(self):
+        from mtcnn.mtcnn import MTCNN
+        self._mtcnn = MTCNN()
+
+    def detect_faces(self, img_rgb: np.ndarray) -> list[dict]:
+        return [{"box": d["box"], "confidence": d["confidence"]} for d in self._mtcnn.detect_faces(img_rgb)]
+
+
+class OpenCVDnnDetector(FaceDetector):
+    """res10 SSD (Caffe); BGR input at 300×300 with the model's mean subtraction."""
+    name = "opencv"
+    INPUT_SIZE = (300, 300)
+    MEAN = (104.0, 177.0, 123.0)
+
+    def __init__(self, prototxt: str = OPENCV_PROTOTXT, model: str = OPENCV_MODEL):
+        for path in (prototxt, model):
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"FACE_DETECTOR=opencv needs {path}")
+        self._net = cv2.dnn.readNetFromCaffe(prototxt, model)
+        self._lock = threading.Lock()           # a cv2.dnn.Net is not thread-safe
+
+    def detect_faces(self, img_rgb: np.ndarray) -> list[dict]:
+        height, width = img_rgb.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.cvtColor(img_rgb, cv2.COLOR_RGB2BGR), 1.0,
+                                     self.INPUT_SIZE, self.MEAN)
+        with self._lock:
+            self._net.setInput(blob)
+            out = self._net.forward()[0, 0]     # (N, 7): _, _, score, x1, y1, x2, y2
+        out = out[out[:, 2] >= CANDIDATE_SCORE]
+        return _boxes(np.clip(out[:, 3:7], 0.0, 1.0), out[:, 2], width, height)
+
+
+class OnnxFaceDetector(FaceDetector):
+    """UltraFace RFB-320: RGB 320×240, (x − 127) / 128, outputs scores (1,N,2) and boxes (1,N,4)."""
+    name = "onnx"
+    INPUT_SIZE = (320, 240)
+
+    def __init__(self, model: str = ONNX_MODEL):
+        try:
+            import onnxruntime          # optional dependency, only needed for "onnx"
+        except ImportError:
+            raise RuntimeError("FACE_DETECTOR=onnx requires the onnxruntime package") from None
+        if not os.path.exists(model):
+            raise FileNotFoundError(f"FACE_DETECTOR=onnx needs {model}")
+        self._session = onnxruntime.InferenceSession(model, providers=["CPUExecutionProvider"])
+        self._input = self._session.get_inputs()[0].name
+
+    def detect_faces(self, img_rgb: np.ndarray) -> list[dict]:
+        height, width = img_rgb.shape[:2]
+        x = cv2.resize(img_rgb, self.INPUT_SIZE).astype(np.float32)
+        x = ((x - 127.0) / 128.0).transpose(2, 0, 1)[None]
+        scores, corners = self._session.run(None, {self._input: x})
+        scores, corners = scores[0, :, 1], corners[0]
+        keep = scores >= CANDIDATE_SCORE
+        scores, corners = scores[keep], np.clip(corners[keep], 0.0, 1.0)
+        keep = _nms(corners, scores)
+        return _boxes(corners[keep], scores[keep], width, height)
+
+
+class DetectorFactory:
+    @staticmethod
+    def get_detector(name: str = DETECTOR) -> FaceDetector:
+        if name == "mtcnn":
+            return MTCNNDetector()
+        elif name == "opencv":
+            return OpenCVDnnDetector()
+        elif name == "onnx":
+            return OnnxFaceDetector()
+        else:
+            raise ValueError(f"Unknown face detector: {name}")
@@ -0,0 +1,155 @@
+# AiModels/face_recognition/embedding_batcher.py
+"""
+Micro-batching of concurrent FaceNet calls
+------------------------------------------
+
+Uploads and searches running on different threads each embed one or two
+crops, so most of every forward pass is per-call overhead.  With
+FACENET_BATCH_WINDOW_MS > 0 their crops are handed to one scheduler
+thread instead: it waits up to the window after the first request (or
+until FACENET_BATCH_MAX crops are waiting), runs them as one batch and
+hands each caller its own rows back.
+
+`stats()` reports the batch-size histogram (crops per forward pass) and
+the time requests spent waiting for their batch to start.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+from AiModels.face_recognition.facenet import get_embeddings, BATCH_SIZE
+
+# ── enables ─────────────────────────────────────────────────────────
+WINDOW_MS = float(os.getenv("FACENET_BATCH_WINDOW_MS", "0"))     # 0 → every call runs on its own
+MAX_BATCH = int(os.getenv("FACENET_BATCH_MAX", str(BATCH_SIZE)))
+
+HISTOGRAM_BUCKETS = (1, 2, 4, 8, 16, 32, 64)    # upper bounds, larger batches count as "+Inf"
+WAIT_SAMPLES      = 1024                        # recent waits kept for the percentiles
+
+logger = logging.getLogger("EmbeddingBatcher")
+
+
+class _Request:
+    def __init__(self, crops: list[np.ndarray]):
+        self.crops = crops
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    def __init__(self, window_ms: float = WINDOW_MS, max_batch: int = MAX_BATCH, run=get_embeddings):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._run = run                 # run(crops, batch_size) → (N, 512)
+        self._queue: queue.Queue[_Request] = queue.Queue()
+        self._carry = None              # request that did not fit the previous batch
+        self._lock = threading.Lock()
+        self._histogram = {str(b): 0 for b in HISTOGRAM_BUCKETS} | {"+Inf": 0}
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self.batches = 0
+        self.requests = 0
+        self.crops = 0
+        self._thread = threading.Thread(target=self._loop, name="embedding-batcher", daemon=True)
+        self._thread.start()
+
+    def embed(self, crops: list[np.ndarray]) -> np.ndarray:
+        """Same as facenet.get_embeddings(crops), run in a shared batch."""
+        if not crops:
+            return self._run(crops)
+        request = _Request(crops)
+        self._queue.put(request)
+        return request.future.result()
+
+    # ───────── scheduler ───────────────────────────────
+    def _collect(self) -> list[_Request]:
+        first, self._carry = self._carry or self._queue.get(), None
+        batch, size = [first], len(first.crops)
+        deadline = time.perf_counter() + self.window
+        while size < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if size + len(request.crops) > self.max_batch:
+                self._carry = request           # starts the next batch
+                break
+            batch.append(request)
+            size += len(request.crops)
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            crops = [c for r in batch for c in r.crops]
+            self._record(batch, len(crops))
+            try:
+                out = self._run(crops, batch_size=max(len(crops), self.max_batch))
+            except Exception as e:
+                logger.exception("Embedding batch of %s crops failed", len(crops))
+                for r in batch:
+                    r.future.set_exception(e)
+                continue
+            start = 0
+            for r in batch:
+                r.future.set_result(out[start:start + len(r.crops)])
+                start += len(r.crops)
+
+    def _record(self, batch: list[_Request], size: int) -> None:
+        now = time.perf_counter()
+        bucket = next((str(b) for b in HISTOGRAM_BUCKETS if size <= b), "+Inf")
+        with self._lock:
+            self.batches += 1
+            self.requests += len(batch)
+            self.crops += size
+            self._histogram[bucket] += 1
+            self._waits.extend((now - r.enqueued) * 1000 for r in batch)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = np.array(self._waits)
+            histogram = dict(self._histogram)
+            batches, requests, crops = self.batches, self.requests, self.crops
+
+        def pct(q):
+            return round(float(np.percentile(waits, q)), 2) if len(waits) else None
+
+        return {
+            "window_ms":        self.window * 1000,
+            "max_batch":        self.max_batch,
+            "batches":          batches,
+            "requests":         requests,
+            "mean_batch_size":  round(crops / batches, 2) if batches else None,
+            "batch_size_histogram": histogram,
+            "queue_wait_ms":    {"p50": pct(50), "p99": pct(99),
+                                 "max": round(float(waits.max()), 2) if len(waits) else None},
+            "pending":          self._queue.qsize(),
+        }
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+def get_batcher() -> EmbeddingBatcher | None:
+    """Process-wide batcher, started on first use; None when FACENET_BATCH_WINDOW_MS = 0."""
+    global _batcher
+    if WINDOW_MS <= 0:
+        return None
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = EmbeddingBatcher()
+    return _batcher
+
+def embed_crops(crops: list[np.ndarray]) -> np.ndarray:
+    """facenet.get_embeddings(crops), through the batcher when it is on."""
+    batcher = get_batcher()
+    return batcher.embed(crops) if batcher else get_embeddings(crops)
@@ -0,0 +1,79 @@
+# AiModels/face_recognition/export_onnx.py
+"""
+One-off export of the keras-facenet weights to ONNX
+---------------------------------------------------
+
+    python -m AiModels.face_recognition.export_onnx [--out path] [--opset 13]
+
+Writes the graph FACENET_BACKEND=onnx loads (paths.FACENET_ONNX_PATH by
+default), then checks it against the Keras model on sample crops.  The
+weights are the same, so MODEL_VERSION is shared and stored embeddings
+stay valid as long as the parity check passes.
+
+Needs TensorFlow and the `tf2onnx` package, which only this tool uses.
+"""
+import argparse
+import pathlib
+import sys
+
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parents[2]
+sys.path.append(str(ROOT))
+
+from AiModels.face_recognition.facenet import IMAGE_SIZE, ONNX_MODEL, get_embeddings, _get_model
+
+PARITY_TOLERANCE = 1e-3     # max cosine deviation accepted between the two paths
+
+
+def export(out: str, opset: int = 13) -> None:
+    try:
+        import tensorflow as tf
+        import tf2onnx
+    except ImportError:
+        sys.exit("export needs tensorflow and tf2onnx: pip install tf2onnx")
+
+    model = _get_model().model
+    spec = (tf.TensorSpec((None, IMAGE_SIZE, IMAGE_SIZE, 3), tf.float32, name="input"),)
+    pathlib.Path(out).parent.mkdir(parents=True, exist_ok=True)
+    tf2onnx.convert.from_keras(model, input_signature=spec, opset=opset, output_path=out)
+    print(f"[FaceNet] exported to {out}")
+
+
+def parity(crops: list[np.ndarray]) -> tuple[float, float]:
+    """returns : (max, mean) cosine deviation between Keras and ONNX embeddings of crops"""
+    keras_emb = get_embeddings(crops, backend="keras")
+    onnx_emb = get_embeddings(crops, backend="onnx")
+    deviation = 1.0 - np.sum(keras_emb * onnx_emb, axis=1)
+    return float(deviation.max()), float(deviation.mean())
+
+
+def sample_crops(n: int) -> list[np.ndarray]:
+    """LFW crops when the dataset is present, random crops otherwise."""
+    from benchmarks.datasets import lfw_crops
+    try:
+        return lfw_crops(n)[0][:n]
+    except FileNotFoundError:
+        rng = np.random.default_rng(0)
+        return [rng.uniform(0, 255, (IMAGE_SIZE, IMAGE_SIZE, 3)).astype("float32") for _ in range(n)]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--out", default=ONNX_MODEL)
+    ap.add_argument("--opset", type=int, default=13)
+    ap.add_argument("--check", type=int, default=256, help="crops in the parity check (0 skips)")
+    args = ap.parse_args()
+
+    export(args.out, args.opset)
+    if args.check:
+        if args.out != ONNX_MODEL:
+            sys.exit("parity check loads FACENET_ONNX_MODEL; set it to --out or pass --check 0")
+        worst, mean = parity(sample_crops(args.check))
+        print(f"[FaceNet] parity on {args.check} crops: max cosine deviation {worst:.2e}, mean {mean:.2e}")
+        if worst > PARITY_TOLERANCE:
+            sys.exit(f"parity check failed (> {PARITY_TOLERANCE})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,23 +1,101 @@
 # AiModels/face_recognition/facenet.py
-from keras_facenet import FaceNet
-import numpy as np, time
+import os
+import numpy as np, time, cv2
+
+from AiModels.model_registry import models
+from paths import FACENET_ONNX_PATH
+
+# bump whenever the weights or preprocessing change, stored embeddings
+# with another version are recomputed ("-batched": _prepare + direct model
+# call instead of FaceNet.embeddings, see benchmarks/embedding_benchmark.py)
+MODEL_VERSION = "keras-facenet-20180402-114759-batched"
+EMBEDDING_DIM = 512
+IMAGE_SIZE    = 160         # FaceNet input side
+BATCH_SIZE    = 32
+
+# ── enables ─────────────────────────────────────────────────────────
+BACKEND           = os.getenv("FACENET_BACKEND", "keras")           # keras | onnx
+ONNX_MODEL        = os.getenv("FACENET_ONNX_MODEL", FACENET_ONNX_PATH)
+ORT_INTRA_THREADS = int(os.getenv("FACENET_ORT_INTRA_THREADS", "0"))  # 0 → one per core
+ORT_INTER_THREADS = int(os.getenv("FACENET_ORT_INTER_THREADS", "1"))
+
+def _load_keras():
+    # imported here so the index modules can use the constants above
+    # without loading TensorFlow (e.g. in index shard processes)
+    from keras_facenet import FaceNet
+    t0 = time.time()
+    print("[FaceNet] first boot – downloading weights …")
+    embedder = FaceNet()                # auto-downloads 92 MB .h5 to ~/.keras
+    embedder.model(np.zeros((1, IMAGE_SIZE, IMAGE_SIZE, 3), np.float32), training=False)  # trace once
+    print(f"[FaceNet] ready! ({time.time()-t0:.1f}s)")
+    return embedder
+
+def _load_onnx():
+    """ONNX Runtime session over the weights exported by export_onnx.py."""
+    import onnxruntime
+    if not os.path.exists(ONNX_MODEL):
+        raise FileNotFoundError(
+            f"FACENET_BACKEND=onnx needs {ONNX_MODEL}; "
+            "run python -m AiModels.face_recognition.export_onnx")
+    opts = onnxruntime.SessionOptions()
+    opts.intra_op_num_threads = ORT_INTRA_THREADS
+    opts.inter_op_num_threads = ORT_INTER_THREADS
+    opts.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    opts.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    t0 = time.time()
+    session = onnxruntime.InferenceSession(ONNX_MODEL, opts, providers=["CPUExecutionProvider"])
+    print(f"[FaceNet] ONNX Runtime session ready! ({time.time()-t0:.1f}s)")
+    return session
+
+# built on first use or by the worker's warm-up, see AiModels/model_registry.py
+models.register("facenet-keras", _load_keras, warm=BACKEND == "keras")
+models.register("facenet-onnx", _load_onnx, warm=BACKEND == "onnx")
 
-_embedder = None
 def _get_model():
-    global _embedder
-    if _embedder is None:
-        t0 = time.time()
-        print("[FaceNet] first boot – downloading weights …")
-        _embedder = FaceNet()               # auto-downloads 92 MB .h5 to ~/.keras
-        print(f"[FaceNet] ready! ({time.time()-t0:.1f}s)")
-    return _embedder
+    return models.get("facenet-keras")
+
+def _get_session():
+    return models.get("facenet-onnx")
+
+def _keras_runner():
+    model = _get_model().model
+    return lambda batch: np.asarray(model(batch, training=False))
+
+def _onnx_runner():
+    session = _get_session()
+    name = session.get_inputs()[0].name
+    return lambda batch: session.run(None, {name: batch})[0]
+
+def _prepare(img_rgb: np.ndarray) -> np.ndarray:
+    # same resize + fixed standardisation as FaceNet.embeddings
+    img = cv2.resize(np.asarray(img_rgb, dtype=np.float32), (IMAGE_SIZE, IMAGE_SIZE))
+    return (img - 127.5) / 127.5
+
+def get_embeddings(crops: list[np.ndarray], batch_size: int = BATCH_SIZE,
+                   backend: str | None = None) -> np.ndarray:
+    """
+    crops  : RGB float32 face crops in [0,255], any size
+    backend: keras | onnx, FACENET_BACKEND by default
+    returns: (N, 512) L2-normalised embeddings, one row per crop
+    Crops are resized into one (B,160,160,3) tensor per batch and run through
+    the Keras model directly, skipping FaceNet.embeddings' per-call predict()
+    overhead, or through the exported ONNX graph.
+    """
+    out = np.empty((len(crops), EMBEDDING_DIM), dtype=np.float32)
+    if not crops:
+        return out
+    backend = backend or BACKEND
+    if backend not in ("keras", "onnx"):
+        raise ValueError(f"Unknown FaceNet backend: {backend}")
+    run = _onnx_runner() if backend == "onnx" else _keras_runner()
+    for i in range(0, len(crops), batch_size):
+        batch = np.stack([_prepare(c) for c in crops[i:i+batch_size]]).astype(np.float32)
+        out[i:i+len(batch)] = run(batch)
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
 
 def get_embedding(img_rgb: np.ndarray) -> np.ndarray:
     """
     img_rgb: RGB float32 in [0,255]
-    returns : 128-D L2-normalised embedding
+    returns : 512-D L2-normalised embedding
     """
-    model = _get_model()
-    # FaceNet.embeddings returns list[np.ndarray]
-    emb = model.embeddings([img_rgb])[0]
-    return emb / np.linalg.norm(emb)
+    return get_embeddings([img_rgb])[0]
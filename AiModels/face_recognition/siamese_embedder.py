@@ -0,0 +1,81 @@
+# AiModels/face_recognition/siamese_embedder.py
+"""
+Cheap 50-D face embedding from the trained Siamese tower
+--------------------------------------------------------
+
+The shared `base_cnn` tower of the Siamese model (see siamese_network.py,
+trained by train_model.py) maps a 100×100 grayscale crop to 50 features at
+a fraction of FaceNet's cost.  Searches use it as a pre-filter: the whole
+gallery is ranked on these vectors and only the best FACE_CASCADE_FRACTION
+is scored with FaceNet (see FaceIndex).
+
+Enabled with FACE_CASCADE=1 when the trained weights exist at
+SIAMESE_MODEL_PATH.
+"""
+import logging
+import os
+import time
+
+import cv2
+import numpy as np
+
+from AiModels.model_registry import models
+from paths import SIAMESE_MODEL_PATH
+
+# ── enables ─────────────────────────────────────────────────────────
+CASCADE = (os.getenv("FACE_CASCADE", "0").lower() in ("1", "true", "yes")
+           and os.path.exists(SIAMESE_MODEL_PATH))
+
+logger = logging.getLogger("SiameseEmbedder")
+
+# only the brute-force FaceIndex pre-filters; with an ANN backend or shards the
+# cascade would just force every post to be re-analysed for nothing
+# (read from the environment: AiModels does not import from services)
+_OTHER_SEARCH = [name for name, on in (
+    ("FACE_INDEX_BACKEND", os.getenv("FACE_INDEX_BACKEND", "exact") != "exact"),
+    ("FACE_INDEX_SHARDS",  int(os.getenv("FACE_INDEX_SHARDS", "0")) > 0),
+) if on]
+if CASCADE and _OTHER_SEARCH:
+    logger.warning("FACE_CASCADE ignored: not supported with %s", " / ".join(_OTHER_SEARCH))
+    CASCADE = False
+
+# bump whenever the Siamese weights or preprocessing change
+SMALL_MODEL_VERSION = "siamese-base_cnn-100x100-v1"
+SMALL_DIM   = 50
+IMAGE_SIDE  = 100           # same preprocessing as train_model.py
+BATCH_SIZE  = 256
+
+def _load_tower():
+    from keras.models import load_model
+    # registers the Lambda / loss helpers the saved model refers to
+    import AiModels.face_recognition.siamese_network  # noqa: F401
+    t0 = time.time()
+    tower = load_model(SIAMESE_MODEL_PATH, compile=False).get_layer("base_cnn")
+    print(f"[Siamese] tower ready! ({time.time()-t0:.1f}s)")
+    return tower
+
+models.register("siamese_tower", _load_tower, warm=CASCADE)
+
+def _get_tower():
+    return models.get("siamese_tower")
+
+def _prepare(img_rgb: np.ndarray) -> np.ndarray:
+    gray = cv2.cvtColor(np.asarray(img_rgb, dtype=np.float32), cv2.COLOR_RGB2GRAY)
+    gray = cv2.resize(gray, (IMAGE_SIDE, IMAGE_SIDE))
+    return (gray / 255.0)[None]             # channels-first (1,H,W)
+
+def get_small_embeddings(crops: list[np.ndarray], batch_size: int = BATCH_SIZE) -> np.ndarray:
+    """
+    crops  : RGB float32 face crops in [0,255], any size (the FaceNet crops)
+    returns: (N, 50) L2-normalised tower outputs; an all-zero ReLU output
+             stays zero and is never pre-filtered out
+    """
+    out = np.zeros((len(crops), SMALL_DIM), dtype=np.float32)
+    if not crops:
+        return out
+    tower = _get_tower()
+    for i in range(0, len(crops), batch_size):
+        batch = np.stack([_prepare(c) for c in crops[i:i+batch_size]]).astype(np.float32)
+        out[i:i+len(batch)] = np.asarray(tower(batch, training=False))
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    return np.divide(out, norms, out=out, where=norms > 0)
@@ -0,0 +1,95 @@
+# AiModels/model_registry.py
+"""
+Lazily constructed models with a background warm-up
+---------------------------------------------------
+
+Model modules register a loader under a name instead of building the model
+at import; the first `get(name)` builds it (once, other callers wait).
+`start_warm_up()` builds every model marked `warm` on a background thread
+at worker start, so importing the app never loads TensorFlow or the
+detector and the first search does not pay for the boot.
+
+`ready()` turns true once every warm model is loaded; `status()` reports
+per-model state, load time and error (see GET /api/ready).
+"""
+import logging
+import os
+import threading
+import time
+
+# ── enables ─────────────────────────────────────────────────────────
+WARM_UP = os.getenv("MODEL_WARMUP", "1").lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("ModelRegistry")
+
+
+class _Entry:
+    def __init__(self, loader, warm: bool):
+        self.loader = loader
+        self.warm = warm
+        self.model = None
+        self.state = "pending"          # pending | loading | ready | failed
+        self.error = None
+        self.load_s = None
+        self.lock = threading.Lock()
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._entries: dict[str, _Entry] = {}
+        self._thread = None
+
+    def register(self, name: str, loader, warm: bool = True) -> None:
+        """loader() builds the model; warm models are loaded by the warm-up."""
+        self._entries[name] = _Entry(loader, warm)
+
+    def set_warm(self, name: str, warm: bool) -> None:
+        """Include or leave out a registered model from the warm-up (and ready())."""
+        self._entries[name].warm = warm
+
+    def get(self, name: str):
+        entry = self._entries[name]
+        if entry.state == "ready":
+            return entry.model
+        with entry.lock:
+            if entry.state != "ready":
+                entry.state = "loading"
+                t0 = time.time()
+                try:
+                    entry.model = entry.loader()
+                except Exception as e:
+                    entry.state, entry.error = "failed", str(e)
+                    raise
+                entry.load_s = round(time.time() - t0, 2)
+                entry.state, entry.error = "ready", None
+                logger.info("Model %s loaded in %.1fs", name, entry.load_s)
+        return entry.model
+
+    def warm_up(self) -> None:
+        """Loads every warm model in this thread; failures are logged, not raised."""
+        for name, entry in list(self._entries.items()):
+            if entry.warm:
+                try:
+                    self.get(name)
+                except Exception:
+                    logger.exception("Warming up model %s failed", name)
+
+    def start_warm_up(self) -> None:
+        if self._thread is None and WARM_UP:
+            self._thread = threading.Thread(target=self.warm_up, name="model-warm-up", daemon=True)
+            self._thread.start()
+
+    def ready(self) -> bool:
+        return all(e.state == "ready" for e in self._entries.values() if e.warm)
+
+    def status(self) -> dict:
+        return {
+            "ready":  self.ready(),
+            "models": {
+                name: {"state": e.state, "warm": e.warm, "load_s": e.load_s, "error": e.error}
+                for name, e in self._entries.items()
+            },
+        }
+
+
+models = ModelRegistry()
@@ -1,8 +1,12 @@
-from flask import Flask
+import os
+
+from flask import Flask, jsonify
 from controllers.auth_controller import auth_bp
 from controllers.posts_controller import posts_bp 
 from controllers.admin_controller import admin_bp
 from controllers import aging_controller
+from services.index_maintainer import start_index_maintainer
+from AiModels.model_registry import models
 
 
 # Create and configure the Flask application
@@ -13,9 +17,33 @@ def create_app():
     app.register_blueprint(admin_bp, url_prefix="/api/admin")
     app.register_blueprint(aging_controller.aging_bp, url_prefix='/api')
 
+    # liveness, and readiness once the face models are loaded
+    @app.route("/api/health", methods=["GET"])
+    def health():
+        return jsonify(status="ok"), 200
+
+    @app.route("/api/ready", methods=["GET"])
+    def ready():
+        status = models.status()
+        return jsonify(status), 200 if status["ready"] else 503
+
     return app
 
 
+# Background work of a serving process only, never a side effect of
+# create_app (scripts, tests, the reloader's watcher process); see wsgi.py.
+def start_background_services():
+    # load the face models in the background instead of on the first search
+    models.start_warm_up()
+
+    # keep this worker's face indexes in step with other workers' writes
+    start_index_maintainer()
+
+
 if __name__ == '__main__':
     app = create_app()
+    # with debug=True the reloader re-runs this file in a child process that serves;
+    # the parent only watches files
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_services()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,95 @@
+# benchmarks/ann_benchmark.py
+"""
+Recall-vs-latency sweep for the FaceIndex ANN backends.
+
+    python -m benchmarks.ann_benchmark --dataset synthetic --n 200000
+    python -m benchmarks.ann_benchmark --dataset lfw
+
+Recall@k is measured against exact cosine top-k over the same gallery, so it
+isolates what the backend loses; distances themselves are always exact.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.datasets import synthetic_gallery, lfw_gallery, exact_topk, recall_at_k
+from services.ann_index import IVFBackend, HNSWBackend, hnswlib
+from services.face_index import FaceIndex
+
+
+def build(gallery: np.ndarray, backend) -> tuple[FaceIndex, float]:
+    index = FaceIndex(dim=gallery.shape[1], capacity=len(gallery), backend=backend)
+    t0 = time.perf_counter()
+    for i, vec in enumerate(gallery):
+        index.add(i, vec)
+    index.train(force=backend is not None and not isinstance(backend, HNSWBackend))
+    return index, time.perf_counter() - t0
+
+
+def run_queries(index: FaceIndex, queries: np.ndarray, k: int):
+    found, lat = [], []
+    for q in queries:
+        t0 = time.perf_counter()
+        res = index.search(q, k=k)
+        lat.append(time.perf_counter() - t0)
+        found.append([key for key, _ in res])
+    lat_ms = np.asarray(lat) * 1000
+    return found, float(np.percentile(lat_ms, 50)), float(np.percentile(lat_ms, 99))
+
+
+def report(name: str, knob: str, build_s: float, result, truth) -> dict:
+    found, p50, p99 = result
+    row = {
+        "backend": name, "knob": knob, "build_s": round(build_s, 2),
+        "recall": round(recall_at_k(found, truth), 4),
+        "p50_ms": round(p50, 3), "p99_ms": round(p99, 3),
+    }
+    print(f"{name:<8} {knob:<14} build {row['build_s']:>7.2f}s  recall@k {row['recall']:.4f}  "
+          f"p50 {row['p50_ms']:>8.3f}ms  p99 {row['p99_ms']:>8.3f}ms")
+    return row
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dataset", choices=["synthetic", "lfw"], default="synthetic")
+    ap.add_argument("--n", type=int, default=100_000, help="synthetic gallery size")
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    ap.add_argument("--pq-m", type=int, nargs="+", default=[0, 32])
+    ap.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128])
+    args = ap.parse_args()
+
+    if args.dataset == "synthetic":
+        gallery, queries = synthetic_gallery(args.n, args.dim, args.queries)
+    else:
+        gallery, queries = lfw_gallery(args.queries)
+    print(f"gallery {gallery.shape}, {len(queries)} queries, k={args.k}")
+    truth = exact_topk(gallery, queries, args.k)
+
+    rows = []
+    index, build_s = build(gallery, None)
+    rows.append(report("exact", "-", build_s, run_queries(index, queries, args.k), truth))
+
+    for pq_m in args.pq_m:
+        index, build_s = build(gallery, IVFBackend(pq_m=pq_m))
+        for nprobe in args.nprobe:
+            index.backend.nprobe = nprobe
+            rows.append(report("ivf" if not pq_m else f"ivf-pq{pq_m}", f"nprobe={nprobe}", build_s,
+                               run_queries(index, queries, args.k), truth))
+
+    if hnswlib is not None:
+        index, build_s = build(gallery, HNSWBackend(gallery.shape[1], capacity=len(gallery)))
+        for ef in args.ef:
+            index.backend.ef = ef
+            rows.append(report("hnsw", f"ef={ef}", build_s,
+                               run_queries(index, queries, args.k), truth))
+    else:
+        print("hnswlib not installed; skipping hnsw")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
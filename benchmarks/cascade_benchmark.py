@@ -0,0 +1,91 @@
+# benchmarks/cascade_benchmark.py
+"""
+Siamese pre-filter → FaceNet cascade against FaceNet-only search on LFW.
+
+    python -m benchmarks.cascade_benchmark --fractions 0.5 0.2 0.1 0.05
+
+Needs the trained Siamese weights (paths.SIAMESE_MODEL_PATH).  Queries are
+held-out images of people with ≥ 2 images (see datasets.lfw_split).  For
+each cascade fraction it reports recall@k against the FaceNet-only top-k
+(what the pre-filter loses), identity hit-rate@1 (the top match is the same
+person, end to end), and query latency.
+"""
+import argparse
+import os
+
+import numpy as np
+
+from benchmarks.ann_benchmark import run_queries
+from benchmarks.datasets import LFW_CACHE, lfw_crops, lfw_embeddings, lfw_split, exact_topk, recall_at_k
+from services.face_index import FaceIndex
+
+SMALL_CACHE = LFW_CACHE.with_name("lfw_small_embeddings.npz")
+
+
+def lfw_small_embeddings(n: int) -> np.ndarray:
+    """Siamese embeddings of the same crops, row for row with lfw_embeddings(); cached."""
+    if SMALL_CACHE.is_file():
+        small = np.load(SMALL_CACHE)["embeddings"]
+        if len(small) == n:
+            return small
+
+    from AiModels.face_recognition.siamese_embedder import get_small_embeddings
+
+    crops, _ = lfw_crops()
+    small = get_small_embeddings(crops)
+    os.makedirs(SMALL_CACHE.parent, exist_ok=True)
+    np.savez(SMALL_CACHE, embeddings=small)
+    return small
+
+
+class _CascadeQueries:
+    """Adapts FaceIndex.search to run_queries' (query) → results signature."""
+
+    def __init__(self, index: FaceIndex, small_queries: np.ndarray | None):
+        self.index = index
+        self.small = iter(small_queries) if small_queries is not None else None
+
+    def search(self, q, k):
+        return self.index.search(q, k=k, small_query=next(self.small) if self.small else None)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--queries", type=int, default=500)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--fractions", type=float, nargs="+", default=[0.5, 0.25, 0.1, 0.05, 0.02])
+    args = ap.parse_args()
+
+    emb, labels = lfw_embeddings()
+    small = lfw_small_embeddings(len(emb))
+    mask, q_idx = lfw_split(labels, args.queries)
+    gallery, g_labels, g_small = emb[mask], labels[mask], small[mask]
+    queries, q_labels, q_small = emb[q_idx], labels[q_idx], small[q_idx]
+    print(f"gallery {gallery.shape} + small {g_small.shape}, {len(queries)} queries, k={args.k}")
+    truth = exact_topk(gallery / np.linalg.norm(gallery, axis=1, keepdims=True),
+                       queries / np.linalg.norm(queries, axis=1, keepdims=True), args.k)
+
+    rows = []
+    for fraction in [1.0] + args.fractions:
+        index = FaceIndex(dim=gallery.shape[1], capacity=len(gallery),
+                          small_dim=g_small.shape[1], cascade_fraction=fraction)
+        for i, (vec, sv) in enumerate(zip(gallery, g_small)):
+            index.add(i, vec, sv)
+        found, p50, p99 = run_queries(_CascadeQueries(index, None if fraction == 1.0 else q_small),
+                                      queries, args.k)
+        row = {
+            "fraction": fraction,
+            "recall":   round(recall_at_k(found, truth), 4),
+            "hit_at_1": round(float(np.mean([bool(f) and g_labels[f[0]] == l for f, l in zip(found, q_labels)])), 4),
+            "p50_ms":   round(p50, 3),
+            "p99_ms":   round(p99, 3),
+        }
+        name = "facenet-only" if fraction == 1.0 else f"cascade {fraction:g}"
+        print(f"{name:<15} recall@k {row['recall']:.4f}  hit@1 {row['hit_at_1']:.4f}  "
+              f"p50 {row['p50_ms']:>8.3f}ms  p99 {row['p99_ms']:>8.3f}ms")
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# benchmarks/datasets.py
+"""
+Embedding galleries for the face-search benchmarks.
+
+• synthetic_gallery(...) → clustered unit vectors (identities + noise), with
+                           held-out queries drawn from the same identities
+• lfw_gallery(...)       → FaceNet embeddings of the LFW deep-funneled images,
+                           cached to data/lfw_prepared/lfw_embeddings.npz
+• lfw_images()           → (person, path) of every LFW image
+• lfw_split(...)         → the gallery / query split lfw_gallery uses
+"""
+import os
+import pathlib
+import sys
+
+import numpy as np
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT))
+
+LFW_IMAGES_DIR = ROOT / "lfw_dataset" / "lfw-deepfunneled"
+LFW_CACHE      = ROOT / "data" / "lfw_prepared" / "lfw_embeddings.npz"
+
+
+def _normalise(x: np.ndarray) -> np.ndarray:
+    return (x / np.linalg.norm(x, axis=1, keepdims=True)).astype(np.float32)
+
+
+def synthetic_gallery(n: int, dim: int = 512, n_queries: int = 200,
+                      per_identity: int = 16, noise: float = 0.8, seed: int = 0):
+    """
+    returns : (gallery (n, dim), queries (n_queries, dim)), both L2-normalised.
+    Each identity is a random direction; its samples are that direction plus
+    Gaussian noise, which gives FaceNet-like same/different distance gaps.
+    """
+    rng = np.random.default_rng(seed)
+    n_ids = max(1, n // per_identity)
+    centres = rng.standard_normal((n_ids, dim), dtype=np.float32)
+    centres /= np.linalg.norm(centres, axis=1, keepdims=True)
+    scale = noise / np.sqrt(dim)
+
+    gallery = np.empty((n, dim), dtype=np.float32)
+    chunk = 65536
+    for i in range(0, n, chunk):
+        ids = np.arange(i, min(n, i + chunk)) % n_ids
+        gallery[i : i + len(ids)] = centres[ids] + scale * rng.standard_normal((len(ids), dim), dtype=np.float32)
+    q_ids = rng.integers(0, n_ids, n_queries)
+    queries = centres[q_ids] + scale * rng.standard_normal((n_queries, dim), dtype=np.float32)
+    return _normalise(gallery), _normalise(queries)
+
+
+def lfw_images():
+    """Yields (person, image path) over the LFW images in a fixed order."""
+    if not LFW_IMAGES_DIR.is_dir():
+        raise FileNotFoundError(f"LFW images not found in {LFW_IMAGES_DIR}")
+    for person in sorted(os.listdir(LFW_IMAGES_DIR)):
+        person_dir = LFW_IMAGES_DIR / person
+        if not person_dir.is_dir():
+            continue
+        for name in sorted(os.listdir(person_dir)):
+            yield person, person_dir / name
+
+
+def lfw_crops(limit: int | None = None) -> tuple[list[np.ndarray], list[str]]:
+    """Aligned face crops of the LFW images with their person labels."""
+    from AiModels.face_recognition.align import align_face
+
+    crops, labels = [], []
+    for person, path in lfw_images():
+        if limit and len(crops) >= limit and labels[-1] != person:
+            break
+        crop = align_face(path.read_bytes())
+        if crop is not None:
+            crops.append(crop)
+            labels.append(person)
+    return crops, labels
+
+
+def lfw_embeddings(limit: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """returns : (embeddings (N, D), person labels (N,)); computed once then cached."""
+    if LFW_CACHE.is_file():
+        data = np.load(LFW_CACHE)
+        emb, labels = data["embeddings"], data["labels"]
+        return (emb[:limit], labels[:limit]) if limit else (emb, labels)
+
+    from AiModels.face_recognition.facenet import get_embeddings
+
+    crops, labels = lfw_crops(limit)
+    emb, labels = get_embeddings(crops), np.asarray(labels)
+    os.makedirs(LFW_CACHE.parent, exist_ok=True)
+    np.savez(LFW_CACHE, embeddings=emb, labels=labels)
+    return emb, labels
+
+
+def lfw_split(labels: np.ndarray, n_queries: int = 200, seed: int = 0):
+    """returns : (gallery row mask, query row ids), queries drawn from people with ≥ 2 images."""
+    rng = np.random.default_rng(seed)
+    people, counts = np.unique(labels, return_counts=True)
+    repeat = set(people[counts >= 2])
+    candidates = np.array([i for i, p in enumerate(labels) if p in repeat])
+    q_idx = rng.choice(candidates, min(n_queries, len(candidates)), replace=False)
+    mask = np.ones(len(labels), dtype=bool)
+    mask[q_idx] = False
+    return mask, q_idx
+
+
+def lfw_gallery(n_queries: int = 200, seed: int = 0):
+    """LFW embeddings split into gallery and held-out queries of people with ≥ 2 images."""
+    emb, labels = lfw_embeddings()
+    mask, q_idx = lfw_split(labels, n_queries, seed)
+    return _normalise(emb[mask]), _normalise(emb[q_idx])
+
+
+def exact_topk(gallery: np.ndarray, queries: np.ndarray, k: int, chunk: int | None = None) -> np.ndarray:
+    """Ground-truth top-k row ids by cosine similarity."""
+    # keep the (chunk, N) similarity block around 256 MiB for multi-million galleries
+    chunk = chunk or int(np.clip((1 << 26) // max(1, len(gallery)), 1, 256))
+    out = np.empty((len(queries), k), dtype=np.int64)
+    for i in range(0, len(queries), chunk):
+        sims = queries[i : i + chunk] @ gallery.T
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1)
+        out[i : i + chunk] = np.take_along_axis(top, order, axis=1)
+    return out
+
+
+def recall_at_k(found: list[list], truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    hits = sum(len(set(f[:k]) & set(t.tolist())) for f, t in zip(found, truth))
+    return hits / (k * len(truth))
@@ -0,0 +1,125 @@
+# benchmarks/detection_benchmark.py
+"""
+Face detector benchmark harness: detectors × detection resolutions.
+
+    python -m benchmarks.detection_benchmark --images 500 --max-side 640 480 320
+    python -m benchmarks.detection_benchmark --detectors mtcnn opencv onnx --upscale 1080
+
+LFW images are 250×250, smaller than any useful max side; --upscale
+re-encodes them at an upload-sized resolution first (uploads are up to
+1080 px after preprocessing).  Every (detector, max side) run is compared
+with MTCNN at full resolution: latency, images/s with --threads concurrent
+callers, share of images with a face (before and after the
+full-resolution fallback), agreement (largest box at IoU ≥ 0.5 with
+MTCNN's) and mean IoU.
+"""
+import argparse
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from AiModels.face_recognition.align import detect_faces_rgb
+from AiModels.face_recognition.detectors import DetectorFactory
+from benchmarks.datasets import lfw_images
+
+AGREE_IOU = 0.5
+
+
+def load_images(limit: int, upscale: int) -> list[np.ndarray]:
+    images = []
+    for _, path in itertools.islice(lfw_images(), limit):
+        img = cv2.cvtColor(cv2.imread(str(path)), cv2.COLOR_BGR2RGB)
+        if upscale:
+            img = cv2.resize(img, (upscale, upscale), interpolation=cv2.INTER_CUBIC)
+        images.append(img)
+    return images
+
+
+def iou(a: list[int], b: list[int]) -> float:
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    w = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    h = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = w * h
+    return inter / (aw * ah + bw * bh - inter) if inter else 0.0
+
+
+def run(images: list[np.ndarray], detector, max_side: int):
+    """returns : (largest box or None per image, ms per image)"""
+    boxes, lat = [], []
+    for img in images:
+        t0 = time.perf_counter()
+        faces = detect_faces_rgb(img, max_side, detector)
+        lat.append(time.perf_counter() - t0)
+        boxes.append(faces[0][1] if faces else None)
+    return boxes, np.asarray(lat) * 1000
+
+
+def throughput(images: list[np.ndarray], detector, max_side: int, threads: int) -> float:
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(lambda img: detect_faces_rgb(img, max_side, detector), images))
+    return len(images) / (time.perf_counter() - t0)
+
+
+def report(name: str, max_side: int, images, boxes, ms, full_boxes, full_ms, reference, base_ms, qps) -> dict:
+    # the fallback re-runs full resolution on misses: add that time back
+    misses = np.array([b is None for b in boxes])
+    total_ms = ms + np.where(misses, full_ms, 0.0) if max_side else ms
+    with_fallback = [b if b is not None else f for b, f in zip(boxes, full_boxes)]
+    ious = [iou(b, r) for b, r in zip(with_fallback, reference) if b is not None and r is not None]
+    n_ref = sum(r is not None for r in reference)
+    row = {
+        "detector":          name,
+        "max_side":          max_side,
+        "p50_ms":            round(float(np.percentile(total_ms, 50)), 2),
+        "p99_ms":            round(float(np.percentile(total_ms, 99)), 2),
+        "speedup":           round(float(base_ms.mean() / total_ms.mean()), 2),
+        "images_per_s":      qps,
+        "detected_scaled":   round(float(1 - misses.mean()), 4),
+        "detected_fallback": round(sum(b is not None for b in with_fallback) / len(images), 4),
+        "agreement":         round(sum(v >= AGREE_IOU for v in ious) / n_ref, 4) if n_ref else None,
+        "mean_iou":          round(float(np.mean(ious)), 3) if ious else None,
+    }
+    side = f"{max_side}px" if max_side else "full"
+    rate = "  ".join(f"{t}t {v:>6.1f}/s" for t, v in qps.items())
+    print(f"{name:<7} {side:>6}  p50 {row['p50_ms']:7.1f}ms  p99 {row['p99_ms']:7.1f}ms  x{row['speedup']:<5}  "
+          f"{rate}  detected {row['detected_scaled']:.3f} → {row['detected_fallback']:.3f}  "
+          f"agree {row['agreement']}  IoU {row['mean_iou']}")
+    return row
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--images", type=int, default=500)
+    ap.add_argument("--upscale", type=int, default=0, help="resize LFW images to this side first")
+    ap.add_argument("--detectors", nargs="+", choices=["mtcnn", "opencv", "onnx"], default=["mtcnn"])
+    ap.add_argument("--max-side", type=int, nargs="+", default=[960, 640, 480, 320])
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    args = ap.parse_args()
+
+    images = load_images(args.images, args.upscale)
+    print(f"{len(images)} images at {images[0].shape[1]}x{images[0].shape[0]}")
+
+    mtcnn = DetectorFactory.get_detector("mtcnn")
+    detect_faces_rgb(images[0], 0, mtcnn)                # model boot / warm-up
+    reference, base_ms = run(images, mtcnn, 0)
+
+    rows = []
+    for name in args.detectors:
+        detector = mtcnn if name == "mtcnn" else DetectorFactory.get_detector(name)
+        detect_faces_rgb(images[0], 0, detector)
+        full_boxes, full_ms = (reference, base_ms) if name == "mtcnn" else run(images, detector, 0)
+        for max_side in [0] + args.max_side:
+            boxes, ms = (full_boxes, full_ms) if max_side == 0 else run(images, detector, max_side)
+            qps = {str(t): round(throughput(images, detector, max_side, t), 1) for t in args.threads}
+            rows.append(report(name, max_side, images, boxes, ms, full_boxes, full_ms,
+                               reference, base_ms, qps))
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+# benchmarks/embedding_benchmark.py
+"""
+Per-crop FaceNet.embeddings vs batched get_embeddings: throughput and parity.
+
+    python -m benchmarks.embedding_benchmark --crops 256 --batch-size 8 16 32 64
+
+The reference is keras_facenet's own FaceNet.embeddings([crop]), one crop
+per call (what get_embedding did before batching); "max cosine dev" is the
+largest deviation of get_embeddings' vectors from it.  Uses LFW crops when
+the dataset is present, random crops otherwise (parity is only meaningful
+on real faces).
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.datasets import lfw_crops
+from AiModels.face_recognition.facenet import get_embeddings, _get_model
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--crops", type=int, default=256)
+    ap.add_argument("--batch-size", type=int, nargs="+", default=[8, 16, 32, 64])
+    args = ap.parse_args()
+
+    try:
+        crops, _ = lfw_crops(args.crops)
+        crops = crops[: args.crops]
+    except FileNotFoundError:
+        rng = np.random.default_rng(0)
+        crops = [rng.uniform(0, 255, (rng.integers(80, 200),) * 2 + (3,)).astype("float32")
+                 for _ in range(args.crops)]
+
+    get_embeddings(crops[:2])                    # model boot / warm-up
+    embedder = _get_model()
+
+    t0 = time.perf_counter()
+    single = np.stack([embedder.embeddings([c])[0] for c in crops])
+    single /= np.linalg.norm(single, axis=1, keepdims=True)
+    base = len(crops) / (time.perf_counter() - t0)
+    print(f"FaceNet.embeddings {base:7.1f} faces/s (per crop)")
+
+    for bs in args.batch_size:
+        t0 = time.perf_counter()
+        batched = get_embeddings(crops, batch_size=bs)
+        rate = len(crops) / (time.perf_counter() - t0)
+        dev = float(np.max(1.0 - np.sum(single * batched, axis=1)))
+        print(f"batch_size={bs:<5} {rate:8.1f} faces/s  x{rate / base:4.1f}  max cosine dev {dev:.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# benchmarks/facenet_backend_benchmark.py
+"""
+Keras vs ONNX Runtime FaceNet: boot time, memory, latency, throughput, parity.
+
+    python -m benchmarks.facenet_backend_benchmark --crops 256 --batch-size 1 8 32
+
+Each backend runs in its own interpreter so boot time and resident memory
+are not shared (TensorFlow alone is several hundred MB).  Parity is the
+max / mean cosine deviation between the two backends' embeddings of the
+same crops (LFW when present).  Needs the exported graph, see
+AiModels/face_recognition/export_onnx.py.
+"""
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.search_suite import rss_bytes
+
+BACKENDS = ("keras", "onnx")
+
+
+def worker(backend: str, n_crops: int, batch_sizes: list[int], emb_out: str) -> dict:
+    from AiModels.face_recognition.export_onnx import sample_crops
+    from AiModels.face_recognition.facenet import get_embeddings
+
+    crops = sample_crops(n_crops)
+    rss0 = rss_bytes()
+    t0 = time.perf_counter()
+    get_embeddings(crops[:1], backend=backend)          # import + model boot
+    row = {"backend": backend, "boot_s": round(time.perf_counter() - t0, 2),
+           "rss_mib": round((rss_bytes() - rss0) / 2**20, 1), "batches": {}}
+
+    for bs in batch_sizes:
+        lat = []
+        for i in range(0, len(crops), bs):
+            t0 = time.perf_counter()
+            get_embeddings(crops[i:i+bs], batch_size=bs, backend=backend)
+            lat.append((time.perf_counter() - t0) * 1000)
+        row["batches"][str(bs)] = {
+            "p50_ms":  round(float(np.percentile(lat, 50)), 2),
+            "p99_ms":  round(float(np.percentile(lat, 99)), 2),
+            "faces_s": round(len(crops) / (sum(lat) / 1000), 1),
+        }
+    row["peak_rss_mib"] = round(rss_bytes() / 2**20, 1)
+    np.save(emb_out, get_embeddings(crops, backend=backend))
+    return row
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--crops", type=int, default=256)
+    ap.add_argument("--batch-size", type=int, nargs="+", default=[1, 8, 32])
+    ap.add_argument("--worker", choices=BACKENDS, help=argparse.SUPPRESS)
+    ap.add_argument("--emb-out", help=argparse.SUPPRESS)
+    args = ap.parse_args()
+
+    if args.worker:
+        print(json.dumps(worker(args.worker, args.crops, args.batch_size, args.emb_out)))
+        return
+
+    rows, embs = [], {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for backend in BACKENDS:
+            emb_out = f"{tmp}/{backend}.npy"
+            proc = subprocess.run(
+                [sys.executable, "-m", "benchmarks.facenet_backend_benchmark", "--worker", backend,
+                 "--crops", str(args.crops), "--emb-out", emb_out,
+                 "--batch-size", *map(str, args.batch_size)],
+                capture_output=True, text=True,
+            )
+            if proc.returncode != 0:
+                print(f"{backend}: failed\n{proc.stderr.strip().splitlines()[-1] if proc.stderr else ''}")
+                continue
+            row = json.loads(proc.stdout.strip().splitlines()[-1])
+            embs[backend] = np.load(emb_out)
+            print(f"{backend:<6} boot {row['boot_s']:6.2f}s  +{row['rss_mib']:7.1f} MiB "
+                  f"(peak {row['peak_rss_mib']:.1f} MiB)")
+            for bs, b in row["batches"].items():
+                print(f"       batch {bs:>3}  p50 {b['p50_ms']:8.2f}ms  p99 {b['p99_ms']:8.2f}ms  "
+                      f"{b['faces_s']:8.1f} faces/s")
+            rows.append(row)
+
+    if len(embs) == 2:
+        deviation = 1.0 - np.sum(embs["keras"] * embs["onnx"], axis=1)
+        print(f"parity: max cosine deviation {deviation.max():.2e}, mean {deviation.mean():.2e}")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
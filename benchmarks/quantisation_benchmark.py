@@ -0,0 +1,80 @@
+# benchmarks/quantisation_benchmark.py
+"""
+Memory / latency / recall of the FaceIndex storage formats.
+
+    python -m benchmarks.quantisation_benchmark --n 200000
+    python -m benchmarks.quantisation_benchmark --dataset lfw
+
+For each of float32, float16 and int8 (with and without the float32 exact
+re-rank) it reports MiB per million vectors, query latency, recall@k against
+exact float32 cosine top-k, and the mean absolute error of the reported
+top-1 distance.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.ann_benchmark import run_queries
+from benchmarks.datasets import synthetic_gallery, lfw_gallery, exact_topk, recall_at_k
+from services.face_index import FaceIndex
+
+
+def build(gallery: np.ndarray, storage: str, exact_rerank: bool) -> FaceIndex:
+    index = FaceIndex(dim=gallery.shape[1], capacity=len(gallery),
+                      storage=storage, exact_rerank=exact_rerank)
+    for i, vec in enumerate(gallery):
+        index.add(i, vec)
+    return index
+
+
+def top1_error(index: FaceIndex, gallery: np.ndarray, queries: np.ndarray) -> float:
+    errors = []
+    for q in queries:
+        key, dist = index.search(q, k=1)[0]
+        errors.append(abs(dist - (1.0 - float(gallery[key] @ q))))
+    return float(np.mean(errors))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--dataset", choices=["synthetic", "lfw"], default="synthetic")
+    ap.add_argument("--n", type=int, default=100_000, help="synthetic gallery size")
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    args = ap.parse_args()
+
+    if args.dataset == "synthetic":
+        gallery, queries = synthetic_gallery(args.n, args.dim, args.queries)
+    else:
+        gallery, queries = lfw_gallery(args.queries)
+    print(f"gallery {gallery.shape}, {len(queries)} queries, k={args.k}")
+    truth = exact_topk(gallery, queries, args.k)
+
+    rows = []
+    for storage, exact_rerank in [("float32", False), ("float16", False), ("float16", True),
+                                  ("int8", False), ("int8", True)]:
+        t0 = time.perf_counter()
+        index = build(gallery, storage, exact_rerank)
+        build_s = time.perf_counter() - t0
+        found, p50, p99 = run_queries(index, queries, args.k)
+        row = {
+            "storage":      storage,
+            "exact_rerank": exact_rerank,
+            "build_s":      round(build_s, 2),
+            "mib_per_1m":   round(index.memory_bytes() / len(gallery) * 1e6 / 2**20, 1),
+            "recall":       round(recall_at_k(found, truth), 4),
+            "top1_err":     top1_error(index, gallery, queries),
+            "p50_ms":       round(p50, 3),
+            "p99_ms":       round(p99, 3),
+        }
+        name = storage + ("+rerank" if exact_rerank else "")
+        print(f"{name:<15} {row['mib_per_1m']:>8.1f} MiB/1M  recall@k {row['recall']:.4f}  "
+              f"top1 err {row['top1_err']:.2e}  p50 {row['p50_ms']:>8.3f}ms  p99 {row['p99_ms']:>8.3f}ms")
+        rows.append(row)
+    return rows
+
+
+if __name__ == "__main__":
+    main()
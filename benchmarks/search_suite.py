@@ -0,0 +1,189 @@
+# benchmarks/search_suite.py
+"""
+End-to-end face-search benchmark suite with machine-readable results.
+
+    python -m benchmarks.search_suite                                   # 1k … 1M synthetic
+    python -m benchmarks.search_suite --sizes 10000000 --configs brute-int8 ivf
+    python -m benchmarks.search_suite --datasets lfw
+    python -m benchmarks.search_suite --compare old.json new.json
+
+For every gallery (synthetic sizes and/or LFW) and index configuration it
+records build time, index memory (stored vectors and process RSS growth),
+p50 / p99 single-query latency, queries/s with several concurrent
+searching threads, and recall@k against exact float32 top-k.
+
+Results are written to data/benchmarks/search-<commit>-<time>.json;
+--compare prints per-row deltas between two such files.  A 10M × 512
+synthetic gallery needs about 20 GiB for the float32 ground truth alone
+(use a smaller --dim to scale down).
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from benchmarks.ann_benchmark import run_queries
+from benchmarks.datasets import ROOT, synthetic_gallery, lfw_gallery, exact_topk, recall_at_k
+from services.ann_index import IVFBackend, HNSWBackend, hnswlib
+from services.face_index import FaceIndex
+
+RESULTS_DIR = ROOT / "data" / "benchmarks"
+
+# name → FaceIndex keyword arguments for a (dim, n) gallery
+CONFIGS = {
+    "brute-float32":     lambda dim, n: {"storage": "float32"},
+    "brute-float16":     lambda dim, n: {"storage": "float16"},
+    "brute-int8":        lambda dim, n: {"storage": "int8"},
+    "brute-int8-rerank": lambda dim, n: {"storage": "int8", "exact_rerank": True},
+    "ivf":               lambda dim, n: {"backend": IVFBackend()},
+    "ivf-pq":            lambda dim, n: {"backend": IVFBackend(pq_m=32 if dim % 32 == 0 else 16)},
+    "hnsw":              lambda dim, n: {"backend": HNSWBackend(dim, capacity=n)},
+}
+
+
+def rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return 0        # not Linux: only the index's own accounting is reported
+
+
+def build(gallery: np.ndarray, **kwargs) -> tuple[FaceIndex, float, int]:
+    """returns : (index, build seconds, RSS growth in bytes)"""
+    rss = rss_bytes()
+    t0 = time.perf_counter()
+    index = FaceIndex(dim=gallery.shape[1], capacity=len(gallery), **kwargs)
+    for i, vec in enumerate(gallery):
+        index.add(i, vec)
+    backend = kwargs.get("backend")
+    index.train(force=backend is not None and not isinstance(backend, HNSWBackend))
+    return index, time.perf_counter() - t0, max(0, rss_bytes() - rss)
+
+
+def throughput(index: FaceIndex, queries: np.ndarray, k: int, threads: int) -> float:
+    """Queries/s with `threads` threads each running the whole query set."""
+    def worker(_):
+        for q in queries:
+            index.search(q, k=k)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker, range(threads)))
+    return threads * len(queries) / (time.perf_counter() - t0)
+
+
+def run_gallery(dataset: str, gallery: np.ndarray, queries: np.ndarray, configs: list[str],
+                k: int, threads: list[int]) -> list[dict]:
+    truth = exact_topk(gallery, queries, k)
+    rows = []
+    for name in configs:
+        if name == "hnsw" and hnswlib is None:
+            print("hnswlib not installed; skipping hnsw")
+            continue
+        index, build_s, rss = build(gallery, **CONFIGS[name](gallery.shape[1], len(gallery)))
+        found, p50, p99 = run_queries(index, queries, k)
+        row = {
+            "dataset":  dataset,
+            "n":        len(gallery),
+            "dim":      gallery.shape[1],
+            "config":   name,
+            "build_s":  round(build_s, 3),
+            "index_mib": round(index.memory_bytes() / 2**20, 1),
+            "rss_mib":  round(rss / 2**20, 1),
+            "p50_ms":   round(p50, 3),
+            "p99_ms":   round(p99, 3),
+            "qps":      {str(t): round(throughput(index, queries, k, t), 1) for t in threads},
+            "recall":   round(recall_at_k(found, truth), 4),
+        }
+        qps = "  ".join(f"{t}t {v:>8.1f}/s" for t, v in row["qps"].items())
+        print(f"{dataset:<9} {row['n']:>9} {name:<18} build {row['build_s']:>8.2f}s  "
+              f"{row['index_mib']:>8.1f} MiB  recall@k {row['recall']:.4f}  "
+              f"p50 {row['p50_ms']:>8.3f}ms  p99 {row['p99_ms']:>8.3f}ms  {qps}")
+        rows.append(row)
+        del index
+    return rows
+
+
+def _commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(rows: list[dict], args: argparse.Namespace) -> str:
+    commit = _commit()
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = args.out or str(RESULTS_DIR / f"search-{commit or 'nogit'}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w") as f:
+        json.dump({
+            "commit":    commit,
+            "timestamp": time.time(),
+            "machine":   {"platform": platform.platform(), "processor": platform.processor(),
+                          "cpus": os.cpu_count(), "python": platform.python_version(),
+                          "numpy": np.__version__},
+            "args":      {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+            "results":   rows,
+        }, f, indent=2)
+    return path
+
+
+def compare(old_path: str, new_path: str) -> None:
+    """Prints latency / recall / memory changes for rows present in both result files."""
+    with open(old_path) as f:
+        old = {(r["dataset"], r["n"], r["config"]): r for r in json.load(f)["results"]}
+    with open(new_path) as f:
+        new = json.load(f)["results"]
+
+    def pct(a, b):
+        return f"{(b - a) / a * 100:+7.1f}%" if a else "    n/a"
+
+    for row in new:
+        before = old.get((row["dataset"], row["n"], row["config"]))
+        if before is None:
+            continue
+        print(f"{row['dataset']:<9} {row['n']:>9} {row['config']:<18} "
+              f"p50 {pct(before['p50_ms'], row['p50_ms'])}  p99 {pct(before['p99_ms'], row['p99_ms'])}  "
+              f"recall {row['recall'] - before['recall']:+.4f}  "
+              f"mem {pct(before['index_mib'], row['index_mib'])}  build {pct(before['build_s'], row['build_s'])}")
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--datasets", nargs="+", choices=["synthetic", "lfw"], default=["synthetic"])
+    ap.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    ap.add_argument("--dim", type=int, default=512)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--configs", nargs="+", choices=list(CONFIGS), default=list(CONFIGS))
+    ap.add_argument("--threads", type=int, nargs="+", default=[1, 4])
+    ap.add_argument("--out", help="result file (default data/benchmarks/search-<commit>-<time>.json)")
+    ap.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="diff two result files and exit")
+    args = ap.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    rows = []
+    if "synthetic" in args.datasets:
+        for n in args.sizes:
+            gallery, queries = synthetic_gallery(n, args.dim, args.queries)
+            rows += run_gallery("synthetic", gallery, queries, args.configs, args.k, args.threads)
+            del gallery
+    if "lfw" in args.datasets:
+        gallery, queries = lfw_gallery(args.queries)
+        rows += run_gallery("lfw", gallery, queries, args.configs, args.k, args.threads)
+    print(f"results written to {write_results(rows, args)}")
+    return rows
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,11 @@ from controllers.auth_decorators import *
 from services.admin_service import AdminService          
 from controllers.auth_decorators import admin_required   
 from services.posts_service import PostService
+from services.face_recognition_service import FaceRecognitionService
+from services.index_maintainer import get_index_maintainer
+from services.face_search_service import FaceSearchService
+from AiModels.face_recognition.embedding_batcher import get_batcher
+from services.inference_pool import get_inference_pool
 from config import db  # or wherever you initialize Firestore
 
 
@@ -77,4 +82,54 @@ def successful_matches_count():
 def unsuccessful_matches_count():
     stats = db.collection("match_stats").where("success", "==", False).stream()
     count = sum(1 for _ in stats)
-    return jsonify(unsuccessful_matches=count), 200
\ No newline at end of file
+    return jsonify(unsuccessful_matches=count), 200
+
+# 1.10 face embedding cache hit/miss counters  ────
+@admin_bp.route("/face-cache/stats", methods=["GET"])
+@admin_required
+def face_cache_stats():
+    return jsonify(FaceRecognitionService.cache_stats()), 200
+
+# 1.11 face index change-feed lag / last applied change  ────
+@admin_bp.route("/face-index/stats", methods=["GET"])
+@admin_required
+def face_index_stats():
+    maintainer = get_index_maintainer()
+    return jsonify(maintainer.stats() if maintainer else {"enabled": False}), 200
+
+# 1.12 write a face index snapshot for warm starts  ────
+@admin_bp.route("/face-index/snapshot", methods=["POST"])
+@admin_required
+def face_index_snapshot():
+    maintainer = get_index_maintainer()
+    version = FaceSearchService.save_snapshot(maintainer.offset() if maintainer else None)
+    if version is None:
+        return jsonify(error="Face index not built, snapshot failed or another worker writes snapshots"), 409
+    return jsonify(version=version), 201
+
+# 1.13 rebalance the sharded face index onto N processes  ────
+@admin_bp.route("/face-index/shards", methods=["POST"])
+@admin_required
+def face_index_reshard():
+    try:
+        n_shards = int((request.get_json() or {}).get("shards", 0))
+        FaceSearchService.reshard(n_shards)
+        return jsonify(message="resharded", shards=n_shards), 200
+    except ValueError as ve:
+        return jsonify(error=str(ve)), 400
+    except Exception as e:
+        return jsonify(error=str(e)), 500
+
+# 1.14 inference worker pool: queue depth, rejections, timeouts  ────
+@admin_bp.route("/inference/stats", methods=["GET"])
+@admin_required
+def inference_stats():
+    pool = get_inference_pool()
+    return jsonify(pool.stats() if pool else {"enabled": False}), 200
+
+# 1.15 embedding micro-batcher: batch-size histogram, queue wait  ────
+@admin_bp.route("/embedding-batcher/stats", methods=["GET"])
+@admin_required
+def embedding_batcher_stats():
+    batcher = get_batcher()
+    return jsonify(batcher.stats() if batcher else {"enabled": False}), 200
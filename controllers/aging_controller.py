@@ -1,11 +1,28 @@
 import base64
 from flask import Blueprint, request, jsonify
+from controllers.auth_decorators import auth_required
 from services.age_progression_service import AgeProgressionService
+from services.search_jobs import search_jobs, JobQueueFull
+from services.inference_pool import InferenceBusy
+from services.face_search_service import FaceSearchService
+from schemas.post_schema import SearchFilterSchema
+from pydantic import ValidationError
 
 aging_bp = Blueprint("aging", __name__)
-age_service = AgeProgressionService()
 
+_age_service = None
+
+def get_age_service() -> AgeProgressionService:
+    # built on first request, not at import
+    global _age_service
+    if _age_service is None:
+        _age_service = AgeProgressionService()
+    return _age_service
+
+# results carry uploader phone numbers: signed-in users only, and rankings,
+# jobs and cursors are bound to the user that searched
 @aging_bp.route("/age-progress", methods=["POST"])
+@auth_required
 def age_progress():
     if request.content_type.startswith("multipart/form-data"):
         if "image" not in request.files or "target_age" not in request.form:
@@ -32,9 +49,56 @@ def age_progress():
     else:
         return jsonify(error="unsupported content type"), 415
 
+    # optional metadata filters on the missing posts searched
+    try:
+        fields = request.form.to_dict() if not request.is_json else js
+        filters = SearchFilterSchema(**fields).dict(exclude_none=True)
+    except ValidationError as e:
+        return jsonify(e.errors()), 400
+
+    # ?async=1 queues the job; poll /age-progress/jobs/<job_id>
+    uid = request.uid
+    if request.args.get("async", "").lower() in ("1", "true", "yes"):
+        try:
+            job = search_jobs.submit(
+                "age-progress", img_input, {"target_age": age, **filters},
+                lambda progress: get_age_service().progress_age_and_search(img_input, age, filters, progress,
+                                                                           uid=uid),
+                uid=uid,
+            )
+        except JobQueueFull as e:
+            return jsonify(error=str(e)), 503
+        return jsonify(job_id=job.id, status=job.status,
+                       status_url=f"/api/age-progress/jobs/{job.id}"), 202
+
     try:
-        result = age_service.progress_age_and_search(img_input, age)
+        result = get_age_service().progress_age_and_search(img_input, age, filters, uid=uid)
         return jsonify(result), 200
 
+    except InferenceBusy as e:
+        return jsonify(error=str(e)), 503
+    except TimeoutError as e:
+        return jsonify(error=str(e)), 504
+    except Exception as e:
+        return jsonify(error=str(e)), 500
+
+@aging_bp.route("/age-progress/jobs/<job_id>", methods=["GET"])
+@auth_required
+def age_progress_job(job_id):
+    job = search_jobs.get(job_id)
+    if job is None or job.kind != "age-progress" or job.uid != request.uid:
+        return jsonify(error="Job not found or expired"), 404
+    return jsonify(job.to_dict()), 200
+
+# further pages of ranked missing-post matches: ?cursor=<next_cursor>
+@aging_bp.route("/age-progress/results", methods=["GET"])
+@auth_required
+def age_progress_results():
+    try:
+        return jsonify(FaceSearchService.results_page(request.args.get("cursor", ""), request.uid)), 200
+    except ValueError as ve:
+        return jsonify(error=str(ve)), 400
+    except LookupError as le:
+        return jsonify(error=str(le)), 404
     except Exception as e:
         return jsonify(error=str(e)), 500
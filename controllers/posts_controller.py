@@ -3,14 +3,14 @@ from firebase_admin import firestore
 from controllers.auth_decorators import auth_required, admin_required
 from services.auth_service import AuthService
 from services.posts_service import PostService
-from services.face_recognition_service import FaceRecognitionService
+from services.face_search_service import FaceSearchService
+from services.match_service import MatchService
+from services.search_jobs import search_jobs, JobQueueFull
+from services.inference_pool import InferenceBusy
 from config import db
-import requests
-from schemas.post_schema import MissingPostSchema, FoundPostSchema, UpdatePostSchema
+from schemas.post_schema import MissingPostSchema, FoundPostSchema, UpdatePostSchema, SearchFilterSchema
 from pydantic import ValidationError
-from datetime import datetime
 
-face_service = FaceRecognitionService()
 posts_bp = Blueprint("posts", __name__)
 
 # ───────── create missing-person post ─────────────────────────
@@ -92,21 +92,10 @@ def update_post(post_id):
     except ValidationError as e:
         return jsonify(e.errors()), 400
 
-    # handle new image if provided
-    image_url = None
-    if "image_file" in request.files:
-        doc = db.collection("posts").document(post_id).get()
-        post_type = doc.get("post_type", "missing") if doc.exists else "missing"
-        try:
-            image_url = PostService._upload_image(
-                request.files["image_file"], request.uid, post_type
-            )
-            update_fields["image_url"] = image_url
-        except Exception as e:
-            return jsonify(error=str(e)), 400
-
     try:
-        PostService.update_post(post_id, request.uid, update_fields)
+        image_url = PostService.update_post(
+            post_id, request.uid, update_fields, request.files.get("image_file")
+        )
         response = {"message": "Post updated"}
         if image_url:
             response["image_url"] = image_url
@@ -193,6 +182,21 @@ def get_post(post_id):
     except Exception as e:
         return jsonify(error=str(e)), 500
 
+# ───────── precomputed matches for a post ──────────────────────
+# filled in the background when a post (or its image) is saved
+@posts_bp.route("/posts/<post_id>/matches", methods=["GET"])
+@auth_required
+def get_post_matches(post_id):
+    try:
+        post = PostService.get_post(post_id)
+        if not post:
+            return jsonify(error="Post not found"), 404
+        if post.uid != request.uid and request.role != "admin":
+            return jsonify(error="Forbidden"), 403
+        return jsonify(matches=MatchService.get_matches(post_id)), 200
+    except Exception as e:
+        return jsonify(error=str(e)), 500
+
 @posts_bp.route("/posts/<post_id>/report", methods=["POST"])
 @auth_required
 def report_post(post_id):
@@ -207,68 +211,67 @@ def report_post(post_id):
     return jsonify(message="report submitted"), 201
 
 # ───────── search for missing ────────────────────────────────
+# returns a page of ranked matches (closest_match = the first) and a
+# next_cursor for /search/results
+# optional form filters: gender, min_age, max_age, status, created_after,
+# created_before (posts lacking a field still match)
+# ?async=1 (or form field async=1) queues the search and returns a job id
+# to poll at /search/jobs/<job_id>
 @posts_bp.route("/search", methods=["POST"])
 @auth_required
 def search_for_missing():
     if "image_file" not in request.files:
         return jsonify(error="image_file is required"), 400
 
-    search_image_bytes = request.files["image_file"].read()
     try:
-        all_posts = PostService.get_posts()
-        matches = []
-        for post in all_posts:
-            # only compare to 'found' posts
-            if post.post_type != "found":
-                continue
-            img_url = post.image_url
-            if not img_url:
-                continue
-            try:
-                resp = requests.get(img_url, timeout=5)
-                resp.raise_for_status()
-                post_image_bytes = resp.content
-            except Exception:
-                continue
-
-            distance = face_service.compare_faces(search_image_bytes, post_image_bytes)
-            if distance < FaceRecognitionService.THRESHOLD:
-                matches.append({
-                    "post_id":      post.id,
-                    "distance":     float(distance),
-                    "post_details": post.to_dict(),
-                })
-
-        # return closest match or message if none
-        if not matches:
-            return jsonify(message="No match found"), 200
-
-        closest = min(matches, key=lambda x: x["distance"])
-
-        # Fetch uploader's phone number
-        uploader_id = (
-            closest["post_details"].get("user_id")
-            or closest["post_details"].get("uid")
-            or closest["post_details"].get("author_id")
-        )
-        phone_number = None
-        if uploader_id:
-            try:
-                user_profile_doc = db.collection("users").document(uploader_id).get()
-                if user_profile_doc.exists:
-                    phone_number = user_profile_doc.to_dict().get("phone")
-            except Exception:
-                phone_number = None
+        filters = SearchFilterSchema(**request.form.to_dict()).dict(exclude_none=True)
+    except ValidationError as e:
+        return jsonify(e.errors()), 400
 
-        # Add phone number to the response
-        closest["uploader_phone"] = phone_number
+    search_image_bytes = request.files["image_file"].read()
+    uid = request.uid
+    if is_async_request():
+        try:
+            job = search_jobs.submit(
+                "search", search_image_bytes, filters,
+                lambda progress: FaceSearchService.search_found_posts(search_image_bytes, filters, progress, uid),
+                uid=uid,
+            )
+        except JobQueueFull as e:
+            return jsonify(error=str(e)), 503
+        return jsonify(job_id=job.id, status=job.status,
+                       status_url=f"/api/search/jobs/{job.id}"), 202
 
-        # log for admin stats
-        db.collection("match_stats").add({
-            "timestamp": datetime.utcnow(),
-            "success":   True
-        })
-        return jsonify(closest_match=closest), 200
+    try:
+        return jsonify(FaceSearchService.search_found_posts(search_image_bytes, filters, uid=uid)), 200
+    except InferenceBusy as e:
+        return jsonify(error=str(e)), 503
+    except TimeoutError as e:
+        return jsonify(error=str(e)), 504
+    except Exception as e:
+        return jsonify(error=str(e)), 500
 
+# further pages of a search: ?cursor=<next_cursor from the previous page>
+@posts_bp.route("/search/results", methods=["GET"])
+@auth_required
+def search_results_page():
+    try:
+        return jsonify(FaceSearchService.results_page(request.args.get("cursor", ""), request.uid)), 200
+    except ValueError as ve:
+        return jsonify(error=str(ve)), 400
+    except LookupError as le:
+        return jsonify(error=str(le)), 404
     except Exception as e:
         return jsonify(error=str(e)), 500
+
+@posts_bp.route("/search/jobs/<job_id>", methods=["GET"])
+@auth_required
+def get_search_job(job_id):
+    job = search_jobs.get(job_id)
+    if job is None or job.uid != request.uid:
+        return jsonify(error="Job not found or expired"), 404
+    return jsonify(job.to_dict()), 200
+
+def is_async_request() -> bool:
+    flag = request.args.get("async") or request.form.get("async") or ""
+    return flag.lower() in ("1", "true", "yes")
@@ -1,34 +1,35 @@
 import uuid, io
 from abc import ABC, abstractmethod
 from firebase_admin import storage
-from services.image_service import preprocess
+from services.image_service import ImagePipeline, ImageArtefacts
 
 class ImageUploader(ABC):
+    # returns the public URL and the pipeline artefacts (the stored JPEG and
+    # its decoded pixels), so callers can run face analysis without
+    # downloading or decoding the image again
     @abstractmethod
-    def upload(self, file_storage, uid: str) -> str:
+    def upload(self, file_storage, uid: str) -> tuple[str, ImageArtefacts]:
         pass
 
 class MissingPostImageUploader(ImageUploader):
-    def upload(self, file_storage, uid: str) -> str:
-        raw = file_storage.read()
-        clean_bytes, _ = preprocess(raw)
+    def upload(self, file_storage, uid: str) -> tuple[str, ImageArtefacts]:
+        artefacts = ImagePipeline(file_storage.read()).run()
         blob_path = f"missing_posts/{uid}/{uuid.uuid4()}.jpg"
         blob = storage.bucket().blob(blob_path)
-        blob.upload_from_file(io.BytesIO(clean_bytes),
+        blob.upload_from_file(io.BytesIO(artefacts.jpeg),
                               content_type="image/jpeg")
         blob.make_public()
-        return blob.public_url
+        return blob.public_url, artefacts
 
 class FoundPostImageUploader(ImageUploader):
-    def upload(self, file_storage, uid: str) -> str:
-        raw = file_storage.read()
-        clean_bytes, _ = preprocess(raw)
+    def upload(self, file_storage, uid: str) -> tuple[str, ImageArtefacts]:
+        artefacts = ImagePipeline(file_storage.read()).run()
         blob_path = f"found_posts/{uuid.uuid4()}.jpg"
         blob = storage.bucket().blob(blob_path)
-        blob.upload_from_file(io.BytesIO(clean_bytes),
+        blob.upload_from_file(io.BytesIO(artefacts.jpeg),
                               content_type="image/jpeg")
         blob.make_public()
-        return blob.public_url
+        return blob.public_url, artefacts
 
 class ImageUploaderFactory:
     @staticmethod
@@ -2,7 +2,7 @@ from datetime import datetime
 
 class Post:
     # Constructor for the Post class
-    def __init__(self, id: str, uid: str, author_name: str, post_type: str, image_url: str, created_at, status: str, payload: dict):
+    def __init__(self, id: str, uid: str, author_name: str, post_type: str, image_url: str, created_at, status: str, payload: dict, face: dict | None = None):
         self.id = id
         self.uid = uid
         self.author_name = author_name
@@ -11,6 +11,7 @@ class Post:
         self.created_at = created_at
         self.status = status
         self.payload = payload
+        self.face = face            # stored FaceNet embeddings per detected face, see FaceRecognitionService.extract_face
 
     @staticmethod
     def from_dict(id: str, source: dict):
@@ -30,10 +31,12 @@ class Post:
                 "found_name": source.get("found_name"),
                 "estimated_age": source.get("estimated_age"),
                 "found_location": source.get("found_location"),
-            }
+                "gender": source.get("gender"),
+            },
+            source.get("face"),
         )
 
-    def to_dict(self):
+    def to_dict(self, include_face: bool = True):
         data = {
             "uid": self.uid,
             "author_name": self.author_name,
@@ -43,6 +46,8 @@ class Post:
             "status": self.status,
         }
         data.update(self.payload)
+        if include_face and self.face is not None:
+            data["face"] = self.face
         return data
 
     def get_created_at_iso(self) -> str:
@@ -27,4 +27,17 @@ PREPARE_LFW_DATA_PATH = os.path.join(os.path.dirname(__file__), "AiModels", "fac
 # Firebase Storage Bucket URL Prefix
 FIREBASE_STORAGE_BUCKET_URL_PREFIX = "https://storage.googleapis.com/safefind-e93cf.appspot.com"
 
+# Content-addressed face embedding cache (SQLite)
+FACE_CACHE_PATH = os.path.join(os.path.dirname(__file__), "data", "face_cache.sqlite3")
 
+# Face index snapshots (memory-mapped on warm start)
+FACE_INDEX_SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), "data", "face_index")
+
+# Optional face detector models (FACE_DETECTOR=opencv | onnx), not shipped
+FACE_DETECTOR_MODELS_DIR = os.path.join(os.path.dirname(__file__), "AiModels", "face_recognition", "models")
+OPENCV_FACE_PROTOTXT_PATH = os.path.join(FACE_DETECTOR_MODELS_DIR, "deploy.prototxt")
+OPENCV_FACE_MODEL_PATH = os.path.join(FACE_DETECTOR_MODELS_DIR, "res10_300x300_ssd_iter_140000.caffemodel")
+ULTRAFACE_ONNX_PATH = os.path.join(FACE_DETECTOR_MODELS_DIR, "version-RFB-320.onnx")
+
+# FaceNet weights exported to ONNX (FACENET_BACKEND=onnx), see export_onnx.py
+FACENET_ONNX_PATH = os.path.join(FACE_DETECTOR_MODELS_DIR, "facenet.onnx")
@@ -0,0 +1,37 @@
+from config import db
+from firebase_admin import firestore
+
+
+# The MatchRepository class provides static methods
+# to store and read precomputed found ↔ missing face matches.
+# One document per post pair, id "<found_id>_<missing_id>", so re-running
+# matching for a post overwrites instead of duplicating.
+class MatchRepository:
+    @staticmethod
+    def save_match(found_post_id: str, missing_post_id: str, data: dict):
+        db.collection("matches").document(f"{found_post_id}_{missing_post_id}").set({
+            **data,
+            "found_post_id":   found_post_id,
+            "missing_post_id": missing_post_id,
+            "post_ids":        [found_post_id, missing_post_id],
+            "created_at":      firestore.SERVER_TIMESTAMP,
+        })
+
+    @staticmethod
+    def get_matches_for_post(post_id: str):
+        return db.collection("matches").where("post_ids", "array_contains", post_id).stream()
+
+    @staticmethod
+    def delete_matches_for_post(post_id: str) -> int:
+        """Deletes every match of the post, 500 per batch (Firestore's limit); returns how many."""
+        deleted = 0
+        query = db.collection("matches").where("post_ids", "array_contains", post_id)
+        while True:
+            docs = list(query.limit(500).stream())
+            if not docs:
+                return deleted
+            batch = db.batch()
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+            deleted += len(docs)
@@ -5,22 +5,62 @@ from firebase_admin import firestore
 # The PostRepository class provides static methods
 # to interact with post data stored in a Firestore database.
 # It acts as a data access layer for post-related operations.
+# Every write stamps "updated_at" (the change-feed position, see
+# services/index_maintainer.py) and is reported to in-process listeners;
+# deletes leave a tombstone so feeds can replay them after a restart.
 class PostRepository:
+    _listeners = []
+
+    @staticmethod
+    def add_listener(fn):
+        """fn(kind, post_id) after each write; kind is "added", "modified" or "removed"."""
+        PostRepository._listeners.append(fn)
+
+    @staticmethod
+    def _notify(kind: str, post_id: str):
+        for fn in PostRepository._listeners:
+            fn(kind, post_id)
+
     @staticmethod
     def create_post(post_id: str, data: dict):
-        db.collection("posts").document(post_id).set(data)
+        db.collection("posts").document(post_id).set({**data, "updated_at": firestore.SERVER_TIMESTAMP})
+        PostRepository._notify("added", post_id)
 
     @staticmethod
     def get_post_by_id(post_id: str):
         return db.collection("posts").document(post_id).get()
 
+    @staticmethod
+    def get_posts_by_ids(post_ids: list[str]):
+        """One batched read; snapshots come back in no particular order."""
+        if not post_ids:
+            return []
+        return db.get_all([db.collection("posts").document(i) for i in post_ids])
+
     @staticmethod
     def update_post(post_id: str, updates: dict):
-        db.collection("posts").document(post_id).update(updates)
+        db.collection("posts").document(post_id).update({**updates, "updated_at": firestore.SERVER_TIMESTAMP})
+        PostRepository._notify("modified", post_id)
 
     @staticmethod
     def delete_post(post_id: str):
         db.collection("posts").document(post_id).delete()
+        db.collection("post_tombstones").document(post_id).set({"deleted_at": firestore.SERVER_TIMESTAMP})
+        PostRepository._notify("removed", post_id)
+
+    @staticmethod
+    def delete_tombstones_before(cutoff) -> int:
+        """Deletes tombstones older than `cutoff` (a datetime); returns how many."""
+        deleted = 0
+        while True:
+            docs = list(db.collection("post_tombstones").where("deleted_at", "<", cutoff).limit(500).stream())
+            if not docs:
+                return deleted
+            batch = db.batch()
+            for doc in docs:
+                batch.delete(doc.reference)
+            batch.commit()
+            deleted += len(docs)
 
     @staticmethod
     def get_all_posts():
@@ -29,5 +69,3 @@ class PostRepository:
     @staticmethod
     def delete_post_report(post_id: str):
         db.collection("post_reports").document(post_id).delete()
-
-
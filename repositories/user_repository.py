@@ -24,6 +24,13 @@ class UserRepository:
     def get_user_profile(uid: str):
         return db.collection("users").document(uid).get()
 
+    @staticmethod
+    def get_user_profiles(uids: list[str]):
+        """One batched read; snapshots come back in no particular order."""
+        if not uids:
+            return []
+        return db.get_all([db.collection("users").document(uid) for uid in uids])
+
     @staticmethod
     def update_user_profile(uid: str, updates: dict):
         db.collection("users").document(uid).update(updates)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, Field
 from typing import Optional
+from datetime import datetime
 
 class MissingPostSchema(BaseModel):
     missing_name: str
@@ -28,4 +29,13 @@ class UpdatePostSchema(BaseModel):
     class Config:
         extra = "ignore"
 
+class SearchFilterSchema(BaseModel):
+    gender: Optional[str] = None
+    min_age: Optional[int] = None
+    max_age: Optional[int] = None
+    status: Optional[str] = None
+    created_after: Optional[datetime] = None
+    created_before: Optional[datetime] = None
 
+    class Config:
+        extra = "ignore"
@@ -1,13 +1,12 @@
 import logging
 import uuid
 import requests
-from io import BytesIO
-from urllib.parse import urlparse, unquote
-from PIL import Image
 from firebase_admin import storage
 
 from services.face_recognition_service import FaceRecognitionService
-from services.posts_service        import PostService
+from services.face_search_service  import FaceSearchService
+from services.image_fetcher        import get_fetcher
+from services.image_service        import ImagePipeline
 
 logger = logging.getLogger("AgeProgressionService")
 
@@ -17,7 +16,10 @@ class AgeProgressionService:
         self.colab_service_url = "https://cd01-34-124-246-58.ngrok-free.app"
         self.face_service = FaceRecognitionService()
 
-    def progress_age_and_search(self, image_input, target_age: int) -> dict:
+    def progress_age_and_search(self, image_input, target_age: int, filters: dict | None = None,
+                                progress=None, uid: str | None = None) -> dict:
+        # progress(fraction) is reported between stages for async jobs
+        progress = progress or (lambda fraction: None)
 
         try:
             # 1) get original bytes
@@ -31,72 +33,37 @@ class AgeProgressionService:
 
             # 3) call your FastAPI age model
             aged_bytes = self._call_colab_service(proc, target_age)
+            progress(0.4)
 
             # 4) upload aged image back to Firebase
             aged_url = self._upload(aged_bytes, "age_progressed", f"age_{target_age}")
-
-            posts = PostService.get_posts()
-            candidates = []
-            for post in posts:
-                if post.post_type != "missing":
-                    continue
-                try:
-                    other = self._download_image(post.image_url)
-                    dist  = self.face_service.compare_faces(aged_bytes, other)
-                except Exception:
-                    continue
-                if dist < FaceRecognitionService.THRESHOLD:
-                    candidates.append({
-                        "post_id":      post.id,
-                        "distance":     dist,
-                        "image_url":    post.image_url,
-                        "post_details": post.to_dict(),
-                    })
-
-            if candidates:
-                best = min(candidates, key=lambda x: x["distance"])
-                # Add uploader phone number
-                uploader_uid = best["post_details"].get("uid")
-                phone = None
-                if uploader_uid:
-                    from config import db  # Ensure db is imported from your config
-                    user_doc = db.collection("users").document(uploader_uid).get()
-                    if user_doc.exists:
-                        phone = user_doc.to_dict().get("phone")
-                best["uploader_phone"] = phone
-                return {"aged_image_url": aged_url, "closest_match": best}
+            progress(0.5)
+
+            # 5) embed the aged face once and rank the missing posts against it
+            aged = self.face_service.query_face(aged_bytes)
+            result = {"matches": []}
+            if aged is not None:
+                result = FaceSearchService.ranked_matches(aged["embedding"], "missing", filters, uid,
+                                                          small_query=aged["small_embedding"])
+            progress(0.9)
+
+            result["aged_image_url"] = aged_url
+            if result["matches"]:
+                result["closest_match"] = result["matches"][0]
             else:
-                return {"aged_image_url": aged_url, "message": "No match found"}
+                result["message"] = "No match found"
+            return result
 
         except Exception:
             logger.exception("Age progression + search failed")
             raise
 
     def _download_image(self, url: str) -> bytes:
-        bucket = storage.bucket()
-        p = urlparse(url)
-        blob = None
-
-        if "/o/" in p.path:
-            blob = unquote(p.path.split("/o/")[1])
-        else:
-            path = p.path.lstrip("/")
-            if path.startswith(bucket.name + "/"):
-                blob = path[len(bucket.name) + 1 :]
-
-        if blob:
-            return bucket.blob(blob).download_as_bytes()
-
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        return r.content
+        return get_fetcher().fetch(url)
 
     def _resize(self, img_bytes: bytes, size: tuple[int,int]) -> bytes:
-        img = Image.open(BytesIO(img_bytes)).convert("RGB")
-        img.thumbnail(size, Image.Resampling.LANCZOS)
-        buf = BytesIO()
-        img.save(buf, format="JPEG")
-        return buf.getvalue()
+        # one cv2 decode → fit inside size → JPEG, any input format
+        return ImagePipeline(img_bytes, allowed_types=None).fit(size).encode()
 
     def _upload(self, img_bytes: bytes, folder: str, subfolder: str) -> str:
         bucket = storage.bucket()
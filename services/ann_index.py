@@ -0,0 +1,278 @@
+# services/ann_index.py
+"""
+Approximate nearest-neighbour backends for FaceIndex
+----------------------------------------------------
+
+A backend only proposes candidate rows of the FaceIndex matrix; FaceIndex
+re-ranks them with exact cosine distance, so a backend trades recall for
+latency but never changes the reported distances.
+
+• IVFBackend   → inverted file over spherical k-means cells, optional
+                 product-quantised codes to shortlist candidates
+                 (knob: nprobe, rerank)
+• HNSWBackend  → graph index through the optional `hnswlib` package
+                 (knob: ef)
+
+Selected with FACE_INDEX_BACKEND = exact | ivf | hnsw.
+"""
+import os
+import threading
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from AiModels.face_recognition.facenet import EMBEDDING_DIM
+
+try:
+    import hnswlib
+except ImportError:          # optional dependency, only needed for "hnsw"
+    hnswlib = None
+
+# ───────── configuration ─────────────────────────────────
+BACKEND       = os.getenv("FACE_INDEX_BACKEND", "exact")
+IVF_NLIST     = int(os.getenv("FACE_INDEX_NLIST", "0"))      # 0 → ≈ 4·√N at training time
+IVF_NPROBE    = int(os.getenv("FACE_INDEX_NPROBE", "8"))
+IVF_PQ_M      = int(os.getenv("FACE_INDEX_PQ_M", "0"))       # 0 → no PQ shortlist
+HNSW_M        = int(os.getenv("FACE_INDEX_HNSW_M", "16"))
+HNSW_EF       = int(os.getenv("FACE_INDEX_EF", "64"))
+RERANK_FACTOR = int(os.getenv("FACE_INDEX_RERANK", "10"))    # candidates re-ranked per result
+
+
+class AnnBackend(ABC):
+    @abstractmethod
+    def add(self, slot: int, vec: np.ndarray) -> None:
+        pass
+
+    @abstractmethod
+    def remove(self, slot: int) -> None:
+        pass
+
+    @abstractmethod
+    def candidates(self, query: np.ndarray, n: int) -> np.ndarray:
+        """Rows likely to be among the n nearest to the (normalised) query."""
+
+    def needs_training(self, size: int) -> bool:
+        return False
+
+    def train(self, slots: np.ndarray, vectors: np.ndarray) -> None:
+        pass
+
+    def ready(self) -> bool:
+        return True
+
+
+# ───────── k-means helpers ────────────────────────────────
+def _assign(x: np.ndarray, centroids: np.ndarray, spherical: bool, chunk: int = 16384) -> np.ndarray:
+    out = np.empty(len(x), dtype=np.int64)
+    bias = 0.0 if spherical else 0.5 * np.einsum("ij,ij->i", centroids, centroids)
+    for i in range(0, len(x), chunk):
+        out[i : i + chunk] = np.argmax(x[i : i + chunk] @ centroids.T - bias, axis=1)
+    return out
+
+
+def _kmeans(x: np.ndarray, k: int, iters: int = 12, spherical: bool = True, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), k, replace=False)].astype(np.float32)
+    for _ in range(iters):
+        assign = _assign(x, centroids, spherical)
+        counts = np.bincount(assign, minlength=k)
+        order = np.argsort(assign, kind="stable")
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        empty = counts == 0
+        sums = np.add.reduceat(x[order], starts[~empty], axis=0)
+        centroids = np.zeros_like(centroids)
+        centroids[~empty] = sums / counts[~empty, None]
+        # re-seed empty cells from random points
+        centroids[empty] = x[rng.choice(len(x), int(empty.sum()))]
+        if spherical:
+            centroids /= np.linalg.norm(centroids, axis=1, keepdims=True) + 1e-12
+    return centroids
+
+
+# ───────── inverted file (+ PQ) ───────────────────────────
+class IVFBackend(AnnBackend):
+    """
+    Vectors are bucketed by their nearest coarse centroid; a query scans the
+    `nprobe` closest buckets.  With pq_m > 0 each vector also keeps an
+    m-byte PQ code and the scanned buckets are shortlisted by approximate
+    inner product (table lookups) before the exact re-rank.
+    """
+
+    def __init__(self, nlist: int = IVF_NLIST, nprobe: int = IVF_NPROBE, pq_m: int = IVF_PQ_M,
+                 min_train: int = 1024, train_size: int = 65536, retrain_growth: float = 4.0):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.pq_m = pq_m
+        self.min_train = min_train
+        self.train_size = train_size
+        self.retrain_growth = retrain_growth
+        self._centroids = None
+        self._codebooks = None       # (m, ksub, dsub)
+        self._codes = np.zeros((0, max(pq_m, 1)), dtype=np.uint8)
+        self._lists: list[np.ndarray] = []
+        self._counts = np.zeros(0, dtype=np.int64)
+        self._where: dict[int, tuple[int, int]] = {}   # slot → (list, position)
+        self._trained_at = 0
+        self._lock = threading.Lock()
+
+    def ready(self) -> bool:
+        return self._centroids is not None
+
+    def needs_training(self, size: int) -> bool:
+        if self._centroids is None:
+            return size >= self.min_train
+        return size >= self._trained_at * self.retrain_growth
+
+    def train(self, slots: np.ndarray, vectors: np.ndarray) -> None:
+        rng = np.random.default_rng(0)
+        sample = vectors
+        if len(vectors) > self.train_size:
+            sample = vectors[rng.choice(len(vectors), self.train_size, replace=False)]
+        nlist = self.nlist or int(max(1, min(4 * np.sqrt(len(vectors)), len(sample) // 39)))
+        nlist = min(nlist, len(sample))
+
+        centroids = _kmeans(sample, nlist, spherical=True)
+        codebooks = None
+        if self.pq_m:
+            dim = vectors.shape[1]
+            if dim % self.pq_m:
+                raise ValueError(f"pq_m={self.pq_m} must divide dimension {dim}")
+            dsub, ksub = dim // self.pq_m, min(256, len(sample))
+            codebooks = np.stack([
+                _kmeans(sample[:, j * dsub : (j + 1) * dsub], ksub, spherical=False)
+                for j in range(self.pq_m)
+            ])
+
+        # bulk-assign the existing vectors instead of add() one at a time
+        slots = np.asarray(slots, dtype=np.int64)
+        cells = _assign(vectors, centroids, spherical=True)
+        order = np.argsort(cells, kind="stable")
+        counts = np.bincount(cells, minlength=nlist)
+        bounds = np.concatenate([[0], np.cumsum(counts)])
+        lists = [np.resize(slots[order[bounds[c] : bounds[c + 1]]], max(16, 2 * counts[c]))
+                 for c in range(nlist)]
+        where = {}
+        for c in range(nlist):
+            for pos, slot in enumerate(lists[c][: counts[c]]):
+                where[int(slot)] = (c, pos)
+
+        codes = np.zeros((0, max(self.pq_m, 1)), dtype=np.uint8)
+        if codebooks is not None:
+            dsub = codebooks.shape[2]
+            codes = np.zeros((int(slots.max()) + 1 if len(slots) else 0, self.pq_m), dtype=np.uint8)
+            for j, book in enumerate(codebooks):
+                codes[slots, j] = _assign(vectors[:, j * dsub : (j + 1) * dsub], book, spherical=False)
+
+        with self._lock:
+            self._centroids, self._codebooks, self._codes = centroids, codebooks, codes
+            self._lists, self._counts, self._where = lists, counts.astype(np.int64), where
+            self._trained_at = len(vectors)
+
+    # ── mutation ──
+    def add(self, slot: int, vec: np.ndarray) -> None:
+        if self._centroids is None:
+            return                       # picked up by train()
+        with self._lock:
+            self._remove_locked(slot)
+            cell = int(np.argmax(self._centroids @ vec))
+            pos = self._counts[cell]
+            if pos == len(self._lists[cell]):
+                self._lists[cell] = np.resize(self._lists[cell], 2 * pos)
+            self._lists[cell][pos] = slot
+            self._counts[cell] += 1
+            self._where[slot] = (cell, int(pos))
+            if self._codebooks is not None:
+                self._store_code(slot, vec)
+
+    def remove(self, slot: int) -> None:
+        with self._lock:
+            self._remove_locked(slot)
+
+    def _remove_locked(self, slot: int) -> None:
+        loc = self._where.pop(slot, None)
+        if loc is None:
+            return
+        cell, pos = loc
+        last = self._counts[cell] - 1
+        moved = int(self._lists[cell][last])
+        self._lists[cell][pos] = moved
+        self._counts[cell] = last
+        if moved != slot:
+            self._where[moved] = (cell, pos)
+
+    def _store_code(self, slot: int, vec: np.ndarray) -> None:
+        if slot >= len(self._codes):
+            codes = np.zeros((max(2 * len(self._codes), slot + 1), self.pq_m), dtype=np.uint8)
+            codes[: len(self._codes)] = self._codes[:, : self.pq_m]
+            self._codes = codes
+        dsub = self._codebooks.shape[2]
+        for j, book in enumerate(self._codebooks):
+            sub = vec[j * dsub : (j + 1) * dsub]
+            self._codes[slot, j] = np.argmin(((book - sub) ** 2).sum(axis=1))
+
+    # ── query ──
+    def candidates(self, query: np.ndarray, n: int) -> np.ndarray:
+        with self._lock:
+            nprobe = min(self.nprobe, len(self._lists))
+            cells = np.argpartition(-(self._centroids @ query), nprobe - 1)[:nprobe]
+            cand = np.concatenate([self._lists[c][: self._counts[c]] for c in cells])
+            if self._codebooks is None or len(cand) <= n:
+                return cand
+            # asymmetric distance: per-subspace inner-product tables
+            dsub = self._codebooks.shape[2]
+            lut = np.einsum("mkd,md->mk", self._codebooks, query.reshape(self.pq_m, dsub))
+            approx = lut[np.arange(self.pq_m), self._codes[cand]].sum(axis=1)
+            return cand[np.argpartition(-approx, n - 1)[:n]]
+
+
+# ───────── HNSW (hnswlib) ─────────────────────────────────
+class HNSWBackend(AnnBackend):
+    def __init__(self, dim: int, m: int = HNSW_M, ef: int = HNSW_EF,
+                 ef_construction: int = 200, capacity: int = 1024):
+        if hnswlib is None:
+            raise RuntimeError("FACE_INDEX_BACKEND=hnsw requires the hnswlib package")
+        self.ef = ef
+        self._index = hnswlib.Index(space="ip", dim=dim)
+        self._index.init_index(max_elements=capacity, ef_construction=ef_construction, M=m)
+        self._seen: set[int] = set()     # labels ever inserted
+        self._live: set[int] = set()
+        self._lock = threading.Lock()
+
+    def add(self, slot: int, vec: np.ndarray) -> None:
+        with self._lock:
+            if slot in self._seen:
+                if slot not in self._live:
+                    self._index.unmark_deleted(slot)
+            elif self._index.get_current_count() >= self._index.get_max_elements():
+                self._index.resize_index(2 * self._index.get_max_elements())
+            self._index.add_items(vec[None, :], np.array([slot]))
+            self._seen.add(slot)
+            self._live.add(slot)
+
+    def remove(self, slot: int) -> None:
+        with self._lock:
+            if slot in self._live:
+                self._index.mark_deleted(slot)
+                self._live.discard(slot)
+
+    def candidates(self, query: np.ndarray, n: int) -> np.ndarray:
+        with self._lock:
+            n = min(n, len(self._live))
+            if n == 0:
+                return np.empty(0, dtype=np.int64)
+            self._index.set_ef(max(self.ef, n))
+            labels, _ = self._index.knn_query(query[None, :], k=n)
+            return labels[0].astype(np.int64)
+
+
+class AnnBackendFactory:
+    @staticmethod
+    def get_backend(name: str = BACKEND, dim: int = EMBEDDING_DIM) -> AnnBackend | None:
+        if name == "exact":
+            return None
+        elif name == "ivf":
+            return IVFBackend()
+        elif name == "hnsw":
+            return HNSWBackend(dim)
+        else:
+            raise ValueError(f"Unknown face index backend: {name}")
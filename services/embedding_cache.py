@@ -0,0 +1,160 @@
+# services/embedding_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from paths import FACE_CACHE_PATH
+
+# ── enables ─────────────────────────────────────────────────────────
+CACHE_PATH        = os.getenv("FACE_CACHE_PATH", FACE_CACHE_PATH)
+CACHE_MAX_ENTRIES = int(os.getenv("FACE_CACHE_MAX_ENTRIES", "200000"))   # 0 disables the cache
+EVICT_FRACTION    = 0.1       # share of entries dropped when the bound is hit
+SCHEMA_VERSION    = 2         # PRAGMA user_version the migrations below bring the file to
+
+
+class EmbeddingCache:
+    """
+    Persistent face-analysis cache keyed by SHA-256(model version + image bytes).
+
+    Uploaded images never change, so the detection box, face quality and
+    embedding computed for a given byte string can be reused by every
+    process on the host.  Entries are evicted least-recently-used once
+    `max_entries` is exceeded.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._migrate()
+        self._count = self._db.execute("SELECT COUNT(*) FROM face_sets").fetchone()[0]
+
+    def _migrate(self) -> None:
+        """Brings the file up to SCHEMA_VERSION once; a no-op on every later open."""
+        self._db.execute("BEGIN IMMEDIATE")         # one process migrates, the others wait
+        try:
+            version = self._db.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                # one row per image: boxes / qualities as JSON lists, embeddings as one
+                # float32 (n_faces, D) blob; the single-face "faces" table is superseded
+                self._db.execute("DROP TABLE IF EXISTS faces")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS face_sets ("
+                    " key TEXT PRIMARY KEY, model_version TEXT, boxes TEXT, qualities TEXT,"
+                    " embeddings BLOB, last_used REAL)"
+                )
+                self._db.execute("CREATE INDEX IF NOT EXISTS face_sets_lru ON face_sets(last_used)")
+            if version < 2:
+                # Siamese cascade embeddings (see siamese_embedder.py), NULL when not computed
+                columns = {row[1] for row in self._db.execute("PRAGMA table_info(face_sets)")}
+                if "small_embeddings" not in columns:
+                    self._db.execute("ALTER TABLE face_sets ADD COLUMN small_model_version TEXT")
+                    self._db.execute("ALTER TABLE face_sets ADD COLUMN small_embeddings BLOB")
+            if version < SCHEMA_VERSION:
+                self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def key(img_bytes: bytes, model_version: str) -> str:
+        h = hashlib.sha256(model_version.encode())
+        h.update(img_bytes)
+        return h.hexdigest()
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT model_version, boxes, qualities, embeddings, small_model_version, small_embeddings"
+                " FROM face_sets WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._db.execute("UPDATE face_sets SET last_used = ? WHERE key = ?", (time.time(), key))
+
+        model_version, boxes, qualities, blob, small_version, small_blob = row
+        boxes, qualities = json.loads(boxes), json.loads(qualities)
+        embs = np.frombuffer(blob, dtype=np.float32).reshape(len(boxes), -1) if boxes else []
+        record = {
+            "model_version": model_version,
+            "faces": [
+                {"embedding": emb.tolist(), "box": box, "quality": quality}
+                for emb, box, quality in zip(embs, boxes, qualities)
+            ],
+        }
+        if small_version is not None:
+            record["small_model_version"] = small_version
+            smalls = np.frombuffer(small_blob, dtype=np.float32).reshape(len(boxes), -1) if boxes else []
+            for face, small in zip(record["faces"], smalls):
+                face["small_embedding"] = small.tolist()
+        return record
+
+    def put(self, key: str, record: dict) -> None:
+        faces = record.get("faces") or []
+        blob = np.asarray([f["embedding"] for f in faces], dtype=np.float32).tobytes()
+        small_version = record.get("small_model_version")
+        small_blob = np.asarray([f["small_embedding"] for f in faces], dtype=np.float32).tobytes() \
+            if small_version is not None else None
+        with self._lock:
+            exists = self._db.execute("SELECT 1 FROM face_sets WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO face_sets"
+                " (key, model_version, boxes, qualities, embeddings, last_used,"
+                "  small_model_version, small_embeddings) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (key, record.get("model_version"), json.dumps([f["box"] for f in faces]),
+                 json.dumps([f["quality"] for f in faces]), blob, time.time(),
+                 small_version, small_blob),
+            )
+            if exists is None:                  # a replacement leaves the count as it is
+                self._count += 1
+            if self._count > self.max_entries:
+                self._evict()
+
+    def _evict(self) -> None:
+        # recount: other processes share the file
+        self._count = self._db.execute("SELECT COUNT(*) FROM face_sets").fetchone()[0]
+        excess = self._count - int(self.max_entries * (1 - EVICT_FRACTION))
+        if excess > 0:
+            self._db.execute(
+                "DELETE FROM face_sets WHERE key IN "
+                "(SELECT key FROM face_sets ORDER BY last_used LIMIT ?)", (excess,)
+            )
+            self._count -= excess
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits":        self.hits,
+            "misses":      self.misses,
+            "hit_rate":    self.hits / total if total else 0.0,
+            "entries":     self._count,
+            "max_entries": self.max_entries,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> EmbeddingCache | None:
+    """Process-wide cache, opened on first use; None when disabled."""
+    global _cache
+    if CACHE_MAX_ENTRIES <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = EmbeddingCache()
+    return _cache
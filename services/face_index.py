@@ -0,0 +1,394 @@
+# services/face_index.py
+import json
+import logging
+import os
+import threading
+import numpy as np
+
+from AiModels.face_recognition.facenet import EMBEDDING_DIM
+from services.ann_index import AnnBackend, RERANK_FACTOR
+
+# ───────── configuration ─────────────────────────────────
+STORAGE      = os.getenv("FACE_INDEX_STORAGE", "float32")             # float32 | float16 | int8
+EXACT_RERANK = os.getenv("FACE_INDEX_EXACT_RERANK", "0").lower() in ("1", "true", "yes")
+SCORE_CHUNK  = 2048           # rows converted to float32 at a time when scoring
+CASCADE_FRACTION = float(os.getenv("FACE_CASCADE_FRACTION", "0.1"))  # rows FaceNet-scored after the pre-filter
+
+STORAGE_DTYPES = {"float32": np.float32, "float16": np.float16, "int8": np.int8}
+
+logger = logging.getLogger("FaceIndex")
+
+
+class FaceIndex:
+    """
+    In-memory embedding index for one post type.
+
+    Rows of a contiguous float32 matrix hold L2-normalised embeddings; a query
+    is scored against all of them with one matrix-vector product.  Removed rows
+    are recycled through a free list, and the matrix grows by doubling, so
+    add / update / remove never rebuild it.
+
+    With an AnnBackend (see services/ann_index.py) a query only scores the
+    backend's candidate rows; those are still re-ranked by cosine against
+    the stored vectors.  Retraining the backend as the index grows runs on a
+    background thread (train_in_background); until a first training is done
+    queries are brute force.
+
+    `storage` picks the row representation: float32, float16 (half the
+    memory) or int8 with one float32 scale per row (about a quarter).  Queries
+    are scored on the stored form; with `exact_rerank` a float32 copy is kept
+    as well and the top k·RERANK_FACTOR quantised hits are re-scored from it.
+
+    With `small_dim` each row may also carry a cheap low-dimensional vector
+    (the Siamese embedding, see siamese_embedder.py).  A brute-force search
+    given a `small_query` ranks the rows on those first and scores only the
+    best `cascade_fraction` of them (at least k·RERANK_FACTOR) in full; rows
+    without a small vector are always scored in full.
+    """
+
+    def __init__(self, dim: int = EMBEDDING_DIM, capacity: int = 1024,
+                 backend: AnnBackend | None = None, storage: str = STORAGE,
+                 exact_rerank: bool = EXACT_RERANK, small_dim: int = 0,
+                 cascade_fraction: float = CASCADE_FRACTION):
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown index storage: {storage}")
+        self.dim = dim
+        self.backend = backend
+        self.storage = storage
+        self._matrix = np.zeros((capacity, dim), dtype=STORAGE_DTYPES[storage])
+        self._scale = np.ones(capacity, dtype=np.float32)
+        self._exact = np.zeros((capacity, dim), dtype=np.float32) \
+            if exact_rerank and storage != "float32" else None
+        self._live = np.zeros(capacity, dtype=bool)
+        self.small_dim = small_dim
+        self.cascade_fraction = cascade_fraction
+        self._small = np.zeros((capacity, small_dim), dtype=np.float32) if small_dim else None
+        self._has_small = np.zeros(capacity, dtype=bool)
+        self._ids: list = [None] * capacity
+        self._slots: dict = {}        # key → row
+        self._free: list[int] = []
+        self._size = 0                # high-water mark of used rows
+        self._dirty: set[int] | None = None     # rows changed while the backend retrains
+        self._lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def __contains__(self, key) -> bool:
+        return key in self._slots
+
+    def get(self, key) -> np.ndarray | None:
+        """Stored (decoded) embedding for key, or None."""
+        with self._lock:
+            slot = self._slots.get(key)
+            return None if slot is None else self._decode([slot])[0]
+
+    def keys(self) -> list:
+        with self._lock:
+            return list(self._slots)
+
+    @property
+    def rows(self) -> int:
+        """Rows in use so far (live or free); row masks must cover this many."""
+        return self._size
+
+    def memory_bytes(self) -> int:
+        """Bytes held by the stored vectors (codes, scales, any float32 copy and small vectors)."""
+        total = self._matrix.nbytes + self._scale.nbytes
+        total += self._small.nbytes if self._small is not None else 0
+        return total + (self._exact.nbytes if self._exact is not None else 0)
+
+    # ───────── storage codec ───────────────────────────
+    def _encode(self, vec: np.ndarray) -> tuple[np.ndarray, float]:
+        if self.storage != "int8":
+            return vec.astype(self._matrix.dtype), 1.0
+        scale = float(np.abs(vec).max()) / 127.0 or 1.0
+        return np.rint(vec / scale).astype(np.int8), scale
+
+    def _decode(self, rows) -> np.ndarray:
+        """float32 vectors for the given rows (slice or index array)."""
+        vecs = self._matrix[rows].astype(np.float32)
+        if self.storage == "int8":
+            vecs *= self._scale[rows, None]
+        return vecs
+
+    def _similarity(self, rows: np.ndarray | None, n: int, q: np.ndarray) -> np.ndarray:
+        """Cosine similarity of q to the stored form of `rows` (None → rows 0..n-1)."""
+        if self.storage == "float32":
+            return self._matrix[:n] @ q if rows is None else self._matrix[rows] @ q
+        # convert in cache-sized chunks; int8 row scales are applied after the dot product
+        count = n if rows is None else len(rows)
+        out = np.empty(count, dtype=np.float32)
+        for i in range(0, count, SCORE_CHUNK):
+            part = slice(i, min(count, i + SCORE_CHUNK)) if rows is None else rows[i : i + SCORE_CHUNK]
+            out[i : i + SCORE_CHUNK] = self._matrix[part].astype(np.float32) @ q
+        if self.storage == "int8":
+            out *= self._scale[:n] if rows is None else self._scale[rows]
+        return out
+
+    # ───────── mutation ────────────────────────────────
+    def add(self, key, embedding, small=None) -> int:
+        """Insert or replace the embedding (and small vector) stored under `key`; returns its row."""
+        vec = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        if vec.shape[0] != self.dim:
+            raise ValueError(f"Expected {self.dim}-D embedding, got {vec.shape[0]}")
+        norm = np.linalg.norm(vec)
+        if norm == 0:
+            raise ValueError("Zero embedding")
+
+        with self._lock:
+            slot = self._slots.get(key)
+            if slot is None:
+                slot = self._free.pop() if self._free else self._next_slot()
+                self._slots[key] = slot
+                self._ids[slot] = key
+            vec = vec / norm
+            self._matrix[slot], self._scale[slot] = self._encode(vec)
+            if self._exact is not None:
+                self._exact[slot] = vec
+            if self._small is not None:
+                self._set_small(slot, small)
+            self._live[slot] = True
+            if self.backend is not None:
+                self.backend.add(slot, vec)
+            if self._dirty is not None:
+                self._dirty.add(slot)
+            return slot
+
+    update = add
+
+    def remove(self, key) -> bool:
+        with self._lock:
+            slot = self._slots.pop(key, None)
+            if slot is None:
+                return False
+            self._live[slot] = False
+            self._matrix[slot] = 0
+            if self._exact is not None:
+                self._exact[slot] = 0.0
+            if self._small is not None:
+                self._set_small(slot, None)
+            self._ids[slot] = None
+            self._free.append(slot)
+            if self.backend is not None:
+                self.backend.remove(slot)
+            if self._dirty is not None:
+                self._dirty.add(slot)
+            return True
+
+    def _set_small(self, slot: int, small) -> None:
+        vec = None if small is None else np.asarray(small, dtype=np.float32).reshape(-1)
+        norm = 0.0 if vec is None else np.linalg.norm(vec)
+        if vec is not None and vec.shape[0] != self.small_dim:
+            raise ValueError(f"Expected {self.small_dim}-D small embedding, got {vec.shape[0]}")
+        self._small[slot] = vec / norm if norm else 0.0
+        self._has_small[slot] = bool(norm)
+
+    def _next_slot(self) -> int:
+        if self._size == self._matrix.shape[0]:
+            self._grow(self._size * 2 or 1024)
+        slot = self._size
+        self._size += 1
+        return slot
+
+    def _grow(self, capacity: int) -> None:
+        def grown(arr, fill=0):
+            out = np.full((capacity,) + arr.shape[1:], fill, dtype=arr.dtype)
+            out[: self._size] = arr[: self._size]
+            return out
+
+        self._matrix = grown(self._matrix)
+        self._scale = grown(self._scale, 1.0)
+        self._live = grown(self._live, False)
+        self._has_small = grown(self._has_small, False)
+        if self._exact is not None:
+            self._exact = grown(self._exact)
+        if self._small is not None:
+            self._small = grown(self._small)
+        self._ids.extend([None] * (capacity - len(self._ids)))
+
+    def train(self, force: bool = False) -> None:
+        """(Re)train the ANN backend on the live rows once it asks for it, in this thread."""
+        with self._lock:
+            if self.backend is None:
+                return
+            if force or self.backend.needs_training(len(self._slots)):
+                slots = np.flatnonzero(self._live[: self._size])
+                if len(slots):
+                    self.backend.train(slots, self._decode(slots))
+
+    def train_in_background(self) -> None:
+        """Starts a retrain on its own thread when the backend asks for one; never waits for it."""
+        with self._lock:
+            if self.backend is None or self._dirty is not None \
+                    or not self.backend.needs_training(len(self._slots)):
+                return
+            self._dirty = set()
+        threading.Thread(target=self._retrain, name="face-index-retrain", daemon=True).start()
+
+    def _retrain(self) -> None:
+        try:
+            # only the copy of the live rows holds the lock, not the k-means
+            with self._lock:
+                slots = np.flatnonzero(self._live[: self._size])
+                vectors = self._decode(slots)
+            if len(slots):
+                self.backend.train(slots, vectors)
+        except Exception:
+            logger.exception("Retraining the face index backend failed")
+        finally:
+            # the new backend state was built from the copy: replay what changed since
+            with self._lock:
+                dirty, self._dirty = self._dirty, None
+                for slot in dirty:
+                    if self._live[slot]:
+                        self.backend.add(slot, self._decode([slot])[0])
+                    else:
+                        self.backend.remove(slot)
+
+    # ───────── snapshot ────────────────────────────────
+    # <path>/vectors.npy, scales.npy, live.npy (+ exact.npy, small.npy + has_small.npy),
+    # ids.json, index.json
+    # The arrays are written with spare rows so a memory-mapped index can take
+    # new posts without being copied.
+    def save(self, path: str, headroom: float = 0.25) -> None:
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            n = self._size
+            rows = n + max(1024, int(n * headroom))
+
+            def padded(arr, fill=0):
+                out = np.full((rows,) + arr.shape[1:], fill, dtype=arr.dtype)
+                out[:n] = arr[:n]
+                return out
+
+            np.save(os.path.join(path, "vectors.npy"), padded(self._matrix))
+            np.save(os.path.join(path, "scales.npy"), padded(self._scale, 1.0))
+            np.save(os.path.join(path, "live.npy"), padded(self._live, False))
+            if self._exact is not None:
+                np.save(os.path.join(path, "exact.npy"), padded(self._exact))
+            if self._small is not None:
+                np.save(os.path.join(path, "small.npy"), padded(self._small))
+                np.save(os.path.join(path, "has_small.npy"), padded(self._has_small, False))
+            with open(os.path.join(path, "ids.json"), "w") as f:
+                json.dump(self._ids[:n], f)
+            with open(os.path.join(path, "index.json"), "w") as f:
+                json.dump({"dim": self.dim, "storage": self.storage, "size": n,
+                           "small_dim": self.small_dim}, f)
+
+    @classmethod
+    def load(cls, path: str, backend: AnnBackend | None = None) -> "FaceIndex":
+        """
+        Opens a saved index with its vectors memory-mapped copy-on-write:
+        processes loading the same snapshot share its pages until they
+        modify a row.  Keys are restored as tuples.
+        """
+        with open(os.path.join(path, "index.json")) as f:
+            meta = json.load(f)
+        exact_path = os.path.join(path, "exact.npy")
+        index = cls(dim=meta["dim"], capacity=1, backend=backend, storage=meta["storage"],
+                    exact_rerank=os.path.exists(exact_path), small_dim=meta.get("small_dim", 0))
+
+        index._matrix = np.load(os.path.join(path, "vectors.npy"), mmap_mode="c")
+        index._scale = np.load(os.path.join(path, "scales.npy"), mmap_mode="c")
+        index._live = np.load(os.path.join(path, "live.npy"))
+        if index._exact is not None:
+            index._exact = np.load(exact_path, mmap_mode="c")
+        if index._small is not None:
+            index._small = np.load(os.path.join(path, "small.npy"), mmap_mode="c")
+            index._has_small = np.load(os.path.join(path, "has_small.npy"))
+        else:
+            index._has_small = np.zeros(len(index._live), dtype=bool)
+        with open(os.path.join(path, "ids.json")) as f:
+            ids = [tuple(k) if isinstance(k, list) else k for k in json.load(f)]
+
+        n = index._size = meta["size"]
+        index._ids = ids + [None] * (len(index._live) - n)
+        index._slots = {key: slot for slot, key in enumerate(ids) if key is not None}
+        index._free = [slot for slot in range(n) if ids[slot] is None]
+
+        if backend is not None:
+            slots = np.flatnonzero(index._live[:n])
+            vectors = index._decode(slots)
+            for slot, vec in zip(slots, vectors):
+                backend.add(int(slot), vec)
+            index.train()
+        return index
+
+    # ───────── query ───────────────────────────────────
+    def search(self, query, k: int = 10, threshold: float | None = None,
+               mask: np.ndarray | None = None, small_query=None) -> list[tuple]:
+        """
+        Top-k keys by cosine distance (0 = identical), closest first.
+        Only results with distance < threshold are returned when one is given.
+        `mask` (bool per row, see PostMetadataTable) restricts the rows that
+        are scored at all; `small_query` enables the small-vector pre-filter.
+        """
+        q = np.asarray(query, dtype=np.float32).reshape(-1)
+        q = q / np.linalg.norm(q)
+
+        with self._lock:
+            n = self._size
+            if n == 0 or k <= 0:
+                return []
+            allowed = self._live[:n] if mask is None else self._live[:n] & mask[:n]
+            if self.backend is not None:
+                self.train_in_background()
+                if self.backend.ready():
+                    # widen the candidate pool by the filter's selectivity
+                    budget = k * RERANK_FACTOR
+                    if mask is not None:
+                        budget = int(budget / max(allowed.mean(), 0.01))
+                    rows = self.backend.candidates(q, budget)
+                    rows = rows[allowed[rows]]
+                    return self._rank(*self._refine(rows, 1.0 - self._similarity(rows, n, q), k, q),
+                                      k, threshold)
+
+            if small_query is not None and self._small is not None:
+                rows = self._prefilter(allowed, small_query, n, k)
+                return self._rank(*self._refine(rows, 1.0 - self._similarity(rows, n, q), k, q),
+                                  k, threshold)
+            if mask is None:
+                rows = np.arange(n)
+                dist = 1.0 - self._similarity(None, n, q)
+                dist[~allowed] = np.inf
+            else:
+                rows = np.flatnonzero(allowed)
+                dist = 1.0 - self._similarity(rows, n, q)
+            return self._rank(*self._refine(rows, dist, k, q), k, threshold)
+
+    def _prefilter(self, allowed: np.ndarray, small_query, n: int, k: int) -> np.ndarray:
+        """Allowed rows worth a full score: the best by small-vector cosine, plus rows without one."""
+        sq = np.asarray(small_query, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(sq)
+        candidates = allowed & self._has_small[:n]
+        count = int(candidates.sum())
+        keep = max(k * RERANK_FACTOR, int(np.ceil(count * self.cascade_fraction)))
+        if norm == 0 or keep >= count:
+            return np.flatnonzero(allowed)
+        sims = self._small[:n] @ (sq / norm)
+        sims[~candidates] = -np.inf
+        top = np.sort(np.argpartition(-sims, keep - 1)[:keep])
+        return np.concatenate([top, np.flatnonzero(allowed & ~self._has_small[:n])])
+
+    def _refine(self, rows: np.ndarray, dist: np.ndarray, k: int, q: np.ndarray):
+        """Re-score the best quantised hits from the float32 copy, if one is kept."""
+        if self._exact is None:
+            return rows, dist
+        pool = k * RERANK_FACTOR
+        if pool < len(rows):
+            top = np.argpartition(dist, pool - 1)[:pool]
+            rows = rows[top[np.isfinite(dist[top])]]
+        else:
+            rows = rows[np.isfinite(dist)]
+        return rows, 1.0 - self._exact[rows] @ q
+
+    def _rank(self, rows: np.ndarray, dist: np.ndarray, k: int, threshold: float | None) -> list[tuple]:
+        if threshold is not None:
+            dist = np.where(dist < threshold, dist, np.inf)
+        k = min(k, len(rows))
+        if k == 0:
+            return []
+        top = np.argpartition(dist, k - 1)[:k] if k < len(rows) else np.arange(len(rows))
+        top = top[np.argsort(dist[top], kind="stable")]
+        return [(self._ids[rows[i]], float(dist[i])) for i in top if np.isfinite(dist[i])]
@@ -1,15 +1,127 @@
-from scipy.spatial.distance import cosine
-from AiModels.face_recognition.align import align_face
-from AiModels.face_recognition.facenet import get_embedding
+import numpy as np
+from AiModels.face_recognition.align import DETECTION_VERSION
+from AiModels.face_recognition.facenet import MODEL_VERSION
+from AiModels.face_recognition.siamese_embedder import CASCADE, SMALL_MODEL_VERSION
+from services.embedding_cache import EmbeddingCache, get_cache
+from services.inference_pool import analyse_images, get_inference_pool, use_inference_pool, WORKERS
+
+# cache entries carry the Siamese embeddings only while the cascade is on, and
+# another detector or detection settings find other faces (see align.py)
+ANALYSIS_VERSION = MODEL_VERSION + (f"+{SMALL_MODEL_VERSION}" if CASCADE else "") \
+    + (f"+{DETECTION_VERSION}" if DETECTION_VERSION else "")
+
+# detection and embedding run in INFERENCE_WORKERS processes, warmed instead of local models
+if WORKERS:
+    use_inference_pool()
 
 class FaceRecognitionService:
     THRESHOLD = 0.40        # FaceNet typical cosine cutoff
 
+    # ───────── query-once API ─────────────────────────
+    # Embed the probe image a single time, then score that vector against
+    # any number of gallery embeddings or images.
+    def embed_query(self, img_bytes: bytes) -> np.ndarray | None:
+        return self.stored_embedding(self.extract_face(img_bytes))
+
+    def query_face(self, img_bytes: bytes) -> dict | None:
+        """Largest face of the probe with its FaceNet and (cascade) Siamese embeddings, or None."""
+        faces = self.stored_faces(self.extract_face(img_bytes))
+        return faces[0] if faces else None
+
+    @staticmethod
+    def distances(query_emb: np.ndarray, gallery: np.ndarray) -> np.ndarray:
+        """Cosine distances (0 = identical) between one embedding and (N, D) gallery rows."""
+        gallery = np.atleast_2d(np.asarray(gallery, dtype=np.float32))
+        q = np.asarray(query_emb, dtype=np.float32)
+        norms = np.linalg.norm(gallery, axis=1) * np.linalg.norm(q)
+        return 1.0 - (gallery @ q) / np.maximum(norms, 1e-12)
+
+    def compare_to_many(self, query_bytes: bytes, gallery_images: list[bytes]) -> list[float]:
+        """Distance from the query face to each gallery image (1.0 where no face is found)."""
+        query_emb = self.embed_query(query_bytes)
+        out = [1.0] * len(gallery_images)
+        if query_emb is None:
+            return out
+        for i, record in enumerate(self.extract_faces(gallery_images)):
+            faces = self.stored_faces(record)
+            if faces:
+                # closest of the faces found in that image
+                out[i] = float(self.distances(query_emb, [f["embedding"] for f in faces]).min())
+        return out
+
     def compare_faces(self, img_a_bytes: bytes, img_b_bytes: bytes) -> float:
-        crop_a = align_face(img_a_bytes)
-        crop_b = align_face(img_b_bytes)
-        if crop_a is None or crop_b is None:
-            return 1.0  # Maximum distance (not similar)
-        emb_a = get_embedding(crop_a)
-        emb_b = get_embedding(crop_b)
-        return float(cosine(emb_a, emb_b))   # 0 = identical, 1 = orthogonal
+        return self.compare_to_many(img_a_bytes, [img_b_bytes])[0]   # 0 = identical, 1 = orthogonal
+
+    # ───────── stored embeddings ─────────────────────
+    # A post's "face" record is computed once when its image is uploaded:
+    #   {"model_version": str,
+    #    "faces": [{"embedding": [...], "box": [x, y, w, h], "quality": detector confidence}, ...]}
+    # with one entry per detected face, largest first; "faces" is empty when
+    # none was found, so the image is not re-analysed on every search.
+    # With FACE_CASCADE each face also has a 50-D "small_embedding" and the
+    # record a "small_model_version" (see siamese_embedder.py); with other than
+    # the default detection settings it has a "detection_version" (see align.py).
+    # Records are also kept in the on-disk EmbeddingCache, keyed by the image bytes,
+    # and computed by the inference pool when there is one (see inference_pool.py).
+    # decoded: the images' RGB pixels when the caller already has them (see
+    # ImagePipeline), analysed instead of decoding the bytes; the bytes then
+    # only key the cache and must identify those pixels (ImageArtefacts.pixel_key).
+    def extract_face(self, img_bytes: bytes, decoded: np.ndarray | None = None) -> dict:
+        return self.extract_faces([img_bytes], None if decoded is None else [decoded])[0]
+
+    def extract_faces(self, images: list[bytes], decoded: list[np.ndarray] | None = None) -> list[dict]:
+        """Face records for many images; every face of every uncached image is embedded in one batch."""
+        cache = get_cache()
+        keys = [EmbeddingCache.key(b, ANALYSIS_VERSION) for b in images] if cache else []
+        records = [cache.get(k) for k in keys] if cache else [None] * len(images)
+        if DETECTION_VERSION:
+            # keyed by ANALYSIS_VERSION, so found with these settings; the cache keeps no such column
+            for record in records:
+                if record is not None:
+                    record["detection_version"] = DETECTION_VERSION
+
+        todo = [i for i, r in enumerate(records) if r is None]
+        if todo:
+            pool = get_inference_pool()
+            inputs = [images[i] if decoded is None else decoded[i] for i in todo]
+            fresh = (pool.analyse if pool else analyse_images)(inputs)
+            for i, record in zip(todo, fresh):
+                records[i] = record
+        if cache:
+            for i in todo:
+                cache.put(keys[i], records[i])
+        return records
+
+    @staticmethod
+    def cache_stats() -> dict:
+        cache = get_cache()
+        return cache.stats() if cache else {"enabled": False}
+
+    @staticmethod
+    def is_current(face: dict | None) -> bool:
+        # single-face records from before multi-face indexing are re-analysed,
+        # and so are records without Siamese embeddings once the cascade is on
+        # and records found with other detection settings
+        return (
+            bool(face) and face.get("model_version") == MODEL_VERSION and "faces" in face
+            and (not CASCADE or face.get("small_model_version") == SMALL_MODEL_VERSION)
+            and face.get("detection_version", "") == DETECTION_VERSION
+        )
+
+    @staticmethod
+    def stored_faces(face: dict | None) -> list[dict]:
+        """Faces of a current record with float32 embeddings; [] otherwise."""
+        if not FaceRecognitionService.is_current(face):
+            return []
+        return [
+            {**f, "embedding": np.asarray(f["embedding"], dtype=np.float32),
+             "small_embedding": np.asarray(f["small_embedding"], dtype=np.float32)
+                                if CASCADE and f.get("small_embedding") is not None else None}
+            for f in face["faces"] if f.get("embedding") is not None
+        ]
+
+    @staticmethod
+    def stored_embedding(face: dict | None) -> np.ndarray | None:
+        """Embedding of the largest face, or None."""
+        faces = FaceRecognitionService.stored_faces(face)
+        return faces[0]["embedding"] if faces else None
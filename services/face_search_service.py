@@ -0,0 +1,387 @@
+# services/face_search_service.py
+import functools
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+from config import db
+from AiModels.face_recognition.siamese_embedder import CASCADE, SMALL_DIM
+from services.ann_index import AnnBackendFactory
+from services.face_index import FaceIndex
+from services.face_recognition_service import FaceRecognitionService
+from services.index_snapshot import read_snapshot, write_snapshot
+from services.post_metadata import PostMetadataTable
+from services.posts_service import PostService
+from services.search_results import SearchResultStore, search_results
+from repositories.post_repository import PostRepository
+from repositories.user_repository import UserRepository
+from services.sharded_index import ShardedFaceIndex, SHARDS, shard_of
+from models.post_model import Post
+
+POST_TYPES = ("found", "missing")
+
+# ── enables ─────────────────────────────────────────────────────────
+MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", "50"))    # ranked posts kept per search
+PAGE_SIZE   = int(os.getenv("SEARCH_PAGE_SIZE", "10"))
+FACE_OVERFETCH = int(os.getenv("SEARCH_FACE_OVERFETCH", "4"))  # faces fetched per wanted post, first try
+
+logger = logging.getLogger("FaceSearchService")
+_face_service = FaceRecognitionService()
+
+
+class FaceSearchService:
+    """
+    Owns one FaceIndex per post type, built lazily from the stored post
+    embeddings on first search and kept current by PostService on
+    create / update / delete.  Every detected face is its own row, keyed
+    (post_id, face_no).  A PostMetadataTable per index mirrors the
+    filterable post fields row for row.
+
+    With FACE_INDEX_SHARDS > 0 each post type is a ShardedFaceIndex instead,
+    whose shard processes keep their own metadata tables (no snapshots).
+
+    With FACE_CASCADE the indexes also hold each face's Siamese embedding
+    and queries carrying one are pre-filtered on it (in-process index only).
+
+    Changes that arrive while the indexes are being built are buffered in
+    `_pending` and replayed onto the new indexes when they are swapped in.
+    """
+    TOP_K = 10
+
+    _indexes: dict[str, FaceIndex | ShardedFaceIndex] = {}
+    _metadata: dict[str, PostMetadataTable] = {}
+    _post_keys: dict[str, list[tuple[str, int]]] = {}      # post_id → its index keys
+    _pending: list[tuple[str, Post | str]] | None = None   # changes during a build
+    _build_lock = threading.Lock()      # one build at a time
+    _lock = threading.RLock()           # _indexes, _metadata, _post_keys, _pending
+
+    # ───────── index lifecycle ─────────────────────────
+    @classmethod
+    def get_index(cls, post_type: str) -> FaceIndex | ShardedFaceIndex:
+        if not cls._indexes:
+            with cls._build_lock:
+                if not cls._indexes:
+                    cls._build_indexes()
+        return cls._indexes[post_type]
+
+    @classmethod
+    def _build_indexes(cls) -> None:
+        started = time.time()
+        with cls._lock:
+            cls._pending = []       # from here on index_post / remove_post buffer
+        try:
+            cls._build_from_posts(started)
+        finally:
+            with cls._lock:
+                cls._pending = None
+
+    @classmethod
+    def _swap_in(cls, indexes: dict, metadata: dict, post_keys: dict) -> None:
+        """Makes freshly built indexes current and replays the changes buffered meanwhile."""
+        with cls._lock:
+            cls._metadata = metadata
+            cls._post_keys = post_keys
+            cls._indexes = indexes
+            pending, cls._pending = cls._pending or [], None
+            for kind, item in pending:
+                if kind == "index":
+                    cls._index_post(item)
+                else:
+                    cls._remove_post(item)
+
+    @classmethod
+    def _build_from_posts(cls, started: float) -> None:
+        posts = [p for p in PostService.get_posts() if p.post_type in POST_TYPES]
+        PostService.backfill_face_embeddings(posts)
+
+        if SHARDS:
+            indexes = {t: ShardedFaceIndex(SHARDS, loader=functools.partial(cls._shard_entries, t))
+                       for t in POST_TYPES}
+            entries = {t: [] for t in POST_TYPES}
+            post_keys = {}
+            for post in posts:
+                keys = post_keys[post.id] = []
+                for face_no, face in enumerate(FaceRecognitionService.stored_faces(post.face)):
+                    keys.append((post.id, face_no))
+                    entries[post.post_type].append(((post.id, face_no), face["embedding"], post))
+            for t, index in indexes.items():
+                index.add_many(entries[t])          # one message per shard
+            cls._swap_in(indexes, {}, post_keys)
+            return
+
+        indexes = {
+            t: FaceIndex(backend=AnnBackendFactory.get_backend(), small_dim=SMALL_DIM if CASCADE else 0)
+            for t in POST_TYPES
+        }
+        metadata = {t: PostMetadataTable() for t in POST_TYPES}
+        post_keys = {}
+        for post in posts:
+            post_keys[post.id] = cls._add_faces(indexes[post.post_type], metadata[post.post_type], post)
+        for index in indexes.values():
+            index.train()           # no-op for the exact backend
+        cls._swap_in(indexes, metadata, post_keys)
+        # let the next worker start from disk instead of Firestore
+        threading.Thread(target=cls.save_snapshot, args=(started,), daemon=True).start()
+
+    @staticmethod
+    def _shard_entries(post_type: str, shard_no: int, n_shards: int) -> list[tuple]:
+        """Every (key, embedding, post) of one shard's partition, read from Firestore."""
+        entries = []
+        for post in PostService.get_posts():
+            if post.post_type != post_type or shard_of(post.id, n_shards) != shard_no:
+                continue
+            for face_no, face in enumerate(FaceRecognitionService.stored_faces(post.face)):
+                entries.append(((post.id, face_no), face["embedding"], post))
+        return entries
+
+    @classmethod
+    def reshard(cls, n_shards: int) -> None:
+        """Rebalances every sharded index onto n_shards processes."""
+        if not SHARDS:
+            raise ValueError("Face index is not sharded (FACE_INDEX_SHARDS=0)")
+        if n_shards < 1:
+            raise ValueError("n_shards must be at least 1")
+        for post_type in POST_TYPES:
+            cls.get_index(post_type).resize(n_shards)
+
+    @classmethod
+    def warm_start(cls) -> float | None:
+        """
+        Loads the current on-disk snapshot (see services/index_snapshot.py);
+        returns its change-feed offset, or None when the indexes will be
+        built from Firestore on first search instead.
+        """
+        if SHARDS:
+            return None
+        try:
+            snapshot = read_snapshot()
+        except Exception:
+            logger.exception("Loading the face index snapshot failed")
+            return None
+        if snapshot is None:
+            return None
+        indexes, metadata, offset = snapshot
+        post_keys = {}
+        for index in indexes.values():
+            for post_id, face_no in index.keys():
+                post_keys.setdefault(post_id, []).append((post_id, face_no))
+        with cls._lock:
+            cls._metadata = metadata
+            cls._post_keys = post_keys
+            cls._indexes = indexes
+        return offset
+
+    @classmethod
+    def save_snapshot(cls, feed_offset: float | None = None) -> str | None:
+        """Writes the indexes to a new snapshot version; feed_offset defaults to now."""
+        if not cls._indexes or SHARDS:
+            return None
+        try:
+            return write_snapshot(cls._indexes, cls._metadata,
+                                  time.time() if feed_offset is None else feed_offset)
+        except Exception:
+            logger.exception("Saving the face index snapshot failed")
+            return None
+
+    @staticmethod
+    def _add_faces(index, metadata: PostMetadataTable | None, post: Post) -> list[tuple[str, int]]:
+        faces = FaceRecognitionService.stored_faces(post.face)
+        keys = [(post.id, face_no) for face_no in range(len(faces))]
+        if isinstance(index, ShardedFaceIndex):
+            index.add_many([(key, face["embedding"], post) for key, face in zip(keys, faces)])
+            return keys
+        for key, face in zip(keys, faces):
+            metadata.set(index.add(key, face["embedding"], face["small_embedding"]), post)
+        return keys
+
+    @classmethod
+    def index_post(cls, post: Post) -> None:
+        with cls._lock:
+            if cls._pending is not None:
+                cls._pending.append(("index", post))
+            # not built yet: the initial build will read the post from Firestore
+            elif post.post_type in cls._indexes:
+                cls._index_post(post)
+
+    @classmethod
+    def remove_post(cls, post_id: str) -> None:
+        with cls._lock:
+            if cls._pending is not None:
+                cls._pending.append(("remove", post_id))
+            else:
+                cls._remove_post(post_id)
+
+    # callers hold cls._lock
+    @classmethod
+    def _index_post(cls, post: Post) -> None:
+        cls._remove_post(post.id)
+        if post.post_type in cls._indexes:
+            cls._post_keys[post.id] = cls._add_faces(
+                cls._indexes[post.post_type], cls._metadata.get(post.post_type), post
+            )
+
+    @classmethod
+    def _remove_post(cls, post_id: str) -> None:
+        for key in cls._post_keys.pop(post_id, []):
+            for index in cls._indexes.values():
+                index.remove(key)
+
+    # ───────── queries ─────────────────────────────────
+    @classmethod
+    def search(cls, query_emb, post_type: str, k: int = TOP_K, filters: dict | None = None,
+               small_query=None) -> list[tuple[str, int, float]]:
+        return cls.search_partial(query_emb, post_type, k, filters, small_query)[0]
+
+    @classmethod
+    def search_partial(cls, query_emb, post_type: str, k: int = TOP_K, filters: dict | None = None,
+                       small_query=None) -> tuple[list[tuple[str, int, float]], bool]:
+        """
+        Top-k (post_id, face_no, distance) under FaceRecognitionService.THRESHOLD,
+        best face per post.
+        filters: gender, min_age, max_age, status, created_after, created_before
+        (see SearchFilterSchema); posts lacking a field are kept.
+        small_query: the query's Siamese embedding, for the cascade pre-filter.
+        returns : (hits, partial) — partial when a shard was left out
+
+        The index ranks faces, and a group photo has several close ones, so
+        faces are over-fetched (k · FACE_OVERFETCH, doubled while the index
+        had more to give) until k distinct posts are found.
+        """
+        index = cls.get_index(post_type)
+        mask = None if isinstance(index, ShardedFaceIndex) else cls._metadata[post_type].mask(index.rows, filters)
+        fetch = k * max(1, FACE_OVERFETCH)
+        size = len(index)           # read once: for a sharded index it asks every shard
+        while True:
+            partial = False
+            if isinstance(index, ShardedFaceIndex):
+                found, missing = index.search_partial(query_emb, k=fetch, threshold=FaceRecognitionService.THRESHOLD,
+                                                      filters=filters)
+                partial = bool(missing)
+            else:
+                found = index.search(query_emb, k=fetch, threshold=FaceRecognitionService.THRESHOLD, mask=mask,
+                                     small_query=small_query)
+            hits, seen = [], set()
+            for (post_id, face_no), distance in found:
+                if post_id not in seen:
+                    seen.add(post_id)
+                    hits.append((post_id, face_no, distance))
+            # fewer faces than asked for: nothing further is under the threshold
+            if len(hits) >= k or len(found) < fetch or fetch >= size:
+                return hits[:k], partial
+            fetch *= 2
+
+    # ───────── ranked, paged results ──────────────────
+    @classmethod
+    def ranked_matches(cls, query_emb, post_type: str, filters: dict | None = None,
+                       uid: str | None = None, page_size: int = PAGE_SIZE, small_query=None) -> dict:
+        """
+        Up to MAX_RESULTS posts ranked by distance.  Returns the first page;
+        the ranking itself (ids and distances only) is kept in
+        search_results so next_cursor pages are served without searching again.
+        `partial` is true when an index shard did not answer in time.
+        """
+        hits, partial = cls.search_partial(query_emb, post_type, k=MAX_RESULTS, filters=filters,
+                                           small_query=small_query)
+        result_id = search_results.put(hits, uid) if len(hits) > page_size else None
+        return {**cls._page(hits, result_id, 0, page_size), "partial": partial}
+
+    @classmethod
+    def results_page(cls, cursor: str, uid: str | None = None, page_size: int = PAGE_SIZE) -> dict:
+        result_id, offset = SearchResultStore.parse_cursor(cursor)
+        hits = search_results.get(result_id, uid)
+        if hits is None:
+            raise LookupError("Cursor expired or not found")
+        return cls._page(hits, result_id, offset, page_size)
+
+    @classmethod
+    def _page(cls, hits: list, result_id: str | None, offset: int, page_size: int) -> dict:
+        page = hits[offset : offset + page_size]
+        end = offset + len(page)
+        return {
+            "matches":     cls._hydrate(page, offset),
+            "total":       len(hits),
+            "next_cursor": SearchResultStore.cursor(result_id, end) if result_id and end < len(hits) else None,
+        }
+
+    @classmethod
+    def _hydrate(cls, page: list, offset: int) -> list[dict]:
+        """Post details and uploader phones for one page: one batched read each."""
+        posts = {
+            doc.id: Post.from_dict(doc.id, doc.to_dict())
+            for doc in PostRepository.get_posts_by_ids([post_id for post_id, _, _ in page])
+            if doc.exists
+        }
+        details = {post_id: post.to_dict(include_face=False) for post_id, post in posts.items()}
+        phones = cls.uploader_phones([cls._uploader_id(d) for d in details.values()])
+
+        matches = []
+        for rank, (post_id, face_no, distance) in enumerate(page, start=offset + 1):
+            post = posts.get(post_id)
+            if post is None:            # deleted since it was indexed
+                cls.remove_post(post_id)
+                continue
+            faces = FaceRecognitionService.stored_faces(post.face)
+            matches.append({
+                "rank":           rank,
+                "post_id":        post_id,
+                "distance":       distance,
+                "score":          1.0 - distance,
+                "image_url":      post.image_url,
+                "face_box":       faces[face_no]["box"] if face_no < len(faces) else None,
+                "post_details":   details[post_id],
+                "uploader_phone": phones.get(cls._uploader_id(details[post_id])),
+            })
+        return matches
+
+    @staticmethod
+    def _uploader_id(post_details: dict) -> str | None:
+        return (
+            post_details.get("user_id")
+            or post_details.get("uid")
+            or post_details.get("author_id")
+        )
+
+    @staticmethod
+    def uploader_phones(uids: list[str | None]) -> dict[str, str]:
+        uids = list({uid for uid in uids if uid})
+        try:
+            return {
+                doc.id: doc.to_dict().get("phone")
+                for doc in UserRepository.get_user_profiles(uids) if doc.exists
+            }
+        except Exception:
+            return {}
+
+    # ───────── /api/search ─────────────────────────────
+    @classmethod
+    def search_found_posts(cls, image_bytes: bytes, filters: dict | None = None,
+                           progress=None, uid: str | None = None) -> dict:
+        """
+        Found posts ranked by similarity to the face in image_bytes, first
+        page with uploader phones (see ranked_matches); `closest_match` is
+        the top one.  `progress(fraction)` is called between stages when given.
+        """
+        progress = progress or (lambda fraction: None)
+
+        # embed the uploaded photo once, then query the in-memory index
+        # of stored found-post embeddings
+        query = _face_service.query_face(image_bytes)
+        progress(0.5)
+        if query is None:
+            return {"message": "No match found", "matches": []}
+
+        result = cls.ranked_matches(query["embedding"], "found", filters, uid,
+                                    small_query=query["small_embedding"])
+        progress(0.9)
+        if not result["matches"]:
+            return {"message": "No match found", **result}
+        result["closest_match"] = result["matches"][0]
+
+        # log for admin stats
+        db.collection("match_stats").add({
+            "timestamp": datetime.utcnow(),
+            "success":   True
+        })
+        return result
@@ -22,31 +22,102 @@ def _reject_small_or_blur(bgr: np.ndarray) -> None:
         raise ValueError("Image too blurry")
 
 # ── public API ───────────────────────────────────────────────────────
-def preprocess(image_bytes: bytes) -> tuple[bytes, str]:
-    img_type = imghdr.what(None, image_bytes)
-    if img_type not in ALLOWED_TYPES:
-        raise ValueError("Only JPEG and PNG images are allowed")
+class ImageArtefacts:
+    # everything an upload produces, from a single decode
+    def __init__(self, img_type: str, bgr: np.ndarray, jpeg: bytes):
+        self.img_type = img_type
+        self.bgr = bgr              # the square, resized image that was encoded
+        self.jpeg = jpeg            # bytes that are stored
+        self.face = None            # face record (see FaceRecognitionService), once analysed
+        self._rgb = None
+
+    @property
+    def rgb(self) -> np.ndarray:
+        # the pipeline's own buffer, never a decode of the stored JPEG
+        if self._rgb is None:
+            self._rgb = cv2.cvtColor(self.bgr, cv2.COLOR_BGR2RGB)
+        return self._rgb
+
+    @property
+    def pixel_key(self) -> bytes:
+        """
+        Cache-key bytes for a face record computed from self.rgb: the
+        pixels themselves (with their shape), not the JPEG, whose decode
+        differs slightly from the buffer that was encoded.
+        """
+        h, w = self.rgb.shape[:2]
+        return b"rgb:%dx%d:" % (w, h) + self.rgb.tobytes()
+
+
+class ImagePipeline:
+    """
+    Decodes an upload once and runs every step on that buffer: type and
+    quality checks, central square crop, resize, JPEG encode and (on
+    demand) face detection + embedding.  Face analysis reads the same
+    buffer, and its record is cached under those pixels (see
+    ImageArtefacts.pixel_key) rather than the JPEG bytes, so every key
+    names exactly what was analysed.
+    """
 
-    bgr = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
-    if bgr is None:
-        raise ValueError("Corrupt image file")
+    def __init__(self, image_bytes: bytes, allowed_types: set[str] | None = ALLOWED_TYPES):
+        self.img_type = imghdr.what(None, image_bytes)
+        if allowed_types is not None and self.img_type not in allowed_types:
+            raise ValueError("Only JPEG and PNG images are allowed")
+        self.bgr = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR)
+        if self.bgr is None:
+            raise ValueError("Corrupt image file")
 
-    _reject_small_or_blur(bgr)
+    def validate(self) -> "ImagePipeline":
+        _reject_small_or_blur(self.bgr)
+        return self
 
-    # central square crop then resize (if larger than RESIZE_TO)
-    h, w = bgr.shape[:2]
-    side = min(h, w)
-    y0   = (h - side) // 2
-    x0   = (w - side) // 2
-    crop = bgr[y0 : y0 + side, x0 : x0 + side]
+    def square(self, max_side: int = RESIZE_TO) -> "ImagePipeline":
+        # central square crop then resize (if larger than max_side)
+        h, w = self.bgr.shape[:2]
+        side = min(h, w)
+        y0   = (h - side) // 2
+        x0   = (w - side) // 2
+        self.bgr = self.bgr[y0 : y0 + side, x0 : x0 + side]
+        if side > max_side:
+            self.bgr = cv2.resize(self.bgr, (max_side, max_side))
+        return self
 
-    if side > RESIZE_TO:
-        crop = cv2.resize(crop, (RESIZE_TO, RESIZE_TO))
+    def fit(self, size: tuple[int, int]) -> "ImagePipeline":
+        # shrink to fit inside size keeping the aspect ratio (PIL's thumbnail)
+        h, w = self.bgr.shape[:2]
+        scale = min(size[0] / w, size[1] / h)
+        if scale < 1:
+            self.bgr = cv2.resize(self.bgr, (max(1, round(w * scale)), max(1, round(h * scale))),
+                                  interpolation=cv2.INTER_LANCZOS4)
+        return self
 
-    ok, clean = cv2.imencode(
-        ".jpg", crop, [int(cv2.IMWRITE_JPEG_QUALITY), JPEG_QUALITY]
-    )
-    if not ok:
-        raise RuntimeError("Failed to encode image")
+    def encode(self, quality: int = JPEG_QUALITY) -> bytes:
+        ok, clean = cv2.imencode(".jpg", self.bgr, [int(cv2.IMWRITE_JPEG_QUALITY), quality])
+        if not ok:
+            raise RuntimeError("Failed to encode image")
+        return clean.tobytes()
 
-    return clean.tobytes(), "jpeg"
+    def run(self, faces: bool = False) -> ImageArtefacts:
+        """Upload path: validate, square crop, resize, encode, and with faces=True analyse_faces."""
+        self.validate().square()
+        artefacts = ImageArtefacts(self.img_type, self.bgr, self.encode())
+        if faces:
+            self.analyse_faces(artefacts)
+        return artefacts
+
+    @staticmethod
+    def analyse_faces(artefacts: ImageArtefacts, face_service=None) -> dict:
+        """
+        Face detection + embedding on the artefacts' pixels; sets and returns
+        artefacts.face.  face_service: a FaceRecognitionService, one is made
+        when not given (imported here so preprocess() stays free of the ML stack).
+        """
+        if face_service is None:
+            from services.face_recognition_service import FaceRecognitionService
+            face_service = FaceRecognitionService()
+        artefacts.face = face_service.extract_face(artefacts.pixel_key, decoded=artefacts.rgb)
+        return artefacts.face
+
+
+def preprocess(image_bytes: bytes) -> tuple[bytes, str]:
+    return ImagePipeline(image_bytes).run().jpeg, "jpeg"
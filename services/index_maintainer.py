@@ -0,0 +1,280 @@
+# services/index_maintainer.py
+"""
+Change-feed driven maintenance of the in-memory face indexes
+------------------------------------------------------------
+
+Every worker process holds its own FaceIndex per post type.  Writes made
+through PostRepository in *this* process update it directly; the
+IndexMaintainer applies everybody else's writes from a change feed:
+
+• FirestoreChangeFeed → `on_snapshot` listeners on `posts` filtered on the
+                        `updated_at` stamp PostRepository puts on each write,
+                        and on the `post_tombstones` its deletes leave
+• LocalChangeFeed     → in-process stand-in fed by PostRepository listeners
+                        (single process, tests, local development)
+
+Selected with INDEX_CHANGE_FEED = firestore | local | off.
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+
+from config import db
+from models.post_model import Post
+from repositories.post_repository import PostRepository
+
+# ───────── configuration ─────────────────────────────────
+CHANGE_FEED    = os.getenv("INDEX_CHANGE_FEED", "firestore")
+FEED_LOOKBACK  = float(os.getenv("INDEX_FEED_LOOKBACK", "5"))    # s of history replayed on subscribe
+FEED_REANCHOR  = float(os.getenv("INDEX_FEED_REANCHOR", "300"))  # s between listener restarts
+
+logger = logging.getLogger("IndexMaintainer")
+
+
+class PostChange:
+    def __init__(self, kind: str, post_id: str, data: dict | None, update_time: float):
+        self.kind = kind                    # added | modified | removed
+        self.post_id = post_id
+        self.data = data                    # full document, None for removed
+        self.update_time = update_time      # epoch seconds the write was committed
+
+
+class ChangeFeed(ABC):
+    @abstractmethod
+    def subscribe(self, callback, since: float) -> None:
+        """callback(list[PostChange]) for every write committed after `since` (epoch s)."""
+
+    @abstractmethod
+    def close(self) -> None:
+        pass
+
+
+class FirestoreChangeFeed(ChangeFeed):
+    """
+    A listener's result set is every document matching its query, so one
+    anchored at startup would grow with every write for the life of the
+    worker.  Every FEED_REANCHOR seconds the listeners are re-opened from
+    the newest change seen (less FEED_LOOKBACK; re-applying a change is
+    harmless), which keeps the window to recent writes.
+
+    Deletes are read from `post_tombstones` only: a post leaving the
+    `posts` query is not necessarily deleted (e.g. written without
+    `updated_at`), and a deleted one is not always in the query.
+    """
+
+    def __init__(self, reanchor: float = FEED_REANCHOR):
+        self.reanchor = reanchor
+        self._callback = None
+        self._watches = []
+        self._position = 0.0            # newest update_time seen
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback, since: float) -> None:
+        self._callback = callback
+        self._position = since
+        self._anchor(since)
+        self._thread = threading.Thread(target=self._reanchor_loop, name="change-feed-anchor", daemon=True)
+        self._thread.start()
+
+    def _anchor(self, since: float) -> None:
+        start = datetime.fromtimestamp(since, tz=timezone.utc)
+
+        def on_posts(_docs, changes, read_time):
+            batch = []
+            for change in changes:
+                kind = change.type.name.lower()
+                if kind == "removed":           # deletes come from the tombstones
+                    continue
+                doc = change.document
+                stamp = doc.update_time or read_time
+                batch.append(PostChange(kind, doc.id, doc.to_dict(),
+                                        stamp.timestamp() if stamp else time.time()))
+            self._deliver(batch)
+
+        def on_tombstones(_docs, changes, read_time):
+            batch = []
+            for change in changes:
+                if change.type.name.lower() != "added":
+                    continue
+                deleted_at = change.document.get("deleted_at") or read_time
+                batch.append(PostChange("removed", change.document.id, None,
+                                        deleted_at.timestamp() if deleted_at else time.time()))
+            self._deliver(batch)
+
+        watches = [
+            db.collection("posts").where("updated_at", ">", start).on_snapshot(on_posts),
+            db.collection("post_tombstones").where("deleted_at", ">", start).on_snapshot(on_tombstones),
+        ]
+        with self._lock:
+            old, self._watches = self._watches, watches
+        for watch in old:
+            watch.unsubscribe()
+
+    def _deliver(self, batch: list[PostChange]) -> None:
+        if not batch:
+            return
+        with self._lock:
+            self._position = max(self._position, *(c.update_time for c in batch))
+        self._callback(batch)
+
+    def _reanchor_loop(self) -> None:
+        while not self._stop.wait(self.reanchor):
+            try:
+                with self._lock:
+                    since = self._position
+                self._anchor(max(since, time.time() - self.reanchor) - FEED_LOOKBACK)
+            except Exception:
+                logger.exception("Re-anchoring the change feed failed")
+
+    def close(self) -> None:
+        self._stop.set()
+        with self._lock:
+            watches, self._watches = self._watches, []
+        for watch in watches:
+            watch.unsubscribe()
+
+
+class LocalChangeFeed(ChangeFeed):
+    """Replays this process's PostRepository writes, read back like a snapshot listener."""
+
+    def __init__(self):
+        self._callback = None
+        PostRepository.add_listener(self._on_write)
+
+    def subscribe(self, callback, since: float) -> None:
+        self._callback = callback
+
+    def close(self) -> None:
+        self._callback = None
+
+    def _on_write(self, kind: str, post_id: str) -> None:
+        if self._callback is None:
+            return
+        data = None
+        if kind != "removed":
+            doc = PostRepository.get_post_by_id(post_id)
+            data = doc.to_dict() if doc.exists else None
+        self._callback([PostChange(kind, post_id, data, time.time())])
+
+
+class ChangeFeedFactory:
+    @staticmethod
+    def get_feed(name: str = CHANGE_FEED) -> ChangeFeed | None:
+        if name == "off":
+            return None
+        elif name == "firestore":
+            return FirestoreChangeFeed()
+        elif name == "local":
+            return LocalChangeFeed()
+        else:
+            raise ValueError(f"Unknown index change feed: {name}")
+
+
+class IndexMaintainer:
+    """
+    Queues feed changes and applies them to FaceSearchService on one thread,
+    so feed callbacks never block on index locks.  Lag is measured from the
+    write's commit time to the moment it is applied.
+    """
+
+    def __init__(self, feed: ChangeFeed):
+        self.feed = feed
+        self.applied = 0
+        self.last_change = None
+        self.last_lag = 0.0
+        self._queue: queue.Queue[PostChange] = queue.Queue()
+        self._thread = None
+
+    def start(self, since: float | None = None) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="index-maintainer", daemon=True)
+        self._thread.start()
+        self.feed.subscribe(self._enqueue, time.time() - FEED_LOOKBACK if since is None else since)
+
+    def stop(self) -> None:
+        self.feed.close()
+
+    def _enqueue(self, changes: list[PostChange]) -> None:
+        for change in changes:
+            self._queue.put(change)
+
+    def _run(self) -> None:
+        while True:
+            change = self._queue.get()
+            try:
+                self.apply(change)
+            except Exception:
+                logger.exception("Applying %s of post %s failed", change.kind, change.post_id)
+
+    def apply(self, change: PostChange) -> None:
+        from services.face_search_service import FaceSearchService
+
+        if change.kind == "removed" or change.data is None:
+            FaceSearchService.remove_post(change.post_id)
+        else:
+            FaceSearchService.index_post(Post.from_dict(change.post_id, change.data))
+
+        now = time.time()
+        self.applied += 1
+        self.last_lag = max(0.0, now - change.update_time)
+        self.last_change = {
+            "post_id":     change.post_id,
+            "kind":        change.kind,
+            "update_time": change.update_time,
+            "applied_at":  now,
+        }
+
+    def stats(self) -> dict:
+        return {
+            "feed":        type(self.feed).__name__,
+            "applied":     self.applied,
+            "pending":     self._queue.qsize(),
+            "lag_seconds": self.lag(),
+            "last_change": self.last_change,
+        }
+
+    def offset(self) -> float:
+        """Feed position every change before which has been applied (epoch s)."""
+        with self._queue.mutex:
+            oldest = self._queue.queue[0] if self._queue.queue else None
+        return oldest.update_time if oldest else time.time()
+
+    def lag(self) -> float:
+        """Seconds the index is behind: age of the oldest queued change, else the last one's lag."""
+        with self._queue.mutex:
+            oldest = self._queue.queue[0] if self._queue.queue else None
+        return max(0.0, time.time() - oldest.update_time) if oldest else self.last_lag
+
+
+_maintainer = None
+_maintainer_lock = threading.Lock()
+
+def start_index_maintainer() -> IndexMaintainer | None:
+    """
+    Process-wide maintainer on the configured feed; None when disabled.
+    The face indexes are warm-started from the current snapshot when there
+    is one, and the feed replays everything written since it was taken.
+    Later calls return the running maintainer.
+    """
+    from services.face_search_service import FaceSearchService
+
+    global _maintainer
+    with _maintainer_lock:
+        if _maintainer is None:
+            feed = ChangeFeedFactory.get_feed()
+            if feed is None:
+                return None
+            offset = FaceSearchService.warm_start()
+            _maintainer = IndexMaintainer(feed)
+            _maintainer.start(None if offset is None else offset - FEED_LOOKBACK)
+        return _maintainer
+
+def get_index_maintainer() -> IndexMaintainer | None:
+    return _maintainer
@@ -0,0 +1,170 @@
+# services/index_snapshot.py
+"""
+Versioned on-disk snapshots of the face indexes
+-----------------------------------------------
+
+    <FACE_INDEX_SNAPSHOT_DIR>/
+        CURRENT                 → name of the newest complete version
+        <version>/meta.json     → format, model version, storage, feed offset
+        <version>/<post_type>/  → FaceIndex.save + PostMetadataTable.save
+
+A version is written under a temporary name and renamed into place, then
+CURRENT is swapped atomically, so readers never see a partial snapshot.
+Workers on one host that load the same version share its vectors through
+the page cache (see FaceIndex.load).  `feed_offset` is the change-feed
+position (epoch seconds) the snapshot is complete up to; the index
+maintainer replays newer changes after loading.
+
+Only one worker per host writes: the first to take the lock on
+`.writer.lock` keeps it for its lifetime (the OS drops it when that
+process exits), so writes and prunes never race.  After a prune the
+writer deletes the `post_tombstones` no kept version can need any more.
+"""
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from datetime import datetime, timezone
+
+from AiModels.face_recognition.facenet import MODEL_VERSION
+from AiModels.face_recognition.siamese_embedder import CASCADE, SMALL_MODEL_VERSION
+from paths import FACE_INDEX_SNAPSHOT_DIR
+from repositories.post_repository import PostRepository
+from services.ann_index import AnnBackendFactory
+from services.face_index import FaceIndex, STORAGE
+from services.index_maintainer import FEED_LOOKBACK
+from services.post_metadata import PostMetadataTable
+
+# ── enables ─────────────────────────────────────────────────────────
+SNAPSHOT_DIR  = os.getenv("FACE_INDEX_SNAPSHOT_DIR", FACE_INDEX_SNAPSHOT_DIR)
+SNAPSHOT_KEEP = max(1, int(os.getenv("FACE_INDEX_SNAPSHOT_KEEP", "2")))   # versions kept on disk (CURRENT's at least)
+FORMAT        = 1
+SMALL_VERSION = SMALL_MODEL_VERSION if CASCADE else None     # cascade vectors in the snapshot
+
+logger = logging.getLogger("IndexSnapshot")
+
+_writer_locks = {}          # root → open lock file, held for the life of the process
+
+
+def _is_writer(root: str) -> bool:
+    """True once this process holds the snapshot writer lock for `root`."""
+    if root in _writer_locks:
+        return True
+    os.makedirs(root, exist_ok=True)
+    f = open(os.path.join(root, ".writer.lock"), "a+")
+    try:
+        if os.name == "nt":
+            import msvcrt
+            msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        else:
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+    _writer_locks[root] = f
+    return True
+
+
+def write_snapshot(indexes: dict[str, FaceIndex], metadata: dict[str, PostMetadataTable],
+                   feed_offset: float, root: str = SNAPSHOT_DIR) -> str | None:
+    """
+    Writes a new version and makes it current; returns its name, or None
+    when another worker on this host is the snapshot writer.
+    """
+    if not _is_writer(root):
+        logger.info("Skipping face index snapshot: another worker writes them")
+        return None
+    version = f"{time.time_ns()}-{uuid.uuid4().hex[:8]}"
+    tmp = os.path.join(root, f".tmp-{version}")
+    os.makedirs(tmp)
+    for post_type, index in indexes.items():
+        path = os.path.join(tmp, post_type)
+        index.save(path)
+        metadata[post_type].save(path, index.rows)
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({
+            "format":        FORMAT,
+            "model_version": MODEL_VERSION,
+            "storage":       next(iter(indexes.values())).storage if indexes else STORAGE,
+            "small_model_version": SMALL_VERSION,
+            "post_types":    list(indexes),
+            "feed_offset":   feed_offset,
+            "created_at":    time.time(),
+        }, f)
+    os.replace(tmp, os.path.join(root, version))
+
+    pointer = os.path.join(root, f".CURRENT-{version}")
+    with open(pointer, "w") as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(root, "CURRENT"))
+    _prune(root, version)
+    _prune_tombstones(root)
+    return version
+
+
+def read_snapshot(root: str = SNAPSHOT_DIR):
+    """
+    returns : (indexes, metadata, feed_offset) from the current version, or
+              None when there is none or it no longer matches the model /
+              storage settings.
+    """
+    try:
+        with open(os.path.join(root, "CURRENT")) as f:
+            version = f.read().strip()
+        base = os.path.join(root, version)
+        with open(os.path.join(base, "meta.json")) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        return None
+
+    if ((meta["format"], meta["model_version"], meta["storage"], meta.get("small_model_version"))
+            != (FORMAT, MODEL_VERSION, STORAGE, SMALL_VERSION)):
+        logger.info("Ignoring face index snapshot %s built with other settings", version)
+        return None
+
+    indexes, metadata = {}, {}
+    for post_type in meta["post_types"]:
+        path = os.path.join(base, post_type)
+        indexes[post_type] = FaceIndex.load(path, backend=AnnBackendFactory.get_backend())
+        metadata[post_type] = PostMetadataTable.load(path)
+    return indexes, metadata, meta["feed_offset"]
+
+
+def _prune(root: str, current: str, keep: int = SNAPSHOT_KEEP) -> None:
+    keep = max(1, keep)
+    versions = sorted(
+        (name for name in os.listdir(root) if not name.startswith(".") and name != "CURRENT"),
+        key=lambda name: int(name.split("-")[0]),
+    )
+    # open memory maps keep deleted files alive, so old versions can go
+    for name in versions[:max(0, len(versions) - keep)]:
+        if name != current:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def _prune_tombstones(root: str) -> None:
+    """
+    Deletes tombstones older than any kept version replays from: a worker
+    loading one starts its feed FEED_LOOKBACK before its offset, and a
+    worker without a snapshot reads `posts` in full.
+    """
+    offsets = []
+    for name in os.listdir(root):
+        try:
+            with open(os.path.join(root, name, "meta.json")) as f:
+                offsets.append(json.load(f)["feed_offset"])
+        except (OSError, ValueError, KeyError):
+            continue            # CURRENT, lock and temporary files
+    if not offsets:
+        return
+    cutoff = datetime.fromtimestamp(min(offsets) - FEED_LOOKBACK, tz=timezone.utc)
+    try:
+        deleted = PostRepository.delete_tombstones_before(cutoff)
+    except Exception:
+        logger.exception("Deleting post tombstones before %s failed", cutoff)
+        return
+    if deleted:
+        logger.info("Deleted %s post tombstones before %s", deleted, cutoff)
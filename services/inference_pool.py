@@ -0,0 +1,330 @@
+# services/inference_pool.py
+"""
+Face detection + embedding in local worker processes
+----------------------------------------------------
+
+With INFERENCE_WORKERS = N > 0, FaceRecognitionService hands uncached
+images to N spawned processes instead of running MTCNN / FaceNet on the
+request thread, so inference never holds this worker's GIL.
+
+• Image bytes are written once into a pre-allocated shared-memory slot and
+  decoded by the worker straight from it (no pickling of image data); only
+  the small face records come back through the result queue.
+• At most INFERENCE_MAX_QUEUE calls are in flight (one slot each); beyond
+  that `analyse` raises InferenceBusy instead of queueing without bound.
+• Every call has a deadline (INFERENCE_TIMEOUT): the caller gets a
+  TimeoutError and workers skip tasks whose deadline has passed.
+• A worker that dies, or is still on a call STALE_GRACE past its
+  deadline, is (killed and) restarted; calls it was running fail.
+
+With INFERENCE_WORKERS = 0 (default) `analyse_images` runs in-process.
+"""
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from multiprocessing.connection import wait
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from AiModels.face_recognition.align import detect_faces, detect_faces_decoded, DETECTION_VERSION
+from AiModels.face_recognition.embedding_batcher import embed_crops
+from AiModels.face_recognition.facenet import MODEL_VERSION
+from AiModels.face_recognition.siamese_embedder import get_small_embeddings, CASCADE, SMALL_MODEL_VERSION
+from AiModels.model_registry import models
+
+# ── enables ─────────────────────────────────────────────────────────
+WORKERS    = int(os.getenv("INFERENCE_WORKERS", "0"))           # 0 → in-process
+MAX_QUEUE  = int(os.getenv("INFERENCE_MAX_QUEUE", "16"))        # calls in flight (= shm slots)
+TIMEOUT    = float(os.getenv("INFERENCE_TIMEOUT", "30"))        # s per call
+SLOT_BYTES = int(os.getenv("INFERENCE_SLOT_BYTES", str(8 << 20)))
+STALE_GRACE = 5.0           # s past a deadline before a call's slot is reclaimed
+
+LOCAL_MODELS = ("face_detector", "facenet-keras", "facenet-onnx", "siamese_tower")
+
+logger = logging.getLogger("InferencePool")
+
+
+class InferenceBusy(Exception):
+    pass
+
+
+def analyse_images(images) -> list[dict]:
+    """
+    Face records (see FaceRecognitionService) for raw image buffers
+    (bytes or memoryviews) or decoded RGB uint8 arrays, computed in this
+    process; every face of every
+    image is embedded in one batch (shared with concurrent callers when
+    FACENET_BATCH_WINDOW_MS is set, see embedding_batcher.py).
+    """
+    found = [detect_faces_decoded(b) if isinstance(b, np.ndarray) else detect_faces(b) for b in images]
+    crops = [crop for faces in found for crop, _, _ in faces]
+    embs = iter(embed_crops(crops))
+    smalls = iter(get_small_embeddings(crops)) if CASCADE else None
+    records = []
+    for faces in found:
+        record = {
+            "model_version": MODEL_VERSION,
+            "faces": [
+                {"embedding": [float(v) for v in next(embs)], "box": box, "quality": confidence}
+                for _, box, confidence in faces
+            ],
+        }
+        if DETECTION_VERSION:
+            record["detection_version"] = DETECTION_VERSION
+        if CASCADE:
+            record["small_model_version"] = SMALL_MODEL_VERSION
+            for f in record["faces"]:
+                f["small_embedding"] = [float(v) for v in next(smalls)]
+        records.append(record)
+    return records
+
+
+# ───────── worker process ────────────────────────────────
+def _worker_main(tasks, results, worker_no: int) -> None:
+    # results is this worker's own pipe: send() is written before it returns,
+    # so a worker that crashes mid-call has already reported the call started
+    models.warm_up()
+    results.send(("ready", None, worker_no))
+    attached: dict[str, SharedMemory] = {}          # pool slots, mapped once
+    while True:
+        msg = tasks.get()
+        if msg is None:
+            return
+        req_id, shm_name, spans, deadline, one_off = msg     # spans: (offset, size, array shape | None)
+        results.send(("started", req_id, worker_no))
+        if time.time() > deadline:
+            results.send(("done", req_id, TimeoutError("expired in the inference queue")))
+            continue
+        shm = None
+        try:
+            shm = SharedMemory(name=shm_name) if one_off else attached.get(shm_name)
+            if shm is None:
+                shm = attached[shm_name] = SharedMemory(name=shm_name)
+            images = [shm.buf[offset:offset + size] if shape is None
+                      else np.ndarray(shape, np.uint8, buffer=shm.buf, offset=offset)
+                      for offset, size, shape in spans]
+            out = analyse_images(images)
+        except Exception as e:
+            out = e.with_traceback(None)    # its frames would keep the views alive
+        finally:
+            images = None           # drop the views before the mapping can be closed
+            if one_off and shm is not None:
+                shm.close()
+        results.send(("done", req_id, out))
+
+
+class _Call:
+    def __init__(self, slot: SharedMemory, one_off: SharedMemory | None, deadline: float):
+        self.future = Future()
+        self.slot = slot
+        self.one_off = one_off          # dedicated segment for an oversized request
+        self.deadline = deadline
+        self.worker = None              # worker_no once started
+
+
+class InferencePool:
+    def __init__(self, workers: int = WORKERS, max_queue: int = MAX_QUEUE,
+                 timeout: float = TIMEOUT, slot_bytes: int = SLOT_BYTES):
+        self.timeout = timeout
+        self.rejected = 0
+        self.timeouts = 0
+        self.restarts = 0
+        self._ctx = mp.get_context("spawn")         # no forked TensorFlow / Firestore state
+        self._tasks = self._ctx.Queue()
+        self._conns = [None] * workers                # result pipe of each worker
+        self._slots = [SharedMemory(create=True, size=slot_bytes) for _ in range(max_queue)]
+        self._free = list(self._slots)
+        self._calls: dict[int, _Call] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._ready = set()
+        self._ready_event = threading.Event()
+        self._closed = False
+        self._procs = [self._start_worker(i) for i in range(workers)]
+        self._reader = threading.Thread(target=self._read, name="inference-results", daemon=True)
+        self._reader.start()
+
+    def _start_worker(self, worker_no: int):
+        recv, send = self._ctx.Pipe(duplex=False)
+        proc = self._ctx.Process(target=_worker_main, args=(self._tasks, send, worker_no),
+                                 name=f"inference-{worker_no}", daemon=True)
+        proc.start()
+        send.close()
+        self._conns[worker_no] = recv
+        return proc
+
+    # ───────── client ──────────────────────────────────
+    def analyse(self, images: list, timeout: float | None = None) -> list[dict]:
+        """Face records for images (bytes or decoded RGB uint8 arrays), computed by a worker process."""
+        timeout = self.timeout if timeout is None else timeout
+        with self._lock:
+            if not self._free:
+                self.rejected += 1
+                raise InferenceBusy("Face inference queue is full, retry later")
+            slot = self._free.pop()
+
+        one_off = req_id = None
+        try:
+            total = sum(b.nbytes if isinstance(b, np.ndarray) else len(b) for b in images)
+            one_off = SharedMemory(create=True, size=total) if total > slot.size else None
+            shm = one_off or slot
+            spans, offset = [], 0
+            for b in images:
+                if isinstance(b, np.ndarray):
+                    np.ndarray(b.shape, np.uint8, buffer=shm.buf, offset=offset)[...] = b
+                    spans.append((offset, b.nbytes, b.shape))
+                    offset += b.nbytes
+                else:
+                    shm.buf[offset:offset + len(b)] = b
+                    spans.append((offset, len(b), None))
+                    offset += len(b)
+
+            call = _Call(slot, one_off, time.time() + timeout)
+            with self._lock:
+                req_id = next(self._ids)
+                self._calls[req_id] = call
+            self._tasks.put((req_id, shm.name, spans, call.deadline, one_off is not None))
+        except BaseException:
+            # never handed to a worker: give the slot (and segment) back
+            with self._lock:
+                if req_id is not None:
+                    self._calls.pop(req_id, None)
+                self._free.append(slot)
+            if one_off is not None:
+                one_off.close()
+                one_off.unlink()
+            raise
+        try:
+            return call.future.result(timeout)
+        except FutureTimeout:
+            self.timeouts += 1
+            raise TimeoutError(f"Face inference did not answer within {timeout:.0f}s") from None
+
+    # ───────── results / supervision ───────────────────
+    def _read(self) -> None:
+        while not self._closed:
+            # wakes on a result or on a worker exiting (its sentinel)
+            wait(self._conns + [proc.sentinel for proc in self._procs], timeout=0.5)
+            for worker_no in range(len(self._procs)):
+                self._drain(worker_no)
+            self._supervise()
+
+    def _drain(self, worker_no: int) -> None:
+        conn = self._conns[worker_no]
+        try:
+            while conn.poll():
+                kind, req_id, payload = conn.recv()
+                if kind == "ready":
+                    self._ready.add(payload)
+                    if len(self._ready) >= len(self._procs):
+                        self._ready_event.set()
+                elif kind == "started":
+                    call = self._calls.get(req_id)
+                    if call is not None:
+                        call.worker = payload
+                elif kind == "done":
+                    self._finish(req_id, payload)
+        except (EOFError, OSError):
+            pass                # worker gone; _supervise restarts it
+
+    def _finish(self, req_id: int, result) -> None:
+        with self._lock:
+            call = self._calls.pop(req_id, None)
+            if call is None:
+                return
+            self._free.append(call.slot)
+        if call.one_off is not None:
+            call.one_off.close()
+            call.one_off.unlink()
+        if not call.future.done():
+            if isinstance(result, Exception):
+                call.future.set_exception(result)
+            else:
+                call.future.set_result(result)
+
+    def _supervise(self) -> None:
+        now = time.time()
+        # a worker still on a call well past its deadline is hung: kill it so
+        # the restart below fails the call and frees its slot
+        for req_id, call in list(self._calls.items()):
+            if call.worker is not None and now > call.deadline + STALE_GRACE and not self._closed:
+                proc = self._procs[call.worker]
+                if proc.is_alive():
+                    logger.error("Inference worker %s hung on a call; killing it", call.worker)
+                    proc.kill()
+                    proc.join(timeout=5)
+        for worker_no, proc in enumerate(self._procs):
+            if proc.is_alive() or self._closed:
+                continue
+            self._drain(worker_no)
+            self._conns[worker_no].close()
+            logger.error("Inference worker %s exited (code %s); restarting", worker_no, proc.exitcode)
+            self._ready.discard(worker_no)
+            self._procs[worker_no] = self._start_worker(worker_no)
+            self.restarts += 1
+            for req_id, call in list(self._calls.items()):
+                if call.worker == worker_no:
+                    self._finish(req_id, RuntimeError("inference worker exited"))
+        # tasks never picked up before their deadline: workers will skip them
+        for req_id, call in list(self._calls.items()):
+            if call.worker is None and now > call.deadline + STALE_GRACE:
+                self._finish(req_id, TimeoutError("expired in the inference queue"))
+
+    def wait_ready(self, timeout: float | None = None) -> "InferencePool":
+        """Blocks until every worker has loaded its models."""
+        if not self._ready_event.wait(timeout):
+            raise TimeoutError("Inference workers are not ready")
+        return self
+
+    def close(self) -> None:
+        self._closed = True
+        for _ in self._procs:
+            self._tasks.put(None)
+        for proc in self._procs:
+            proc.join(timeout=5)
+        for slot in self._slots:
+            slot.close()
+            slot.unlink()
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_flight, free = len(self._calls), len(self._free)
+        return {
+            "workers":   len(self._procs),
+            "ready":     sorted(self._ready),
+            "alive":     [proc.is_alive() for proc in self._procs],
+            "in_flight": in_flight,
+            "free_slots": free,
+            "rejected":  self.rejected,
+            "timeouts":  self.timeouts,
+            "restarts":  self.restarts,
+        }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_inference_pool() -> InferencePool | None:
+    """Process-wide pool, started on first use; None when INFERENCE_WORKERS = 0."""
+    global _pool
+    if WORKERS <= 0:
+        return None
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = InferencePool()
+    return _pool
+
+def use_inference_pool() -> None:
+    """
+    Makes the pool this process's warm model instead of the local detector
+    and FaceNet, which then only load if something calls them directly.
+    """
+    for name in LOCAL_MODELS:
+        models.set_warm(name, False)
+    models.register("inference_pool", lambda: get_inference_pool().wait_ready())
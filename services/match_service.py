@@ -0,0 +1,69 @@
+# services/match_service.py
+import os
+
+from repositories.match_repository import MatchRepository
+from services.face_recognition_service import FaceRecognitionService
+from services.face_search_service import FaceSearchService
+from models.post_model import Post
+
+# ── enables ─────────────────────────────────────────────────────────
+MATCH_TOP_K = int(os.getenv("MATCH_TOP_K", "10"))     # candidates kept per new face
+
+OPPOSITE_TYPE = {"found": "missing", "missing": "found"}
+
+
+class MatchService:
+    """
+    Match-on-write: a newly embedded post is queried once against the index
+    of the opposite post type, and every pair under
+    FaceRecognitionService.THRESHOLD is stored in the `matches` collection.
+    Clients then read those precomputed candidates instead of searching.
+    """
+
+    @staticmethod
+    def match_post(post: Post) -> int:
+        """Stores the matches for post's faces; returns how many posts matched."""
+        opposite = OPPOSITE_TYPE.get(post.post_type)
+        if opposite is None:
+            return 0
+
+        # other post_id → (distance, this post's face_no, other post's face_no)
+        best = {}
+        for face_no, face in enumerate(FaceRecognitionService.stored_faces(post.face)):
+            for other_id, other_face_no, distance in FaceSearchService.search(
+                face["embedding"], opposite, k=MATCH_TOP_K, small_query=face["small_embedding"]
+            ):
+                if other_id not in best or distance < best[other_id][0]:
+                    best[other_id] = (distance, face_no, other_face_no)
+
+        for other_id, (distance, face_no, other_face_no) in best.items():
+            if post.post_type == "found":
+                found = (post.id, face_no)
+                missing = (other_id, other_face_no)
+            else:
+                found = (other_id, other_face_no)
+                missing = (post.id, face_no)
+            MatchRepository.save_match(found[0], missing[0], {
+                "distance":        distance,
+                "found_face_no":   found[1],
+                "missing_face_no": missing[1],
+            })
+        return len(best)
+
+    @staticmethod
+    def get_matches(post_id: str) -> list[dict]:
+        """Stored matches involving post_id, closest first."""
+        matches = []
+        for doc in MatchRepository.get_matches_for_post(post_id):
+            data = doc.to_dict()
+            created_at = data.get("created_at")
+            matches.append({
+                "match_id":        doc.id,
+                "found_post_id":   data.get("found_post_id"),
+                "missing_post_id": data.get("missing_post_id"),
+                "distance":        data.get("distance"),
+                "found_face_no":   data.get("found_face_no"),
+                "missing_face_no": data.get("missing_face_no"),
+                "created_at":      created_at.isoformat() if hasattr(created_at, "isoformat") else None,
+            })
+        return sorted(matches, key=lambda m: m["distance"])
@@ -0,0 +1,123 @@
+# services/post_metadata.py
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+
+UNKNOWN = -1
+
+
+def epoch_seconds(value: datetime) -> float:
+    """Naive datetimes are taken as UTC (Firestore and the filter schema both mean UTC)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+def normalise_gender(value) -> str | None:
+    if not value:
+        return None
+    g = str(value).strip().lower()
+    return {"m": "male", "man": "male", "boy": "male",
+            "f": "female", "woman": "female", "girl": "female"}.get(g, g)
+
+
+class PostMetadataTable:
+    """
+    Columnar copy of the post fields search can filter on, one row per
+    FaceIndex row: gender / status as small-int codes, age and created_at as
+    floats (NaN when unknown).  A filter is evaluated with a few vectorised
+    comparisons before any embedding is scored; rows with missing metadata
+    always pass.
+    """
+
+    def __init__(self, capacity: int = 1024):
+        self._gender = np.full(capacity, UNKNOWN, dtype=np.int16)
+        self._status = np.full(capacity, UNKNOWN, dtype=np.int16)
+        self._age = np.full(capacity, np.nan, dtype=np.float32)
+        self._created = np.full(capacity, np.nan, dtype=np.float64)
+        self._codes: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _code(self, value: str | None, create: bool = True) -> int:
+        if value is None:
+            return UNKNOWN
+        code = self._codes.get(value)
+        if code is None and create:
+            code = self._codes[value] = len(self._codes)
+        return UNKNOWN if code is None else code
+
+    def _ensure(self, row: int) -> None:
+        n = len(self._age)
+        if row < n:
+            return
+        grow = max(2 * n, row + 1) - n
+        self._gender = np.concatenate([self._gender, np.full(grow, UNKNOWN, dtype=np.int16)])
+        self._status = np.concatenate([self._status, np.full(grow, UNKNOWN, dtype=np.int16)])
+        self._age = np.concatenate([self._age, np.full(grow, np.nan, dtype=np.float32)])
+        self._created = np.concatenate([self._created, np.full(grow, np.nan, dtype=np.float64)])
+
+    def set(self, row: int, post) -> None:
+        age = post.payload.get("missing_age")
+        if age is None:
+            age = post.payload.get("estimated_age")
+        created = post.created_at if isinstance(post.created_at, datetime) else None
+
+        with self._lock:
+            self._ensure(row)
+            self._gender[row] = self._code(normalise_gender(post.payload.get("gender")))
+            self._status[row] = self._code(post.status)
+            self._age[row] = np.nan if age is None else float(age)
+            self._created[row] = np.nan if created is None else epoch_seconds(created)
+
+    def mask(self, n: int, filters: dict | None) -> np.ndarray | None:
+        """Boolean mask over the first n rows, or None when nothing is filtered."""
+        filters = {k: v for k, v in (filters or {}).items() if v is not None}
+        if not filters:
+            return None
+
+        with self._lock:
+            self._ensure(n - 1)
+            keep = np.ones(n, dtype=bool)
+            if "gender" in filters:
+                col = self._gender[:n]
+                keep &= (col == UNKNOWN) | (col == self._code(normalise_gender(filters["gender"]), create=False))
+            if "status" in filters:
+                col = self._status[:n]
+                keep &= (col == UNKNOWN) | (col == self._code(filters["status"], create=False))
+
+            age = self._age[:n]
+            known = ~np.isnan(age)
+            if "min_age" in filters:
+                keep &= ~known | (age >= filters["min_age"])
+            if "max_age" in filters:
+                keep &= ~known | (age <= filters["max_age"])
+
+            created = self._created[:n]
+            known = ~np.isnan(created)
+            if "created_after" in filters:
+                keep &= ~known | (created >= epoch_seconds(filters["created_after"]))
+            if "created_before" in filters:
+                keep &= ~known | (created <= epoch_seconds(filters["created_before"]))
+            return keep
+
+    # ───────── snapshot ────────────────────────────────
+    def save(self, path: str, n: int) -> None:
+        with self._lock:
+            self._ensure(n - 1)
+            np.savez(os.path.join(path, "metadata.npz"), gender=self._gender[:n], status=self._status[:n],
+                     age=self._age[:n], created=self._created[:n])
+            with open(os.path.join(path, "metadata_codes.json"), "w") as f:
+                json.dump(self._codes, f)
+
+    @classmethod
+    def load(cls, path: str) -> "PostMetadataTable":
+        table = cls(capacity=1)
+        with np.load(os.path.join(path, "metadata.npz")) as data:
+            table._gender, table._status = data["gender"], data["status"]
+            table._age, table._created = data["age"], data["created"]
+        with open(os.path.join(path, "metadata_codes.json")) as f:
+            table._codes = json.load(f)
+        return table
@@ -1,15 +1,28 @@
-import uuid, io
+import uuid, io, logging, os, threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse, unquote
 
 import numpy as np
 from firebase_admin import storage, firestore
 from google.cloud.exceptions import NotFound
 from config import db
-from services.image_service import preprocess
+from services.image_service import ImagePipeline, ImageArtefacts
 from repositories.post_repository import PostRepository
+from repositories.match_repository import MatchRepository
 from factories.image_uploader_factory import ImageUploaderFactory
 from models.post_model import Post
+from services.face_recognition_service import FaceRecognitionService
+from services.image_fetcher import get_fetcher
 
+# ── enables ─────────────────────────────────────────────────────────
+FACE_WORKERS     = int(os.getenv("POST_FACE_WORKERS", "2"))         # background embed + match threads
+FACE_RETRIES     = int(os.getenv("POST_FACE_RETRIES", "3"))         # re-runs of a failed analysis
+FACE_RETRY_DELAY = float(os.getenv("POST_FACE_RETRY_DELAY", "2"))   # s before the first, doubled after
+
+logger = logging.getLogger("PostService")
+_face_service = FaceRecognitionService()
+_face_pool = ThreadPoolExecutor(max_workers=FACE_WORKERS, thread_name_prefix="post-face")
 
 
 class PostService:
@@ -36,10 +49,72 @@ class PostService:
                 pass
 
     @staticmethod
-    def _upload_image(file_storage, uid: str, post_type: str) -> str:
+    def _upload_image(file_storage, uid: str, post_type: str) -> tuple[str, ImageArtefacts]:
         uploader = ImageUploaderFactory.get_uploader(post_type)
         return uploader.upload(file_storage, uid)
 
+    # Embeds the faces once per upload; searches only read the stored vectors.
+    # A model failure must not block the post itself: None (unlike a record
+    # with no faces) means the analysis failed and is retried, see
+    # _analyse_and_match.  The upload's pixels are analysed as decoded by the
+    # ImagePipeline.
+    @staticmethod
+    def _analyse_face(image: ImageArtefacts) -> dict | None:
+        try:
+            return ImagePipeline.analyse_faces(image, _face_service)
+        except Exception:
+            logger.exception("Face embedding failed")
+            return None
+
+    # keeps the in-memory face indexes in step with Firestore writes
+    # (imported here: face_search_service depends on PostService)
+    @staticmethod
+    def _sync_face_index(post: Post) -> None:
+        from services.face_search_service import FaceSearchService
+        FaceSearchService.index_post(post)
+
+    @staticmethod
+    def _drop_from_face_index(post_id: str) -> None:
+        from services.face_search_service import FaceSearchService
+        FaceSearchService.remove_post(post_id)
+
+    # Face analysis runs off the request thread: the post is saved without a
+    # face record, then a worker embeds the image, indexes it and stores its
+    # matches against the opposite post type.  A failed analysis (e.g. the
+    # inference queue was full) is resubmitted after FACE_RETRY_DELAY,
+    # doubling, up to FACE_RETRIES times; after that the post keeps no face
+    # record and is picked up by the next backfill (see backfill_face_embeddings).
+    @classmethod
+    def _schedule_face_analysis(cls, post: Post, image: ImageArtefacts, attempt: int = 0) -> None:
+        _face_pool.submit(cls._analyse_and_match, post, image, attempt)
+
+    @classmethod
+    def _analyse_and_match(cls, post: Post, image: ImageArtefacts, attempt: int = 0) -> None:
+        from services.match_service import MatchService
+        try:
+            face = cls._analyse_face(image)
+            if face is None:
+                if attempt < FACE_RETRIES:
+                    delay = FACE_RETRY_DELAY * 2 ** attempt
+                    logger.warning("Retrying face analysis of post %s in %.0fs", post.id, delay)
+                    timer = threading.Timer(delay, cls._schedule_face_analysis, (post, image, attempt + 1))
+                    timer.daemon = True
+                    timer.start()
+                else:
+                    logger.error("Face analysis of post %s failed %s times; left for the backfill",
+                                 post.id, attempt + 1)
+                return
+            doc = PostRepository.get_post_by_id(post.id)
+            # deleted, or its image replaced while this job was queued
+            if not doc.exists or doc.get("image_url") != post.image_url:
+                return
+            PostRepository.update_post(post.id, {"face": face})
+            post = Post.from_dict(post.id, {**doc.to_dict(), "face": face})
+            cls._sync_face_index(post)
+            MatchService.match_post(post)
+        except Exception:
+            logger.exception("Matching post %s failed", post.id)
+
 
     @classmethod
     def _create_post_base(
@@ -50,7 +125,7 @@ class PostService:
         file_storage,
         post_type: str,
     ):
-        image_url = cls._upload_image(file_storage, uid, post_type)
+        image_url, image = cls._upload_image(file_storage, uid, post_type)
         post_id = str(uuid.uuid4())
         post = Post(
             id=post_id,
@@ -58,11 +133,14 @@ class PostService:
             author_name=author_name,
             post_type=post_type,
             image_url=image_url,
-            created_at=firestore.SERVER_TIMESTAMP,
+            # an explicit stamp rather than SERVER_TIMESTAMP, which is only a
+            # sentinel here: the index metadata needs the real value right away
+            created_at=datetime.now(timezone.utc),
             status="active",
-            payload=payload
+            payload=payload,
         )
         PostRepository.create_post(post.id, post.to_dict())
+        cls._schedule_face_analysis(post, image)
         return post.id, image_url
 
     # ───────── public creators ─────────────────────────
@@ -76,11 +154,26 @@ class PostService:
 
     # ───────── updates & deletes ───────────────────────
     @classmethod
-    def update_post(cls, post_id: str, uid: str, update_fields: dict):
+    def update_post(cls, post_id: str, uid: str, update_fields: dict, file_storage=None):
         doc = PostRepository.get_post_by_id(post_id)
         if not doc.exists or doc.get("uid") != uid:
             raise ValueError("Post not found or unauthorized")
+
+        image_url = image = None
+        if file_storage is not None:
+            post_type = doc.get("post_type") or "missing"
+            image_url, image = cls._upload_image(file_storage, uid, post_type)
+            update_fields["image_url"] = image_url
+            update_fields["face"] = None        # re-analysed in the background
+
         PostRepository.update_post(post_id, update_fields)
+        # metadata filters and the embedding may both have changed
+        post = Post.from_dict(post_id, {**(doc.to_dict() or {}), **update_fields})
+        cls._sync_face_index(post)
+        if image is not None:
+            MatchRepository.delete_matches_for_post(post_id)
+            cls._schedule_face_analysis(post, image)
+        return image_url
 
     @classmethod
     def delete_post_for_user(cls, post_id: str, uid: str):
@@ -113,6 +206,8 @@ class PostService:
 
         PostRepository.delete_post(post_id)
         PostRepository.delete_post_report(post_id)
+        MatchRepository.delete_matches_for_post(post_id)
+        cls._drop_from_face_index(post_id)
 
     # ───────── retrieval ──────────────────────────────
     @classmethod
@@ -125,28 +220,61 @@ class PostService:
         doc = PostRepository.get_post_by_id(post_id)
         return None if not doc.exists else Post.from_dict(doc.id, doc.to_dict())
 
+    @classmethod
+    def get_face_embedding(cls, post: Post):
+        """
+        Stored embedding of the post's largest face, or None if it has no usable face.
+        Posts created before embeddings were persisted (or with an older
+        model version) are embedded once here and written back.
+        """
+        if FaceRecognitionService.is_current(post.face):
+            return FaceRecognitionService.stored_embedding(post.face)
+        if not post.image_url:
+            return None
+        try:
+            face = _face_service.extract_face(cls.download_image(post.image_url))
+        except Exception:
+            logger.exception("Backfilling embedding for post %s failed", post.id)
+            return None
+        PostRepository.update_post(post.id, {"face": face})
+        post.face = face
+        return FaceRecognitionService.stored_embedding(face)
+
+    @classmethod
+    def backfill_face_embeddings(cls, posts: list[Post], batch_size: int = 32) -> None:
+        """
+        Batched get_face_embedding for index builds: posts without a current
+        face record are downloaded and embedded batch_size at a time.
+        """
+        stale = [p for p in posts if p.image_url and not FaceRecognitionService.is_current(p.face)]
+        # downloads run concurrently; each batch is embedded as soon as it fills up
+        batch, images = [], []
+        for i, img in get_fetcher().fetch_many([p.image_url for p in stale]):
+            if img is None:
+                logger.warning("Downloading image for post %s failed", stale[i].id)
+                continue
+            batch.append(stale[i])
+            images.append(img)
+            if len(batch) == batch_size:
+                cls._store_faces(batch, images)
+                batch, images = [], []
+        if batch:
+            cls._store_faces(batch, images)
+
+    @staticmethod
+    def _store_faces(posts: list[Post], images: list[bytes]) -> None:
+        try:
+            faces = _face_service.extract_faces(images)
+        except Exception:
+            logger.exception("Backfilling embeddings failed")
+            return
+        for post, face in zip(posts, faces):
+            PostRepository.update_post(post.id, {"face": face})
+            post.face = face
+
     @staticmethod
     def download_image(url: str) -> bytes:
-        from urllib.parse import urlparse, unquote
-        import requests
-
-        # Parse URL to extract blob path
-        parsed = urlparse(url)
-        if "firebasestorage.googleapis.com" in parsed.netloc:
-            # Extract blob path from Firebase URL
-            path_segments = parsed.path.split("/o/")
-            if len(path_segments) > 1:
-                blob_path = unquote(path_segments[1].split("?")[0])
-
-                # Download from Firebase Storage
-                bucket = storage.bucket()
-                blob = bucket.blob(blob_path)
-                return blob.download_as_bytes()
-
-        # Fallback to regular download
-        response = requests.get(url)
-        response.raise_for_status()
-        return response.content
+        return get_fetcher().fetch(url)
 
     @classmethod
     def get_found_post_count(cls) -> int:
@@ -0,0 +1,126 @@
+# services/search_jobs.py
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# ── enables ─────────────────────────────────────────────────────────
+JOB_WORKERS   = int(os.getenv("SEARCH_JOB_WORKERS", "4"))
+JOB_MAX_QUEUE = int(os.getenv("SEARCH_JOB_MAX_QUEUE", "64"))     # queued + running
+JOB_TTL       = float(os.getenv("SEARCH_JOB_TTL", "600"))        # seconds results are kept
+
+logger = logging.getLogger("SearchJobs")
+
+
+class JobQueueFull(Exception):
+    pass
+
+
+class SearchJob:
+    def __init__(self, job_id: str, kind: str, key: str, uid: str | None):
+        self.id = job_id
+        self.kind = kind
+        self.key = key
+        self.uid = uid
+        self.status = "queued"          # queued → running → done | failed
+        self.progress = 0.0
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    def to_dict(self) -> dict:
+        data = {
+            "job_id":   self.id,
+            "kind":     self.kind,
+            "status":   self.status,
+            "progress": round(self.progress, 2),
+        }
+        if self.status == "done":
+            data["result"] = self.result
+        elif self.status == "failed":
+            data["error"] = self.error
+        return data
+
+
+class SearchJobManager:
+    """
+    Runs searches on a local worker pool so the request thread can return a
+    job id immediately.  Identical in-flight requests (same image hash, kind
+    and parameters) share one job, at most `max_queue` jobs may be waiting or
+    running, and finished jobs are kept for `ttl` seconds for polling.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, max_queue: int = JOB_MAX_QUEUE, ttl: float = JOB_TTL):
+        self.max_queue = max_queue
+        self.ttl = ttl
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="search-job")
+        self._jobs: dict[str, SearchJob] = {}
+        self._in_flight: dict[str, SearchJob] = {}      # dedupe key → job
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def job_key(kind: str, image_bytes: bytes, params: dict) -> str:
+        h = hashlib.sha256(image_bytes)
+        h.update(kind.encode())
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def submit(self, kind: str, image_bytes: bytes, params: dict, fn, uid: str | None = None) -> SearchJob:
+        """
+        fn(progress) runs on the pool and returns the JSON-serialisable result;
+        progress(fraction) may be called to report how far it got.
+        """
+        # results carry uploader contact details, so jobs are only shared per user
+        key = self.job_key(kind, image_bytes, dict(params, uid=uid))
+        with self._lock:
+            self._purge_expired()
+            job = self._in_flight.get(key)
+            if job is not None:
+                return job
+            if len(self._in_flight) >= self.max_queue:
+                raise JobQueueFull("Too many searches in progress, retry later")
+
+            job = SearchJob(str(uuid.uuid4()), kind, key, uid)
+            self._jobs[job.id] = job
+            self._in_flight[key] = job
+        self._pool.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> SearchJob | None:
+        with self._lock:
+            self._purge_expired()
+            return self._jobs.get(job_id)
+
+    def _run(self, job: SearchJob, fn) -> None:
+        job.status = "running"
+
+        def progress(fraction: float) -> None:
+            job.progress = max(job.progress, min(float(fraction), 1.0))
+
+        try:
+            job.result = fn(progress)
+            job.progress = 1.0
+            job.status = "done"
+        except Exception as e:
+            logger.exception("Search job %s failed", job.id)
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._in_flight.get(job.key) is job:
+                    del self._in_flight[job.key]
+
+    def _purge_expired(self) -> None:
+        cutoff = time.time() - self.ttl
+        expired = [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+
+search_jobs = SearchJobManager()
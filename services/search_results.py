@@ -0,0 +1,66 @@
+# services/search_results.py
+import os
+import threading
+import time
+import uuid
+
+# ── enables ─────────────────────────────────────────────────────────
+RESULTS_TTL         = float(os.getenv("SEARCH_RESULTS_TTL", "900"))     # seconds a cursor stays valid
+RESULTS_MAX_ENTRIES = int(os.getenv("SEARCH_RESULTS_MAX_ENTRIES", "10000"))
+
+
+class SearchResultStore:
+    """
+    Keeps the ranked (post_id, face_no, distance) list of a search so later
+    pages are served from it instead of searching again.  Only ids and
+    distances are held; post details are read per page.  Cursors are
+    "<result_id>:<offset>" and are only valid for the user that searched.
+    """
+
+    def __init__(self, ttl: float = RESULTS_TTL, max_entries: int = RESULTS_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._results: dict[str, tuple[str | None, list, float]] = {}   # id → (uid, hits, expires)
+        self._lock = threading.Lock()
+
+    def put(self, hits: list, uid: str | None) -> str:
+        result_id = uuid.uuid4().hex
+        with self._lock:
+            self._purge_expired()
+            if len(self._results) >= self.max_entries:
+                # dicts keep insertion order: drop the oldest
+                del self._results[next(iter(self._results))]
+            self._results[result_id] = (uid, hits, time.time() + self.ttl)
+        return result_id
+
+    def get(self, result_id: str, uid: str | None) -> list | None:
+        with self._lock:
+            self._purge_expired()
+            entry = self._results.get(result_id)
+        if entry is None or entry[0] != uid:
+            return None
+        return entry[1]
+
+    def _purge_expired(self) -> None:
+        now = time.time()
+        expired = [k for k, (_, _, expires) in self._results.items() if expires < now]
+        for k in expired:
+            del self._results[k]
+
+    @staticmethod
+    def cursor(result_id: str, offset: int) -> str:
+        return f"{result_id}:{offset}"
+
+    @staticmethod
+    def parse_cursor(cursor: str) -> tuple[str, int]:
+        try:
+            result_id, offset = cursor.split(":", 1)
+            offset = int(offset)
+        except (AttributeError, ValueError):
+            raise ValueError("Invalid cursor")
+        if offset < 0:
+            raise ValueError("Invalid cursor")
+        return result_id, offset
+
+
+search_results = SearchResultStore()
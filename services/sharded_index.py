@@ -0,0 +1,392 @@
+# services/sharded_index.py
+"""
+Face index partitioned over local worker processes
+--------------------------------------------------
+
+Each shard process owns a FaceIndex and PostMetadataTable for the posts
+whose id hashes to it (all faces of a post live on one shard).  A query is
+sent to every shard at once and the per-shard top-k lists are merged, so
+scoring runs on N cores in parallel.  A shard that has died or does not
+answer within SHARD_TIMEOUT is left out and the merged result is marked
+partial instead of failing the search.
+
+A dead shard is restarted on the next call and its partition re-read
+through the `loader` callback (from Firestore, see FaceSearchService);
+until that finishes it counts as missing.  Writes wait at most
+SHARD_WRITE_TIMEOUT, and a shard that misses it is killed and restarted
+the same way.  A resize cancels refills still running for the old layout;
+when any partition could not be drained it refills every new shard.
+
+Enabled with FACE_INDEX_SHARDS = N (0 keeps the in-process FaceIndex).
+"""
+import hashlib
+import heapq
+import itertools
+import logging
+import multiprocessing as mp
+import os
+import threading
+from concurrent.futures import Future, wait
+
+import numpy as np
+
+from AiModels.face_recognition.facenet import EMBEDDING_DIM
+from models.post_model import Post
+
+# ───────── configuration ─────────────────────────────────
+SHARDS        = int(os.getenv("FACE_INDEX_SHARDS", "0"))
+SHARD_TIMEOUT = float(os.getenv("FACE_INDEX_SHARD_TIMEOUT", "2.0"))   # s per search
+SHARD_WRITE_TIMEOUT = float(os.getenv("FACE_INDEX_SHARD_WRITE_TIMEOUT", "30"))  # s per add / remove
+
+logger = logging.getLogger("ShardedFaceIndex")
+
+
+def shard_of(post_id: str, n_shards: int) -> int:
+    # stable across processes and restarts, unlike hash()
+    digest = hashlib.blake2b(post_id.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % n_shards
+
+
+def _light(post: Post) -> Post:
+    """The post without its face record: only the filterable fields cross the pipe."""
+    return Post(post.id, post.uid, post.author_name, post.post_type, None,
+                post.created_at, post.status, post.payload)
+
+
+# ───────── shard process ─────────────────────────────────
+def _shard_main(conn, dim: int, storage: str, backend_name: str) -> None:
+    from services.ann_index import AnnBackendFactory
+    from services.face_index import FaceIndex
+    from services.post_metadata import PostMetadataTable
+
+    index = FaceIndex(dim=dim, storage=storage, backend=AnnBackendFactory.get_backend(backend_name, dim))
+    metadata = PostMetadataTable()
+    posts: dict = {}            # key → light Post, re-sent when the key moves shard
+
+    def add(keys, vectors, light_posts):
+        for key, vec, post in zip(keys, vectors, light_posts):
+            metadata.set(index.add(key, vec), post)
+            posts[key] = post
+        index.train_in_background()
+        return len(index)
+
+    def remove(keys):
+        for key in keys:
+            index.remove(key)
+            posts.pop(key, None)
+        return len(index)
+
+    def search(query, k, threshold, filters):
+        return index.search(query, k=k, threshold=threshold, mask=metadata.mask(index.rows, filters))
+
+    def drain(n_shards, shard_no):
+        # hand over every entry that belongs to another shard after a resize
+        moving = [key for key in index.keys() if shard_of(key[0], n_shards) != shard_no]
+        out = ([], [], [])
+        for key in moving:
+            out[0].append(key)
+            out[1].append(index.get(key))
+            out[2].append(posts[key])
+        remove(moving)
+        return out[0], np.asarray(out[1], dtype=np.float32).reshape(-1, dim), out[2]
+
+    ops = {"add": add, "remove": remove, "search": search, "drain": drain, "len": lambda: len(index)}
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            return
+        if msg is None:
+            return
+        req_id, op, args = msg
+        try:
+            result = ops[op](*args)
+        except Exception as e:
+            result = e
+        conn.send((req_id, result))
+
+
+class _Shard:
+    def __init__(self, ctx, dim: int, storage: str, backend_name: str):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_shard_main, args=(child, dim, storage, backend_name), daemon=True)
+        self.process.start()
+        child.close()
+        self.alive = True
+        self.stopping = False
+        self._pending: dict[int, Future] = {}
+        self._ids = itertools.count()
+        self._send_lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def call(self, op: str, *args) -> Future:
+        fut = Future()
+        if not self.alive:
+            fut.set_exception(RuntimeError("shard is down"))
+            return fut
+        with self._send_lock:
+            req_id = next(self._ids)
+            self._pending[req_id] = fut
+            try:
+                self.conn.send((req_id, op, args))
+            except (OSError, ValueError) as e:
+                self._pending.pop(req_id, None)
+                fut.set_exception(e)
+        return fut
+
+    def _read(self) -> None:
+        while True:
+            try:
+                req_id, result = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            fut = self._pending.pop(req_id, None)
+            if fut is None:
+                continue
+            if isinstance(result, Exception):
+                fut.set_exception(result)
+            else:
+                fut.set_result(result)
+        self.alive = False
+        if not self.stopping:
+            logger.error("Index shard process %s exited", self.process.pid)
+        for fut in self._pending.values():
+            fut.set_exception(RuntimeError("shard is down"))
+        self._pending.clear()
+
+    def kill(self) -> None:
+        """Hung shard: the reader sees the pipe close and fails its pending calls."""
+        self.process.kill()
+        self.process.join(timeout=5)
+
+    def stop(self) -> None:
+        self.stopping = True
+        try:
+            with self._send_lock:
+                self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=5)
+
+
+class ShardedFaceIndex:
+    """
+    FaceIndex-like coordinator over `n_shards` worker processes.  Unlike
+    FaceIndex it takes the post with each embedding (for the shard's
+    metadata table) and search takes filters instead of a row mask.
+    """
+
+    def __init__(self, n_shards: int = SHARDS, dim: int = EMBEDDING_DIM, storage: str | None = None,
+                 backend_name: str | None = None, timeout: float = SHARD_TIMEOUT,
+                 write_timeout: float = SHARD_WRITE_TIMEOUT, loader=None):
+        """
+        loader(shard_no, n_shards) → [(key, embedding, post), ...]: every
+        entry of one partition, used to refill a restarted shard.
+        """
+        from services.ann_index import BACKEND
+        from services.face_index import STORAGE
+
+        self.dim = dim
+        self.storage = storage or STORAGE
+        self.backend_name = backend_name or BACKEND
+        self.timeout = timeout
+        self.write_timeout = write_timeout
+        self.loader = loader
+        self.restarts = 0
+        self._ctx = mp.get_context("spawn")         # no forked TensorFlow / Firestore state
+        self._shards = [self._start_shard() for _ in range(max(1, n_shards))]
+        self._lock = threading.RLock()              # held while shards are resized
+        self._reloading: dict[int, set] = {}        # shard_no → keys removed while it refills
+        self._generation = 0                        # bumped by resize: refills of older layouts stop
+
+    def _start_shard(self) -> _Shard:
+        return _Shard(self._ctx, self.dim, self.storage, self.backend_name)
+
+    @property
+    def n_shards(self) -> int:
+        return len(self._shards)
+
+    def __len__(self) -> int:
+        """Entries on the shards that answer in time (never raises for a missing shard)."""
+        futures = [s.call("len") for s in self._shards if s.alive]
+        wait(futures, timeout=self.timeout)
+        return sum(fut.result() for fut in futures if fut.done() and fut.exception() is None)
+
+    # ───────── supervision ─────────────────────────────
+    def _respawn_dead(self, refill: bool = True) -> None:
+        """Restarts dead shards and (with refill) refills them in the background; callers hold self._lock."""
+        for shard_no, shard in enumerate(self._shards):
+            if shard.alive or shard.stopping:
+                continue
+            logger.error("Restarting index shard %d", shard_no)
+            self._shards[shard_no] = self._start_shard()
+            self.restarts += 1
+            if refill:
+                self._refill(shard_no)
+
+    def _refill(self, shard_no: int) -> None:
+        """Re-reads shard_no's partition through the loader on a background thread; callers hold self._lock."""
+        if self.loader is None:
+            logger.error("Index shard %d lost its entries and there is no loader to refill it", shard_no)
+            return
+        removed = self._reloading[shard_no] = set()
+        threading.Thread(target=self._reload,
+                         args=(shard_no, self._shards[shard_no], self.n_shards, self._generation, removed),
+                         name=f"index-shard-reload-{shard_no}", daemon=True).start()
+
+    def _reload(self, shard_no: int, shard: _Shard, n_shards: int, generation: int, removed: set) -> None:
+        def current() -> bool:
+            # a resize or another restart has taken over this partition
+            return self._generation == generation and self._shards[shard_no] is shard
+
+        entries = []
+        try:
+            entries = self.loader(shard_no, n_shards)
+            # only the sends hold the lock: searches and writes go on while the shard fills
+            with self._lock:
+                if not current():
+                    return
+                fut = shard.call(
+                    "add", [key for key, _, _ in entries],
+                    np.stack([np.asarray(emb, dtype=np.float32) for _, emb, _ in entries]),
+                    [_light(post) for _, _, post in entries]) if entries else None
+            if fut is not None:
+                self._wait_write(shard, [fut])
+            with self._lock:
+                if not current():
+                    return
+                # deleted after the loader read them; later removes reach the shard after the add
+                fut = shard.call("remove", list(removed)) if removed else None
+            if fut is not None:
+                self._wait_write(shard, [fut])
+            logger.info("Index shard %d refilled with %d entries", shard_no, len(entries))
+        except Exception:
+            logger.exception("Refilling index shard %d failed", shard_no)
+        finally:
+            with self._lock:
+                if self._reloading.get(shard_no) is removed:
+                    self._reloading.pop(shard_no)
+
+    def _wait_write(self, shard: _Shard, futures: list[Future]) -> None:
+        done, not_done = wait(futures, timeout=self.write_timeout)
+        if not_done:
+            logger.error("Index shard %s did not answer a write within %.0fs; killing it",
+                         shard.process.pid, self.write_timeout)
+            shard.kill()
+            raise TimeoutError("Index shard did not answer in time")
+        for fut in done:
+            fut.result()
+
+    # ───────── mutation ────────────────────────────────
+    def add(self, key, embedding, post: Post) -> None:
+        self.add_many([(key, embedding, post)])
+
+    update = add
+
+    def add_many(self, entries: list[tuple]) -> None:
+        """entries: (key, embedding, post) with key = (post_id, face_no); one message per shard."""
+        with self._lock:
+            self._respawn_dead()
+            groups: dict[int, tuple[list, list, list]] = {}
+            for key, emb, post in entries:
+                group = groups.setdefault(shard_of(key[0], self.n_shards), ([], [], []))
+                group[0].append(key)
+                group[1].append(np.asarray(emb, dtype=np.float32))
+                group[2].append(_light(post))
+            calls = [
+                (self._shards[i], self._shards[i].call("add", keys, np.stack(vecs), posts))
+                for i, (keys, vecs, posts) in groups.items()
+            ]
+        for shard, fut in calls:
+            self._wait_write(shard, [fut])
+
+    def remove(self, key) -> None:
+        with self._lock:
+            self._respawn_dead()
+            shard_no = shard_of(key[0], self.n_shards)
+            if shard_no in self._reloading:
+                self._reloading[shard_no].add(key)
+            shard = self._shards[shard_no]
+            fut = shard.call("remove", [key])
+        self._wait_write(shard, [fut])
+
+    def resize(self, n_shards: int) -> None:
+        """
+        Rebalances onto n_shards processes: shards that stay keep the entries
+        still hashing to them and hand the rest over; removed shards are
+        drained completely and stopped.  Searches wait until it is done.
+
+        A partition that cannot be drained (its shard is dead, still
+        refilling, or misses SHARD_WRITE_TIMEOUT) is lost to the new layout,
+        so every new shard is then refilled through the loader.
+        """
+        with self._lock:
+            old = self._shards
+            self._generation += 1           # running refills belong to the old layout
+            lost = {shard_no for shard_no, shard in enumerate(old) if not shard.alive} | set(self._reloading)
+            self._reloading = {}
+            self._shards = old[:n_shards] + [self._start_shard() for _ in range(n_shards - len(old))]
+            # a shard being removed owns nothing: every entry moves
+            drains = [(shard_no, shard, shard.call("drain", n_shards, shard_no if shard_no < n_shards else -1))
+                      for shard_no, shard in enumerate(old) if shard.alive]
+            moved = []
+            for shard_no, shard, fut in drains:
+                try:
+                    self._wait_write(shard, [fut])
+                except Exception:
+                    logger.exception("Draining index shard %d failed", shard_no)
+                    lost.add(shard_no)
+                    continue
+                keys, vecs, posts = fut.result()
+                moved.extend(zip(keys, vecs, posts))
+            self._respawn_dead(refill=False)
+            self.add_many(moved)
+            for shard in old[n_shards:]:
+                shard.stop()
+            if lost:
+                logger.error("Index shards %s could not be drained; refilling all %d shards",
+                             sorted(lost), n_shards)
+                for shard_no in range(n_shards):
+                    self._refill(shard_no)
+        logger.info("Face index resharded %d → %d (%d entries moved)", len(old), n_shards, len(moved))
+
+    def close(self) -> None:
+        for shard in self._shards:
+            shard.stop()
+
+    # ───────── query ───────────────────────────────────
+    def search(self, query, k: int = 10, threshold: float | None = None,
+               filters: dict | None = None) -> list[tuple]:
+        return self.search_partial(query, k, threshold, filters)[0]
+
+    def search_partial(self, query, k: int = 10, threshold: float | None = None,
+                       filters: dict | None = None) -> tuple[list[tuple], list[int]]:
+        """returns : (merged top-k (key, distance), numbers of the shards left out)"""
+        q = np.asarray(query, dtype=np.float32).reshape(-1)
+        with self._lock:
+            self._respawn_dead()
+            futures = [shard.call("search", q, k, threshold, filters) for shard in self._shards]
+            refilling = set(self._reloading)
+        wait(futures, timeout=self.timeout)
+
+        results, failed = [], []
+        for shard_no, fut in enumerate(futures):
+            if fut.done() and fut.exception() is None:
+                if shard_no in refilling:
+                    failed.append(shard_no)     # answered from a partial partition
+                results.append(fut.result())
+            else:
+                failed.append(shard_no)
+        if failed:
+            logger.warning("Face search answered without shards %s", failed)
+        merged = heapq.nsmallest(k, itertools.chain.from_iterable(results), key=lambda hit: hit[1])
+        return merged, failed
+
+    def stats(self) -> dict:
+        return {
+            "shards":    self.n_shards,
+            "alive":     [shard.alive for shard in self._shards],
+            "refilling": sorted(self._reloading),
+            "restarts":  self.restarts,
+        }
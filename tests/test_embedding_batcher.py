@@ -0,0 +1,84 @@
+# tests/test_embedding_batcher.py
+import threading
+
+import numpy as np
+import pytest
+
+from AiModels.face_recognition.embedding_batcher import EmbeddingBatcher
+
+
+class FakeModel:
+    """run(crops, batch_size) stand-in: row i is the crop's fill value, repeated."""
+
+    def __init__(self, fail: bool = False):
+        self.batches = []
+        self.fail = fail
+
+    def __call__(self, crops, batch_size=None):
+        self.batches.append(len(crops))
+        if self.fail:
+            raise RuntimeError("model down")
+        return np.array([[float(c.flat[0])] * 3 for c in crops], dtype=np.float32).reshape(-1, 3)
+
+
+def crop(value: float) -> np.ndarray:
+    return np.full((2, 2, 3), value, dtype=np.float32)
+
+
+def embed_concurrently(batcher, requests):
+    results, errors = [None] * len(requests), [None] * len(requests)
+
+    def call(i):
+        try:
+            results[i] = batcher.embed(requests[i])
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(len(requests))]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(timeout=5)
+    return results, errors
+
+
+def test_each_caller_gets_its_own_rows():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(window_ms=200, max_batch=64, run=model)
+    requests = [[crop(i * 10 + j) for j in range(i + 1)] for i in range(5)]
+    results, _ = embed_concurrently(batcher, requests)
+    for request, out in zip(requests, results):
+        assert out[:, 0].tolist() == [float(c.flat[0]) for c in request]
+    assert sum(model.batches) == 15
+    assert len(model.batches) < 5           # at least some calls shared a batch
+
+
+def test_batches_never_exceed_max_batch():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(window_ms=100, max_batch=4, run=model)
+    results, _ = embed_concurrently(batcher, [[crop(i), crop(i)] for i in range(6)])
+    assert all(size <= 4 for size in model.batches)
+    assert all(out.shape == (2, 3) for out in results)
+
+
+def test_failure_reaches_every_caller_in_the_batch():
+    batcher = EmbeddingBatcher(window_ms=100, max_batch=64, run=FakeModel(fail=True))
+    _, errors = embed_concurrently(batcher, [[crop(1)], [crop(2)]])
+    assert all(isinstance(e, RuntimeError) for e in errors)
+
+
+def test_empty_request_skips_the_scheduler():
+    model = FakeModel()
+    batcher = EmbeddingBatcher(window_ms=100, run=model)
+    assert batcher.embed([]).shape == (0, 3)
+    assert batcher.stats()["batches"] == 0
+
+
+def test_stats():
+    batcher = EmbeddingBatcher(window_ms=0, max_batch=64, run=FakeModel())
+    batcher.embed([crop(1), crop(2), crop(3)])
+    stats = batcher.stats()
+    assert stats["batches"] == 1 and stats["requests"] == 1
+    assert stats["mean_batch_size"] == 3
+    assert stats["batch_size_histogram"]["4"] == 1
+    assert stats["queue_wait_ms"]["p50"] == pytest.approx(stats["queue_wait_ms"]["max"])
@@ -0,0 +1,84 @@
+# tests/test_embedding_cache.py
+import itertools
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+import services.embedding_cache as embedding_cache
+from services.embedding_cache import EmbeddingCache, SCHEMA_VERSION
+
+
+def record(n_faces: int = 1, small: bool = False) -> dict:
+    faces = [{"embedding": [float(i)] * 4, "box": [i, i, 10, 10], "quality": 0.9} for i in range(n_faces)]
+    rec = {"model_version": "m1", "faces": faces}
+    if small:
+        rec["small_model_version"] = "s1"
+        for i, face in enumerate(faces):
+            face["small_embedding"] = [float(-i)] * 2
+    return rec
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return EmbeddingCache(str(tmp_path / "cache.sqlite3"), max_entries=10)
+
+
+def test_key_depends_on_model_version():
+    assert EmbeddingCache.key(b"img", "m1") != EmbeddingCache.key(b"img", "m2")
+    assert EmbeddingCache.key(b"img", "m1") == EmbeddingCache.key(b"img", "m1")
+
+
+def test_round_trip(cache):
+    cache.put("a", record(2))
+    assert cache.get("a") == record(2)
+    assert cache.get("missing") is None
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_round_trip_without_faces_and_with_small_embeddings(cache):
+    cache.put("none", record(0))
+    cache.put("small", record(2, small=True))
+    assert cache.get("none") == record(0)
+    assert cache.get("small") == record(2, small=True)
+
+
+def test_replacing_a_key_does_not_count_twice(cache):
+    for _ in range(5):
+        cache.put("a", record())
+    assert cache.stats()["entries"] == 1
+
+
+def test_evicts_least_recently_used(cache, monkeypatch):
+    clock = itertools.count(1)
+    monkeypatch.setattr(embedding_cache, "time", SimpleNamespace(time=lambda: float(next(clock))))
+    for i in range(10):
+        cache.put(f"k{i}", record())
+    cache.get("k0")                             # k0 is now the most recently used
+    cache.put("k10", record())
+    assert cache.stats()["entries"] == 9
+    assert cache.get("k0") is not None
+    assert cache.get("k1") is None and cache.get("k2") is None
+
+
+def test_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    EmbeddingCache(path).put("a", record())
+    assert EmbeddingCache(path).get("a") == record()
+
+
+def test_migrates_old_files_once(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE faces (key TEXT PRIMARY KEY, embedding BLOB)")    # pre-face_sets format
+    db.commit()
+    db.close()
+
+    EmbeddingCache(path).put("a", record(2, small=True))
+    with sqlite3.connect(path) as db:
+        assert db.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        tables = {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert tables == {"face_sets"}
+
+    # a later open must not drop or alter anything
+    assert EmbeddingCache(path).get("a") == record(2, small=True)
@@ -0,0 +1,195 @@
+# tests/test_face_index.py
+import numpy as np
+import pytest
+
+from services.ann_index import RERANK_FACTOR
+from services.face_index import FaceIndex
+
+DIM = 8
+
+
+def unit(seed: int, dim: int = DIM) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal(dim).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def filled(n: int, **kwargs) -> FaceIndex:
+    index = FaceIndex(dim=DIM, capacity=4, **kwargs)
+    for i in range(n):
+        index.add(("p", i), unit(i))
+    return index
+
+
+# ───────── mutation ────────────────────────────────
+def test_add_normalises_and_returns_row():
+    index = FaceIndex(dim=DIM, capacity=4)
+    row = index.add("a", unit(0) * 5)
+    assert row == 0
+    assert np.allclose(index.get("a"), unit(0), atol=1e-6)
+    assert "a" in index and len(index) == 1
+
+
+def test_add_rejects_bad_vectors():
+    index = FaceIndex(dim=DIM)
+    with pytest.raises(ValueError):
+        index.add("a", np.ones(DIM + 1))
+    with pytest.raises(ValueError):
+        index.add("a", np.zeros(DIM))
+
+
+def test_update_keeps_the_row():
+    index = filled(3)
+    row = index.add(("p", 1), unit(10))
+    assert row == 1 and len(index) == 3
+    assert index.search(unit(10), k=1)[0][0] == ("p", 1)
+
+
+def test_removed_rows_are_reused():
+    index = filled(3)
+    assert index.remove(("p", 1))
+    assert not index.remove(("p", 1))
+    assert ("p", 1) not in index
+    assert index.add("new", unit(20)) == 1      # recycled from the free list
+    assert index.rows == 3
+
+
+def test_grows_past_capacity():
+    index = filled(10)                          # capacity 4 → 8 → 16
+    assert len(index) == index.rows == 10
+    for i in range(10):
+        assert index.search(unit(i), k=1)[0][0] == ("p", i)
+
+
+# ───────── query ───────────────────────────────────
+def test_search_orders_by_distance():
+    index = filled(20)
+    hits = index.search(unit(3), k=5)
+    assert hits[0] == (("p", 3), pytest.approx(0.0, abs=1e-5))
+    dists = [d for _, d in hits]
+    assert dists == sorted(dists) and len(hits) == 5
+
+
+def test_search_skips_removed_rows():
+    index = filled(5)
+    index.remove(("p", 2))
+    assert ("p", 2) not in [key for key, _ in index.search(unit(2), k=5)]
+
+
+def test_search_threshold_and_mask():
+    index = filled(10)
+    assert [key for key, _ in index.search(unit(4), k=10, threshold=1e-4)] == [("p", 4)]
+
+    mask = np.zeros(index.rows, dtype=bool)
+    mask[[1, 7]] = True
+    assert {key for key, _ in index.search(unit(4), k=10, mask=mask)} == {("p", 1), ("p", 7)}
+
+
+def test_search_empty_index():
+    assert FaceIndex(dim=DIM).search(unit(0)) == []
+
+
+# ───────── quantised storage ───────────────────────
+@pytest.mark.parametrize("storage, tol", [("float16", 1e-3), ("int8", 2e-2)])
+def test_quantised_round_trip(storage, tol):
+    index = filled(16, storage=storage)
+    for i in range(16):
+        assert np.allclose(index.get(("p", i)), unit(i), atol=tol)
+
+
+@pytest.mark.parametrize("storage", ["float16", "int8"])
+def test_quantised_search_matches_float32(storage):
+    exact, quantised = filled(50), filled(50, storage=storage)
+    for i in range(0, 50, 5):
+        query = unit(i) + 0.1 * unit(100 + i)
+        assert quantised.search(query, k=1)[0][0] == exact.search(query, k=1)[0][0] == ("p", i)
+
+
+def test_quantised_storage_is_smaller():
+    sizes = {s: FaceIndex(dim=DIM, capacity=64, storage=s).memory_bytes()
+             for s in ("float32", "float16", "int8")}
+    assert sizes["int8"] < sizes["float16"] < sizes["float32"]
+
+
+def test_exact_rerank_scores_from_float32():
+    index = filled(30, storage="int8", exact_rerank=True)
+    key, dist = index.search(unit(7), k=1)[0]
+    assert key == ("p", 7) and dist == pytest.approx(0.0, abs=1e-6)
+
+
+def test_unknown_storage():
+    with pytest.raises(ValueError):
+        FaceIndex(dim=DIM, storage="int4")
+
+
+# ───────── snapshot ────────────────────────────────
+@pytest.mark.parametrize("storage", ["float32", "int8"])
+def test_save_load_round_trip(tmp_path, storage):
+    index = filled(12, storage=storage)
+    index.remove(("p", 5))
+    index.save(str(tmp_path))
+
+    loaded = FaceIndex.load(str(tmp_path))
+    assert loaded.storage == storage
+    assert set(loaded.keys()) == set(index.keys())      # keys come back as tuples
+    for key in index.keys():
+        assert np.array_equal(loaded.get(key), index.get(key))
+    assert loaded.search(unit(3), k=3) == index.search(unit(3), k=3)
+
+
+def test_loaded_index_takes_writes(tmp_path):
+    index = filled(6)
+    index.remove(("p", 2))
+    index.save(str(tmp_path))
+
+    loaded = FaceIndex.load(str(tmp_path))
+    assert loaded.add("new", unit(50)) == 2             # the free list survives the snapshot
+    loaded.add("more", unit(51))
+    assert loaded.search(unit(51), k=1)[0][0] == "more"
+    # copy-on-write: the file on disk is untouched
+    assert "new" not in FaceIndex.load(str(tmp_path))
+
+
+# ───────── small-vector pre-filter ─────────────────
+SMALL = 4
+
+
+def cascade(n: int, **kwargs) -> FaceIndex:
+    index = FaceIndex(dim=DIM, small_dim=SMALL, cascade_fraction=0.1, **kwargs)
+    for i in range(n):
+        index.add(("p", i), unit(i), unit(i, SMALL))
+    return index
+
+
+def test_prefilter_keeps_the_best_small_matches():
+    index = cascade(400)
+    allowed = np.ones(index.rows, dtype=bool)
+    rows = index._prefilter(allowed, unit(7, SMALL), index.rows, k=1)
+    assert 7 in rows
+    assert len(rows) == max(RERANK_FACTOR, 40)
+
+
+def test_prefilter_always_scores_rows_without_small_vector():
+    index = cascade(400)
+    index.add("plain", unit(999))                       # no small vector
+    allowed = np.ones(index.rows, dtype=bool)
+    rows = index._prefilter(allowed, unit(7, SMALL), index.rows, k=1)
+    assert index._slots["plain"] in rows
+
+
+def test_prefilter_respects_allowed_rows():
+    index = cascade(400)
+    allowed = np.zeros(index.rows, dtype=bool)
+    allowed[200:] = True
+    rows = index._prefilter(allowed, unit(7, SMALL), index.rows, k=1)
+    assert rows.min() >= 200
+
+
+def test_prefilter_passes_everything_when_too_few_rows():
+    index = cascade(10)
+    allowed = np.ones(index.rows, dtype=bool)
+    assert len(index._prefilter(allowed, unit(0, SMALL), index.rows, k=5)) == 10
+
+
+def test_cascade_search_finds_the_match():
+    index = cascade(400)
+    assert index.search(unit(42), k=1, small_query=unit(42, SMALL))[0][0] == ("p", 42)
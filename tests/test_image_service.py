@@ -0,0 +1,82 @@
+# tests/test_image_service.py
+import cv2
+import numpy as np
+import pytest
+
+from services.image_service import ImagePipeline, RESIZE_TO, preprocess
+
+
+def encoded(width: int, height: int, ext: str = ".png", flat: bool = False) -> bytes:
+    rng = np.random.default_rng(0)
+    bgr = np.full((height, width, 3), 128, np.uint8) if flat \
+        else rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
+    ok, buf = cv2.imencode(ext, bgr)
+    assert ok
+    return buf.tobytes()
+
+
+def test_run_crops_square_and_resizes():
+    artefacts = ImagePipeline(encoded(1600, 1200)).run()
+    assert artefacts.img_type == "png"
+    assert artefacts.bgr.shape == (RESIZE_TO, RESIZE_TO, 3)
+    decoded = cv2.imdecode(np.frombuffer(artefacts.jpeg, np.uint8), cv2.IMREAD_COLOR)
+    assert decoded.shape == (RESIZE_TO, RESIZE_TO, 3)
+
+
+def test_small_squares_are_not_upscaled():
+    assert ImagePipeline(encoded(500, 400, ".jpg")).run().bgr.shape == (400, 400, 3)
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"GIF89a" + bytes(100), "Only JPEG and PNG"),
+    (encoded(200, 200), "too small"),
+    (encoded(400, 400, flat=True), "too blurry"),
+])
+def test_rejected_uploads(data, message):
+    with pytest.raises(ValueError, match=message):
+        ImagePipeline(data).run()
+
+
+def test_corrupt_image():
+    with pytest.raises(ValueError, match="Corrupt"):
+        ImagePipeline(encoded(400, 400)[:64])
+
+
+def test_fit_keeps_the_aspect_ratio():
+    pipeline = ImagePipeline(encoded(800, 400), allowed_types=None).fit((200, 200))
+    assert pipeline.bgr.shape[:2] == (100, 200)
+
+
+def test_rgb_is_the_pipeline_buffer():
+    artefacts = ImagePipeline(encoded(600, 600)).run()
+    assert np.array_equal(artefacts.rgb, cv2.cvtColor(artefacts.bgr, cv2.COLOR_BGR2RGB))
+    assert artefacts.rgb is artefacts.rgb                  # converted once
+
+
+def test_pixel_key_identifies_the_pixels():
+    a = ImagePipeline(encoded(600, 600)).run()
+    b = ImagePipeline(encoded(600, 600)).run()
+    assert a.pixel_key == b.pixel_key
+    b.bgr = b.bgr.copy()
+    b.bgr[0, 0] ^= 1
+    b._rgb = None
+    assert a.pixel_key != b.pixel_key and a.pixel_key != a.jpeg
+
+
+def test_analyse_faces_reads_the_pipeline_pixels():
+    calls = []
+
+    class FakeFaceService:
+        def extract_face(self, img_bytes, decoded=None):
+            calls.append((img_bytes, decoded))
+            return {"model_version": "m", "faces": []}
+
+    artefacts = ImagePipeline(encoded(600, 600)).run()
+    assert ImagePipeline.analyse_faces(artefacts, FakeFaceService()) == artefacts.face
+    (img_bytes, decoded), = calls
+    assert img_bytes == artefacts.pixel_key and decoded is artefacts.rgb
+
+
+def test_preprocess_returns_jpeg():
+    jpeg, kind = preprocess(encoded(600, 600))
+    assert kind == "jpeg" and jpeg[:2] == b"\xff\xd8"
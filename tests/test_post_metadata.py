@@ -0,0 +1,75 @@
+# tests/test_post_metadata.py
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from models.post_model import Post
+from services.post_metadata import PostMetadataTable, epoch_seconds
+
+T0 = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def post(gender=None, age=None, status="active", created_at=T0) -> Post:
+    return Post("id", "uid", "author", "missing", "url", created_at, status,
+                {"gender": gender, "missing_age": age})
+
+
+def table(*posts) -> PostMetadataTable:
+    t = PostMetadataTable(capacity=2)
+    for row, p in enumerate(posts):
+        t.set(row, p)
+    return t
+
+
+def test_no_filters_means_no_mask():
+    t = table(post())
+    assert t.mask(1, None) is None
+    assert t.mask(1, {"gender": None}) is None
+
+
+def test_gender_is_normalised_and_unknown_passes():
+    t = table(post(gender="M"), post(gender="woman"), post())
+    assert t.mask(3, {"gender": "male"}).tolist() == [True, False, True]
+    assert t.mask(3, {"gender": "F"}).tolist() == [False, True, True]
+
+
+def test_unseen_value_only_matches_unknown_rows():
+    t = table(post(status="active"), post(status=None))
+    assert t.mask(2, {"status": "closed"}).tolist() == [False, True]
+
+
+def test_age_range():
+    t = table(post(age=5), post(age=30), post(age=None))
+    assert t.mask(3, {"min_age": 10, "max_age": 40}).tolist() == [False, True, True]
+
+
+def test_created_range_and_naive_datetimes():
+    t = table(post(created_at=T0), post(created_at=T0 + timedelta(days=10)),
+              post(created_at=datetime(2025, 1, 5)))      # naive → UTC
+    after = {"created_after": T0 + timedelta(days=1)}
+    assert t.mask(3, after).tolist() == [False, True, True]
+    naive = {"created_before": datetime(2025, 1, 5)}
+    assert t.mask(3, naive).tolist() == [True, False, True]
+
+
+def test_non_datetime_created_at_is_unknown():
+    t = table(post(created_at=object()))               # e.g. an unresolved SERVER_TIMESTAMP
+    assert t.mask(1, {"created_after": T0 + timedelta(days=1)}).tolist() == [True]
+
+
+def test_mask_covers_rows_beyond_capacity():
+    t = table(post(age=5))
+    mask = t.mask(10, {"min_age": 10})
+    assert mask.shape == (10,) and not mask[0] and mask[1:].all()
+
+
+def test_epoch_seconds_treats_naive_as_utc():
+    assert epoch_seconds(datetime(1970, 1, 1, 0, 1)) == 60.0
+
+
+def test_save_load_round_trip(tmp_path):
+    t = table(post(gender="m", age=12), post(gender="f", status="closed"))
+    t.save(str(tmp_path), 2)
+    loaded = PostMetadataTable.load(str(tmp_path))
+    for filters in ({"gender": "m"}, {"status": "closed"}, {"max_age": 10}):
+        assert np.array_equal(loaded.mask(2, filters), t.mask(2, filters))
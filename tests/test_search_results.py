@@ -0,0 +1,40 @@
+# tests/test_search_results.py
+import pytest
+
+from services.search_results import SearchResultStore
+
+
+def test_cursor_round_trip():
+    assert SearchResultStore.parse_cursor(SearchResultStore.cursor("abc", 20)) == ("abc", 20)
+
+
+def test_only_the_first_separator_splits():
+    assert SearchResultStore.parse_cursor("abc:5") == ("abc", 5)
+    with pytest.raises(ValueError):
+        SearchResultStore.parse_cursor("a:b:5")
+
+
+@pytest.mark.parametrize("cursor", ["abc", "abc:", "abc:x", "abc:-1", "abc:1.5", None])
+def test_invalid_cursors(cursor):
+    with pytest.raises(ValueError):
+        SearchResultStore.parse_cursor(cursor)
+
+
+def test_results_are_per_user():
+    store = SearchResultStore()
+    result_id = store.put([("p", 0, 0.1)], uid="u1")
+    assert store.get(result_id, "u1") == [("p", 0, 0.1)]
+    assert store.get(result_id, "u2") is None
+    assert store.get("unknown", "u1") is None
+
+
+def test_expired_results_are_gone():
+    store = SearchResultStore(ttl=-1)
+    assert store.get(store.put([], uid="u1"), "u1") is None
+
+
+def test_oldest_result_dropped_when_full():
+    store = SearchResultStore(max_entries=2)
+    first, second, third = (store.put([i], uid=None) for i in range(3))
+    assert store.get(first, None) is None
+    assert store.get(second, None) == [1] and store.get(third, None) == [2]
@@ -0,0 +1,134 @@
+# tests/test_sharded_index.py
+import time
+
+import numpy as np
+import pytest
+
+from models.post_model import Post
+from services.sharded_index import ShardedFaceIndex, shard_of
+
+DIM = 8
+
+
+def unit(seed: int) -> np.ndarray:
+    v = np.random.default_rng(seed).standard_normal(DIM).astype(np.float32)
+    return v / np.linalg.norm(v)
+
+
+def post(post_id: str) -> Post:
+    return Post(post_id, "uid", "author", "missing", None, None, "active", {})
+
+
+class Gallery:
+    """The source of truth a refill reads, like Firestore for FaceSearchService."""
+
+    def __init__(self, n: int):
+        self.entries = [((f"post-{i}", 0), unit(i), post(f"post-{i}")) for i in range(n)]
+        self.loads = []
+        self.delay = 0.0
+
+    def loader(self, shard_no: int, n_shards: int) -> list[tuple]:
+        self.loads.append((shard_no, n_shards))
+        time.sleep(self.delay)
+        return [e for e in self.entries if shard_of(e[0][0], n_shards) == shard_no]
+
+
+@pytest.fixture
+def gallery():
+    return Gallery(40)
+
+
+@pytest.fixture
+def make_index(gallery):
+    made = []
+
+    def make(n_shards: int) -> ShardedFaceIndex:
+        index = ShardedFaceIndex(n_shards, dim=DIM, storage="float32", backend_name="exact",
+                                 timeout=10, write_timeout=10, loader=gallery.loader)
+        index.add_many(gallery.entries)
+        made.append(index)
+        return index
+
+    yield make
+    for index in made:
+        index.close()
+
+
+def wait_refilled(index: ShardedFaceIndex, timeout: float = 20) -> None:
+    deadline = time.time() + timeout
+    while index.stats()["refilling"] and time.time() < deadline:
+        time.sleep(0.05)
+    assert not index.stats()["refilling"]
+
+
+def all_found(index: ShardedFaceIndex, gallery: Gallery) -> bool:
+    for key, vec, _ in gallery.entries:
+        hits, missing = index.search_partial(vec, k=1)
+        if missing or hits[0][0] != key:
+            return False
+    return True
+
+
+def test_search_merges_every_shard(make_index, gallery):
+    index = make_index(3)
+    assert len(index) == 40
+    assert all_found(index, gallery)
+    index.remove(("post-5", 0))
+    assert len(index) == 39
+    assert ("post-5", 0) not in [key for key, _ in index.search(unit(5), k=5)]
+
+
+def test_dead_shard_is_restarted_and_refilled(make_index, gallery):
+    index = make_index(2)
+    index._shards[1].kill()
+    time.sleep(0.2)                         # the reader notices the closed pipe
+
+    index.search_partial(unit(0), k=1)      # restarts it and starts the refill
+    assert index.stats()["restarts"] == 1
+    wait_refilled(index)
+    assert len(index) == 40 and all_found(index, gallery)
+
+
+def test_removed_while_refilling_stays_removed(make_index, gallery):
+    index = make_index(2)
+    key = next(k for k, _, _ in gallery.entries if shard_of(k[0], 2) == 0)
+    index._shards[0].kill()
+    time.sleep(0.2)
+    index.remove(key)                       # restarts shard 0; the loader still returns key
+    wait_refilled(index)
+    assert key not in [k for k, _ in index.search(gallery.entries[0][1], k=40)]
+    assert len(index) == 39
+
+
+@pytest.mark.parametrize("before, after", [(2, 3), (3, 1)])
+def test_resize_keeps_every_entry(make_index, gallery, before, after):
+    index = make_index(before)
+    index.resize(after)
+    assert index.n_shards == after and len(index) == 40
+    assert all_found(index, gallery)
+    assert not gallery.loads                # nothing was lost, nothing re-read
+
+
+def test_resize_with_a_dead_shard_refills_the_new_layout(make_index, gallery):
+    index = make_index(2)
+    index._shards[1].kill()
+    time.sleep(0.2)
+
+    index.resize(3)
+    wait_refilled(index)
+    assert sorted(gallery.loads) == [(0, 3), (1, 3), (2, 3)]
+    assert len(index) == 40 and all_found(index, gallery)
+
+
+def test_resize_during_a_refill_refills_the_new_layout(make_index, gallery):
+    index = make_index(2)
+    gallery.delay = 0.5
+    index._shards[0].kill()
+    time.sleep(0.2)
+    index.search_partial(unit(0), k=1)      # refill of (0, 2) starts, still reading
+    assert index.stats()["refilling"] == [0]
+
+    index.resize(3)                         # cancels it: its partition was not drained
+    wait_refilled(index)
+    assert sorted(gallery.loads) == [(0, 2), (0, 3), (1, 3), (2, 3)]
+    assert len(index) == 40 and all_found(index, gallery)
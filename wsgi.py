@@ -0,0 +1,5 @@
+# WSGI entrypoint for serving processes, e.g. `gunicorn wsgi:app`
+from app import create_app, start_background_services
+
+app = create_app()
+start_background_services()